@@ -1,156 +1,923 @@
 """Backup engine: download from Supervisor, upload to Dropbox."""
 
-import io
+import asyncio
+import json
 import logging
-import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import aclosing, asynccontextmanager
 from datetime import datetime
 
-import aiohttp
 import dropbox
+import requests
 from dropbox.files import WriteMode
 
-from state import load_uploaded, save_uploaded
+from chunk_sizer import MAX_CHUNK_SIZE, AdaptiveChunkSizer
+from chunk_store import (
+    CHUNKS_FOLDER,
+    MANIFEST_SUFFIX,
+    MANIFEST_VERSION,
+    chunk_path,
+    is_manifest,
+    split_chunks,
+)
+from chunk_store import MAX_CHUNK_SIZE as MAX_STORE_CHUNK_SIZE
+from compression import CompressionStats, compress_stream, should_compress
+from content_hash import DropboxContentHasher, content_hash
+from discovery import BackupDiscovery, list_ha_backups
+from dropbox_client import AsyncDropbox
+from inventory import RemoteInventory
+from progress import TransferProgress
+from progress import bus as progress_bus
+from ratelimit import BandwidthLimiter
+from state import (
+    clear_upload_session,
+    find_uploaded_by_path,
+    forget_uploads,
+    load_chunk_index,
+    load_upload_sessions,
+    load_uploaded,
+    mark_pruned,
+    record_uploads,
+    save_chunk_index,
+    save_upload_session,
+)
+from supervisor import DOWNLOAD_TIMEOUT, get_session
 
 _logger = logging.getLogger(__name__)
 
-SUPERVISOR_URL = "http://supervisor"
-SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN", "")
-CHUNK_SIZE = 4 * 1024 * 1024  # 4 MB chunks for Dropbox upload
+CHUNK_SIZE = 4 * 1024 * 1024  # 4 MB blocks streamed from the Supervisor
+SEND_ATTEMPTS = 3  # tries per upload request on network errors
+RETRYABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+# Upload request buffers of all concurrent transfers share this budget
+UPLOAD_MEMORY_BUDGET = 256 * 1024 * 1024
+FINISH_BATCH_LIMIT = 1000  # max entries per upload_session/finish_batch
+DELETE_BATCH_LIMIT = 1000  # max entries per files/delete_batch
+DELETE_POLL_SECONDS = 1  # first wait before checking a delete batch job
+DELETE_POLL_MAX_SECONDS = 30
 
 
-async def list_ha_backups() -> list[dict]:
-    """List all backups from the Supervisor API."""
-    headers = {"Authorization": f"Bearer {SUPERVISOR_TOKEN}"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"{SUPERVISOR_URL}/backups", headers=headers
-        ) as resp:
-            resp.raise_for_status()
-            data = await resp.json()
-            return data["data"]["backups"]
+class CommitError(Exception):
+    """Dropbox rejected the commit of a single upload session."""
 
 
-async def download_backup(slug: str) -> bytes:
-    """Download a backup by slug from the Supervisor API.
-    Returns the full backup content as bytes.
+class DeleteError(Exception):
+    """Dropbox could not delete a file of a delete batch."""
+
+
+async def download_backup(
+    slug: str,
+    chunk_size: int = CHUNK_SIZE,
+    limiter: BandwidthLimiter | None = None,
+) -> AsyncIterator[bytes]:
+    """Stream a backup by slug from the Supervisor API.
+
+    Yields the backup content in blocks of exactly ``chunk_size`` bytes
+    (the last block may be shorter), so at most one block is buffered.
+    Reading is paced by ``limiter`` when given.
     """
-    headers = {"Authorization": f"Bearer {SUPERVISOR_TOKEN}"}
-    async with aiohttp.ClientSession() as session:
-        async with session.get(
-            f"{SUPERVISOR_URL}/backups/{slug}/download", headers=headers
-        ) as resp:
-            resp.raise_for_status()
-            return await resp.read()
+    async with get_session().get(
+        f"/backups/{slug}/download", timeout=DOWNLOAD_TIMEOUT
+    ) as resp:
+        resp.raise_for_status()
+        buffer = bytearray()
+        async for piece in resp.content.iter_chunked(chunk_size):
+            buffer += piece
+            if len(buffer) >= chunk_size:
+                if limiter is not None:
+                    await limiter.throttle_download(chunk_size)
+                yield bytes(buffer[:chunk_size])
+                del buffer[:chunk_size]
+        if buffer:
+            if limiter is not None:
+                await limiter.throttle_download(len(buffer))
+            yield bytes(buffer)
 
 
-def upload_to_dropbox(
-    dbx: dropbox.Dropbox, data: bytes, dropbox_path: str
-) -> None:
-    """Upload data to Dropbox using chunked upload for large files."""
-    size = len(data)
-    _logger.info("Uploading %d bytes to %s", size, dropbox_path)
+async def _resume_session(
+    dbx: AsyncDropbox, slug: str, dropbox_path: str
+) -> tuple[dropbox.files.UploadSessionCursor | None, bool]:
+    """Return a cursor for a checkpointed session that is still usable.
 
-    if size <= CHUNK_SIZE:
-        dbx.files_upload(data, dropbox_path, mode=WriteMode.overwrite)
-    else:
-        stream = io.BytesIO(data)
-        session_start = dbx.files_upload_session_start(stream.read(CHUNK_SIZE))
-        cursor = dropbox.files.UploadSessionCursor(
-            session_id=session_start.session_id, offset=CHUNK_SIZE
+    Returns ``(cursor, closed)``. A closed session holds the complete
+    backup and only needs committing. An open one is validated with an
+    empty append: Dropbox either accepts it, reports the offset it
+    actually holds, or rejects the session as expired, in which case the
+    upload restarts.
+    """
+    checkpoint = load_upload_sessions().get(slug)
+    if not checkpoint:
+        return None, False
+    if checkpoint.get("dropbox_path") != dropbox_path:
+        clear_upload_session(slug)
+        return None, False
+    cursor = dropbox.files.UploadSessionCursor(
+        session_id=checkpoint["session_id"], offset=checkpoint["offset"]
+    )
+    if checkpoint.get("closed"):
+        _logger.info("Upload of %s is complete, pending commit", dropbox_path)
+        return cursor, True
+    try:
+        await dbx.files_upload_session_append_v2(b"", cursor)
+    except dropbox.exceptions.ApiError as exc:
+        if not exc.error.is_incorrect_offset():
+            _logger.info("Upload session for %s is no longer valid: %s", slug, exc)
+            clear_upload_session(slug)
+            return None, False
+        cursor.offset = exc.error.get_incorrect_offset().correct_offset
+    _logger.info("Resuming upload of %s at byte %d", dropbox_path, cursor.offset)
+    return cursor, False
+
+
+async def upload_to_dropbox(
+    dbx: AsyncDropbox,
+    chunks: AsyncIterator[bytes],
+    dropbox_path: str,
+    slug: str | None = None,
+    sizer: AdaptiveChunkSizer | None = None,
+    limiter: BandwidthLimiter | None = None,
+    progress: TransferProgress | None = None,
+    quiet: bool = False,
+) -> dropbox.files.UploadSessionFinishArg:
+    """Upload a stream of chunks into a Dropbox upload session.
+
+    Incoming data is regrouped into requests sized by ``sizer``, which
+    adapts to the measured throughput of the link; peak memory stays
+    below two requests' worth of data regardless of backup size.
+    When ``limiter`` is given, every request body, retries included, is
+    sent at the upload limit in effect, so the sizer sees the throttled
+    rate. Requests are reported to ``progress``; requests that fail with
+    a network error are retried. The file is not committed here: the
+    returned finish argument is passed to ``commit_uploads`` so many
+    sessions share one commit request.
+
+    When ``slug`` is given the session is checkpointed after every
+    acknowledged request, and a valid checkpoint from an interrupted run
+    is resumed by skipping the bytes Dropbox already holds.
+
+    With ``quiet`` the start and end of the upload are only logged at
+    debug level, for callers uploading many small files.
+    """
+    log = _logger.debug if quiet else _logger.info
+    log("Uploading to %s", dropbox_path)
+    commit = dropbox.files.CommitInfo(path=dropbox_path, mode=WriteMode.overwrite)
+    if sizer is None:
+        sizer = AdaptiveChunkSizer()
+    cursor, closed = None, False
+    if slug is not None:
+        cursor, closed = await _resume_session(dbx, slug, dropbox_path)
+    if closed:
+        return dropbox.files.UploadSessionFinishArg(cursor=cursor, commit=commit)
+    skip = cursor.offset if cursor else 0
+    started_at = datetime.now().isoformat()
+
+    client = dbx if limiter is None else dbx.paced(limiter.upload_bucket())
+
+    async def request(data: bytes, close: bool) -> None:
+        nonlocal cursor
+        if cursor is None:
+            session_start = await client.files_upload_session_start(data, close=close)
+            cursor = dropbox.files.UploadSessionCursor(
+                session_id=session_start.session_id, offset=0
+            )
+            return
+        try:
+            await client.files_upload_session_append_v2(data, cursor, close=close)
+        except dropbox.exceptions.ApiError as exc:
+            # A retried request may already have reached Dropbox
+            if not exc.error.is_incorrect_offset():
+                raise
+            correct = exc.error.get_incorrect_offset().correct_offset
+            if correct != cursor.offset + len(data):
+                raise
+
+    async def send(data: bytes, close: bool) -> None:
+        if limiter is not None:
+            # Follow a switch between the day and night limits
+            limiter.upload_bucket()
+        for attempt in range(1, SEND_ATTEMPTS + 1):
+            started = time.monotonic()
+            try:
+                await request(data, close)
+                break
+            except RETRYABLE_ERRORS as exc:
+                sizer.record_failure()
+                if attempt == SEND_ATTEMPTS:
+                    raise
+                _logger.warning(
+                    "Upload request for %s failed (%s), retrying", dropbox_path, exc
+                )
+        sizer.record(len(data), time.monotonic() - started)
+        cursor.offset += len(data)
+        if progress is not None:
+            progress.sent(len(data))
+        if slug is not None:
+            save_upload_session(slug, {
+                "session_id": cursor.session_id,
+                "offset": cursor.offset,
+                "dropbox_path": dropbox_path,
+                "started_at": started_at,
+                "closed": close,
+            })
+
+    buffer = bytearray()
+    async for chunk in chunks:
+        if skip:
+            if len(chunk) <= skip:
+                skip -= len(chunk)
+                continue
+            chunk = chunk[skip:]
+            skip = 0
+        buffer += chunk
+        # Keep at least one byte back so the final request closes the session
+        while len(buffer) > sizer.size:
+            size = sizer.size
+            # Copy the request out once and release it from the buffer
+            # before sending, so only one request's worth stays alive
+            with memoryview(buffer) as view:
+                data = bytes(view[:size])
+            del buffer[:size]
+            await send(data, close=False)
+            del data
+
+    if skip:
+        if slug is not None:
+            clear_upload_session(slug)
+        raise RuntimeError(
+            f"Backup stream ended before the resumed offset of {dropbox_path}"
         )
-        commit = dropbox.files.CommitInfo(
-            path=dropbox_path, mode=WriteMode.overwrite
+    data = bytes(buffer)
+    buffer.clear()
+    await send(data, close=True)
+
+    log("Upload complete: %s (%d bytes)", dropbox_path, cursor.offset)
+    return dropbox.files.UploadSessionFinishArg(cursor=cursor, commit=commit)
+
+
+async def commit_uploads(
+    dbx: AsyncDropbox, entries: list[dropbox.files.UploadSessionFinishArg]
+) -> list[dropbox.files.FileMetadata | Exception]:
+    """Commit closed upload sessions in as few requests as possible.
+
+    Returns one item per entry, in order: the committed file's metadata,
+    or an exception describing why that entry failed.
+    """
+    outcomes: list[dropbox.files.FileMetadata | Exception] = []
+    for start in range(0, len(entries), FINISH_BATCH_LIMIT):
+        batch = entries[start:start + FINISH_BATCH_LIMIT]
+        _logger.info("Committing %d uploads", len(batch))
+        result = await dbx.files_upload_session_finish_batch_v2(batch)
+        for item in result.entries:
+            if item.is_success():
+                outcomes.append(item.get_success())
+            else:
+                outcomes.append(CommitError(f"commit failed: {item.get_failure()}"))
+    return outcomes
+
+
+async def delete_files(
+    dbx: AsyncDropbox, paths: list[str]
+) -> list[dropbox.files.Metadata | Exception]:
+    """Delete files in as few requests as possible.
+
+    Returns one item per path, in order: the deleted file's metadata, or
+    an exception describing why that path was not deleted.
+    """
+    outcomes: list[dropbox.files.Metadata | Exception] = []
+    for start in range(0, len(paths), DELETE_BATCH_LIMIT):
+        batch = paths[start:start + DELETE_BATCH_LIMIT]
+        _logger.info("Deleting %d files", len(batch))
+        launch = await dbx.files_delete_batch(
+            [dropbox.files.DeleteArg(path) for path in batch]
         )
-        while stream.tell() < size:
-            remaining = size - stream.tell()
-            if remaining <= CHUNK_SIZE:
-                dbx.files_upload_session_finish(
-                    stream.read(CHUNK_SIZE), cursor, commit
-                )
+        if launch.is_complete():
+            result = launch.get_complete()
+        else:
+            result = await _wait_for_delete(dbx, launch.get_async_job_id())
+        for item in result.entries:
+            if item.is_success():
+                outcomes.append(item.get_success().metadata)
             else:
-                dbx.files_upload_session_append_v2(
-                    stream.read(CHUNK_SIZE), cursor
+                outcomes.append(DeleteError(f"delete failed: {item.get_failure()}"))
+    return outcomes
+
+
+async def _wait_for_delete(
+    dbx: AsyncDropbox, job_id: str
+) -> dropbox.files.DeleteBatchResult:
+    """Poll a delete batch job until it finishes, backing off between checks."""
+    delay = DELETE_POLL_SECONDS
+    while True:
+        await asyncio.sleep(delay)
+        status = await dbx.files_delete_batch_check(job_id)
+        if status.is_complete():
+            return status.get_complete()
+        if status.is_failed():
+            raise DeleteError(f"delete batch failed: {status.get_failed()}")
+        delay = min(delay * 2, DELETE_POLL_MAX_SECONDS)
+
+
+async def _commit_transfers(
+    dbx: AsyncDropbox,
+    ready: dict[str, tuple[dropbox.files.UploadSessionFinishArg | None, dict]],
+    uploaded: dict,
+    errors: dict[str, str],
+) -> None:
+    """Commit transferred backups and record them in ``uploaded``.
+
+    Entries without a session were deduplicated against existing remote
+    files and are recorded as-is. Failures are added to ``errors``. A
+    session Dropbox rejected is forgotten so the next run starts over;
+    if the whole request failed the checkpoints are kept and the next
+    run only retries the commit.
+    """
+    slugs = [slug for slug, (finish, _) in ready.items() if finish is not None]
+    try:
+        outcomes = await commit_uploads(dbx, [ready[slug][0] for slug in slugs])
+    except Exception as exc:
+        outcomes = [exc] * len(slugs)
+    committed = dict(zip(slugs, outcomes))
+    recorded = {}
+    for slug, (_, entry) in ready.items():
+        outcome = committed.get(slug)
+        if isinstance(outcome, dropbox.files.FileMetadata):
+            expected = entry.setdefault("content_hash", outcome.content_hash)
+            if expected != outcome.content_hash:
+                outcome = CommitError(
+                    f"content hash mismatch: sent {expected}, "
+                    f"Dropbox stored {outcome.content_hash}"
                 )
-                cursor.offset = stream.tell()
+        if isinstance(outcome, Exception):
+            _logger.error("Failed to commit %s: %s", entry["name"], outcome)
+            errors[slug] = f"{entry['name']}: {outcome}"
+            if isinstance(outcome, CommitError):
+                clear_upload_session(slug)
+            continue
+        entry["uploaded_at"] = datetime.now().isoformat()
+        recorded[slug] = entry
+        clear_upload_session(slug)
+    record_uploads(recorded)
+    uploaded.update(recorded)
+
+
+async def _remote_files(
+    dbx: AsyncDropbox,
+    folder: str,
+    inventory: RemoteInventory | None,
+    recursive: bool = False,
+) -> list[dropbox.files.FileMetadata]:
+    """List the files in a Dropbox folder, from the inventory if there
+    is one: bringing it up to date only fetches what changed."""
+    if inventory is None:
+        return await _list_remote(dbx, folder, recursive)
+    await inventory.refresh(dbx)
+    return inventory.files(folder, recursive)
+
+
+async def _list_remote(
+    dbx: AsyncDropbox, backup_path: str, recursive: bool = False
+) -> list[dropbox.files.FileMetadata]:
+    """List the files in a Dropbox folder, following pagination."""
+    try:
+        result = await dbx.files_list_folder(backup_path, recursive=recursive)
+    except dropbox.exceptions.ApiError as exc:
+        if exc.error.is_path() and exc.error.get_path().is_not_found():
+            return []
+        raise
+    entries = list(result.entries)
+    while result.has_more:
+        result = await dbx.files_list_folder_continue(result.cursor)
+        entries.extend(result.entries)
+    return [e for e in entries if isinstance(e, dropbox.files.FileMetadata)]
+
+
+@asynccontextmanager
+async def _open_backup(
+    slug: str,
+    limiter: BandwidthLimiter | None,
+    compression: CompressionStats | None,
+    progress: TransferProgress | None = None,
+) -> AsyncIterator[AsyncIterator[bytes]]:
+    """Open the stream uploaded for a backup: its tar, or the tar
+    compressed in parallel when ``compression`` collects statistics."""
+    async with aclosing(
+        _counted(download_backup(slug, limiter=limiter), progress)
+    ) as chunks:
+        if compression is None:
+            yield chunks
+        else:
+            async with aclosing(compress_stream(chunks, compression)) as compressed:
+                yield compressed
+
+
+async def _hash_backup(
+    slug: str, limiter: BandwidthLimiter | None, compress: bool
+) -> str:
+    """Compute the Dropbox content hash of a backup without uploading it."""
+    hasher = DropboxContentHasher()
+    stats = CompressionStats() if compress else None
+    async with _open_backup(slug, limiter, stats) as chunks:
+        async for chunk in chunks:
+            await asyncio.to_thread(hasher.update, chunk)
+    return hasher.hexdigest()
+
+
+async def _once(data: bytes) -> AsyncIterator[bytes]:
+    yield data
 
-    _logger.info("Upload complete: %s", dropbox_path)
+
+async def _counted(
+    chunks: AsyncIterator[bytes], progress: TransferProgress | None
+) -> AsyncIterator[bytes]:
+    """Pass chunks through unchanged while reporting them to ``progress``."""
+    async for chunk in chunks:
+        if progress is not None:
+            progress.read(len(chunk))
+        yield chunk
+
+
+async def _hashed(
+    chunks: AsyncIterator[bytes], hasher: DropboxContentHasher
+) -> AsyncIterator[bytes]:
+    """Pass chunks through unchanged while feeding them to ``hasher``."""
+    async for chunk in chunks:
+        await asyncio.to_thread(hasher.update, chunk)
+        yield chunk
+
+
+async def _find_remote_copy(
+    backup: dict,
+    dropbox_file_path: str,
+    remote: list[dropbox.files.FileMetadata],
+    limiter: BandwidthLimiter | None = None,
+    compress: bool = False,
+) -> dropbox.files.FileMetadata | None:
+    """Return a remote file with the same content as the backup, if any.
+
+    Hashing means reading the whole backup from the Supervisor, so it is
+    only done when a remote file could plausibly match: one already sits
+    at the target path or has exactly the backup's size. The compressed
+    size is unknown up front, so compressed backups only match by path.
+    """
+    size = None if compress else backup.get("size_bytes")
+    target = dropbox_file_path.lower()
+    candidates = [
+        e for e in remote
+        if e.path_lower == target or (size is not None and e.size == size)
+    ]
+    if not candidates:
+        return None
+    content_hash = await _hash_backup(backup["slug"], limiter, compress)
+    matches = [e for e in candidates if e.content_hash == content_hash]
+    # Prefer the file already at the target path
+    matches.sort(key=lambda e: e.path_lower != target)
+    return matches[0] if matches else None
+
+
+def _file_stem(backup: dict) -> str:
+    """Return the Dropbox file name of a backup, without extension."""
+    safe_name = backup.get("name", backup["slug"]).replace("/", "_").replace(" ", "_")
+    safe_date = backup.get("date", "unknown").replace(":", "-")
+    return f"{safe_name}_{safe_date}"
+
+
+async def _transfer_backup(
+    dbx: AsyncDropbox,
+    backup: dict,
+    backup_path: str,
+    remote: list[dropbox.files.FileMetadata],
+    limiter: BandwidthLimiter | None = None,
+    compression: str = "off",
+    progress: TransferProgress | None = None,
+    max_request: int = MAX_CHUNK_SIZE,
+) -> tuple[dropbox.files.UploadSessionFinishArg | None, dict, dict]:
+    """Stream one backup into Dropbox.
+
+    Upload requests are at most ``max_request`` bytes. Returns the
+    session to commit, the backup's tracking entry and transfer
+    statistics. The session is None when identical content
+    already exists remotely: at the target path nothing is sent,
+    elsewhere it is copied server-side.
+    """
+    slug = backup["slug"]
+    name = backup.get("name", slug)
+    date = backup.get("date", "unknown")
+
+    compress = should_compress(compression, backup)
+    extension = ".tar.gz" if compress else ".tar"
+    dropbox_file_path = f"{backup_path}/{_file_stem(backup)}{extension}"
+    entry = {"name": name, "date": date, "dropbox_path": dropbox_file_path}
+    if compress:
+        entry["compressed"] = True
+
+    existing = await _find_remote_copy(
+        backup, dropbox_file_path, remote, limiter, compress
+    )
+    if existing is not None:
+        if existing.path_lower != dropbox_file_path.lower():
+            _logger.info(
+                "Copying %s from identical %s", name, existing.path_display
+            )
+            await dbx.files_copy_v2(existing.path_display, dropbox_file_path)
+            entry["copied_from"] = existing.path_display
+        else:
+            _logger.info("%s is already in Dropbox, not uploading", name)
+            entry["deduplicated"] = True
+        entry.update(size=existing.size, content_hash=existing.content_hash)
+        return None, entry, {}
+
+    _logger.info("Transferring backup: %s (%s)", name, slug)
+    hasher = DropboxContentHasher()
+    sizer = AdaptiveChunkSizer(max_size=max_request)
+    stats = CompressionStats() if compress else None
+    async with _open_backup(slug, limiter, stats, progress) as chunks:
+        finish = await upload_to_dropbox(
+            dbx, _hashed(chunks, hasher), dropbox_file_path, slug, sizer, limiter,
+            progress,
+        )
+
+    entry["size"] = finish.cursor.offset
+    # A session resumed after it was closed is committed without reading
+    # the backup, so only a complete pass yields a hash worth checking.
+    if hasher.bytes_hashed == finish.cursor.offset:
+        entry["content_hash"] = hasher.hexdigest()
+    transfer = sizer.summary()
+    if stats is not None and stats.raw_bytes:
+        transfer["compression"] = stats.summary()
+    return finish, entry, transfer
+
+
+async def _transfer_chunked(
+    dbx: AsyncDropbox,
+    backup: dict,
+    backup_path: str,
+    stored: dict[str, int],
+    claimed: dict[str, dropbox.files.UploadSessionFinishArg],
+    limiter: BandwidthLimiter | None = None,
+    progress: TransferProgress | None = None,
+) -> tuple[dict, dict, dict]:
+    """Stream one backup into the chunk store.
+
+    Only chunks that are neither ``stored`` nor ``claimed`` by a backup
+    of this run are uploaded. A chunk is claimed by adding its closed
+    session to ``claimed``, which is committed even if this backup fails
+    later, so other backups can rely on the chunk. Returns the backup's
+    manifest, its tracking entry and transfer statistics.
+    """
+    slug = backup["slug"]
+    name = backup.get("name", slug)
+    date = backup.get("date", "unknown")
+    manifest_path = f"{backup_path}/{_file_stem(backup)}{MANIFEST_SUFFIX}"
+    entry = {"name": name, "date": date, "dropbox_path": manifest_path}
+
+    _logger.info("Transferring backup to chunk store: %s (%s)", name, slug)
+    hasher = DropboxContentHasher()
+    # Chunks fit in one request each
+    sizer = AdaptiveChunkSizer(MAX_STORE_CHUNK_SIZE, MAX_STORE_CHUNK_SIZE)
+    chunks: list[list] = []
+    new_chunks = new_bytes = 0
+    blocks = _counted(download_backup(slug, limiter=limiter), progress)
+    async with aclosing(blocks):
+        async with aclosing(split_chunks(_hashed(blocks, hasher))) as pieces:
+            async for piece in pieces:
+                chunk_id = await asyncio.to_thread(content_hash, piece)
+                chunks.append([chunk_id, len(piece)])
+                if chunk_id in stored or chunk_id in claimed:
+                    continue
+                finish = await upload_to_dropbox(
+                    dbx, _once(piece), chunk_path(backup_path, chunk_id),
+                    sizer=sizer, limiter=limiter, progress=progress, quiet=True,
+                )
+                # Another backup may have sent the same chunk meanwhile;
+                # only the first session is committed
+                claimed.setdefault(chunk_id, finish)
+                new_chunks += 1
+                new_bytes += len(piece)
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "slug": slug,
+        "name": name,
+        "date": date,
+        "size": hasher.bytes_hashed,
+        "content_hash": hasher.hexdigest(),
+        "chunks": chunks,
+    }
+    entry.update(
+        size=hasher.bytes_hashed,
+        content_hash=manifest["content_hash"],
+        chunks=len(chunks),
+    )
+    transfer = sizer.summary()
+    transfer["chunk_store"] = {
+        "chunks": len(chunks),
+        "new_chunks": new_chunks,
+        "new_bytes": new_bytes,
+    }
+    _logger.info(
+        "%s: %d of %d chunks new (%d bytes)",
+        name, new_chunks, len(chunks), new_bytes,
+    )
+    return manifest, entry, transfer
+
+
+async def _commit_chunked(
+    dbx: AsyncDropbox,
+    claimed: dict[str, dropbox.files.UploadSessionFinishArg],
+    ready: dict[str, tuple[dict, dict]],
+    index: dict,
+    uploaded: dict,
+    errors: dict[str, str],
+) -> None:
+    """Commit the claimed chunks, then write the manifests of complete
+    backups.
+
+    A manifest is only written once every chunk it lists is stored, so
+    a manifest in Dropbox never refers to a missing chunk. Chunks that
+    only failed backups refer to stay unreferenced until garbage
+    collection.
+    """
+    stored = index["chunks"]
+    finishes = list(claimed.values())
+    try:
+        outcomes = await commit_uploads(dbx, finishes)
+    except Exception as exc:
+        outcomes = [exc] * len(finishes)
+    for finish, outcome in zip(finishes, outcomes):
+        chunk_id = finish.commit.path.rsplit("/", 1)[-1]
+        if not isinstance(outcome, dropbox.files.FileMetadata):
+            _logger.error("Failed to commit chunk %s: %s", chunk_id, outcome)
+        elif outcome.content_hash != chunk_id:
+            _logger.error("Chunk %s was stored with another content hash", chunk_id)
+        else:
+            stored[chunk_id] = outcome.size
+    save_chunk_index(index)
+
+    recorded = {}
+    for slug, (manifest, entry) in ready.items():
+        missing = sum(1 for chunk_id, _ in manifest["chunks"] if chunk_id not in stored)
+        if missing:
+            _logger.error("Failed to commit %s: %d chunks missing", entry["name"], missing)
+            errors[slug] = f"{entry['name']}: {missing} chunks could not be stored"
+            continue
+        try:
+            await dbx.files_upload(
+                json.dumps(manifest).encode(),
+                entry["dropbox_path"],
+                mode=WriteMode.overwrite,
+            )
+        except Exception as exc:
+            _logger.error("Failed to write manifest of %s: %s", entry["name"], exc)
+            errors[slug] = f"{entry['name']}: {exc}"
+            continue
+        entry["uploaded_at"] = datetime.now().isoformat()
+        recorded[slug] = entry
+    record_uploads(recorded)
+    uploaded.update(recorded)
+
+
+async def _load_chunk_index(
+    dbx: AsyncDropbox, backup_path: str, inventory: RemoteInventory | None = None
+) -> dict:
+    """Return the chunk index, rebuilding it from Dropbox if it is missing
+    or was built for another backup folder."""
+    index = load_chunk_index()
+    if index.get("backup_path") != backup_path:
+        _logger.info("Rebuilding chunk index from %s", backup_path)
+        remote = await _remote_files(
+            dbx, f"{backup_path}/{CHUNKS_FOLDER}", inventory, recursive=True
+        )
+        index = {
+            "backup_path": backup_path,
+            "chunks": {e.name: e.size for e in remote if e.content_hash == e.name},
+        }
+        save_chunk_index(index)
+    return index
 
 
 async def run_backup(
-    dbx: dropbox.Dropbox,
+    dbx: AsyncDropbox,
     backup_path: str,
     max_backups: int,
+    max_workers: int = 1,
+    limiter: BandwidthLimiter | None = None,
+    compression: str = "off",
+    storage: str = "files",
+    inventory: RemoteInventory | None = None,
+    discovery: BackupDiscovery | None = None,
 ) -> dict:
-    """Run a full backup cycle. Returns summary dict."""
-    results = {"uploaded": [], "skipped": [], "errors": []}
-    uploaded = load_uploaded()
+    """Run a full backup cycle. Returns summary dict.
 
-    backups = await list_ha_backups()
-    _logger.info("Found %d backups in Home Assistant", len(backups))
+    Pending backups are transferred by up to ``max_workers`` concurrent
+    workers into closed upload sessions, which are then committed
+    together with one batch request. With ``storage="chunks"`` backups
+    go to the deduplicating chunk store instead of one file each. The
+    summary lists backups in Supervisor order whichever worker finished
+    first.
 
+    With an ``inventory``, Dropbox is listed through it, and tracked
+    backups whose file no longer exists in Dropbox are forgotten so
+    they are uploaded again. With a ``discovery``, only backups it has
+    not seen before are looked up in detail.
+    """
+    results = {"uploaded": [], "skipped": [], "errors": [], "transfers": {}}
+    uploaded = load_uploaded()
+    missing = []
+    if inventory is not None:
+        await inventory.refresh(dbx)
+        missing = [
+            slug for slug, info in uploaded.items()
+            if not info.get("pruned") and not inventory.has(info.get("dropbox_path", ""))
+        ]
+        for slug in missing:
+            _logger.warning(
+                "%s is no longer in Dropbox", uploaded.pop(slug)["dropbox_path"]
+            )
+        forget_uploads(missing)
+
+    if discovery is None:
+        backups = await list_ha_backups()
+        pending = [b for b in backups if b["slug"] not in uploaded]
+    else:
+        await discovery.refresh(uploaded)
+        if missing:
+            discovery.settle(uploaded)
+        backups = list(discovery.backups.values())
+        pending = discovery.pending()
+    # Pruned backups stay tracked only while Home Assistant keeps them
+    current = {backup["slug"] for backup in backups}
+    gone = [
+        slug for slug, info in uploaded.items()
+        if info.get("pruned") and slug not in current
+    ]
+    for slug in gone:
+        del uploaded[slug]
+    forget_uploads(gone)
+    _logger.info(
+        "Found %d backups in Home Assistant, %d to upload", len(backups), len(pending)
+    )
+    pending_slugs = {backup["slug"] for backup in pending}
     for backup in backups:
-        slug = backup["slug"]
-        name = backup.get("name", slug)
-        date = backup.get("date", "unknown")
+        if backup["slug"] not in pending_slugs:
+            results["skipped"].append(backup.get("name", backup["slug"]))
 
-        if slug in uploaded:
-            results["skipped"].append(name)
-            continue
+    # Drop checkpoints of backups that no longer need uploading
+    for slug in load_upload_sessions():
+        if slug not in pending_slugs:
+            clear_upload_session(slug)
 
-        try:
-            _logger.info("Downloading backup: %s (%s)", name, slug)
-            data = await download_backup(slug)
+    queue: asyncio.Queue[dict] = asyncio.Queue()
+    # Largest first, so a big upload does not start last and hold up the run
+    for backup in sorted(pending, key=lambda b: -(b.get("size_bytes") or 0)):
+        queue.put_nowait(backup)
+    errors: dict[str, str] = {}
+    transfers: dict[str, dict] = {}
+    ready: dict[str, tuple[dropbox.files.UploadSessionFinishArg | None, dict]] = {}
+    ready_chunked: dict[str, tuple] = {}
+    chunked = storage == "chunks"
 
-            safe_name = name.replace("/", "_").replace(" ", "_")
-            safe_date = date.replace(":", "-")
-            dropbox_file_path = f"{backup_path}/{safe_name}_{safe_date}.tar"
+    workers = min(max(max_workers, 1), len(pending))
+    # A transfer holds up to two requests' worth while copying one out
+    max_request = min(MAX_CHUNK_SIZE, UPLOAD_MEMORY_BUDGET // (2 * max(workers, 1)))
+    remote, index, claimed = [], {}, {}
+    if pending and chunked:
+        index = await _load_chunk_index(dbx, backup_path, inventory)
+    elif pending:
+        remote = await _remote_files(dbx, backup_path, inventory)
 
-            upload_to_dropbox(dbx, data, dropbox_file_path)
+    async def worker() -> None:
+        while not queue.empty():
+            backup = queue.get_nowait()
+            slug = backup["slug"]
+            name = backup.get("name", slug)
+            progress = progress_bus.start(slug, name, backup.get("size_bytes"))
+            try:
+                if chunked:
+                    manifest, entry, transfers[slug] = await _transfer_chunked(
+                        dbx, backup, backup_path, index["chunks"], claimed,
+                        limiter, progress,
+                    )
+                    ready_chunked[slug] = (manifest, entry)
+                else:
+                    finish, entry, transfers[slug] = await _transfer_backup(
+                        dbx, backup, backup_path, remote, limiter, compression,
+                        progress, max_request,
+                    )
+                    ready[slug] = (finish, entry)
+            except Exception as exc:
+                _logger.error("Failed to backup %s: %s", name, exc)
+                errors[slug] = f"{name}: {exc}"
+                progress.finish("failed")
+            else:
+                progress.finish("transferred")
 
-            uploaded[slug] = {
-                "name": name,
-                "date": date,
-                "dropbox_path": dropbox_file_path,
-                "uploaded_at": datetime.now().isoformat(),
-            }
-            save_uploaded(uploaded)
-            results["uploaded"].append(name)
+    if workers:
+        _logger.info(
+            "Transferring %d backups with %d workers", len(pending), workers
+        )
+        async with asyncio.TaskGroup() as group:
+            for _ in range(workers):
+                group.create_task(worker())
 
-        except Exception as exc:
-            _logger.error("Failed to backup %s: %s", name, exc)
-            results["errors"].append(f"{name}: {exc}")
+    if ready:
+        await _commit_transfers(dbx, ready, uploaded, errors)
+    if claimed or ready_chunked:
+        await _commit_chunked(dbx, claimed, ready_chunked, index, uploaded, errors)
+
+    for backup in pending:
+        slug = backup["slug"]
+        if transfers.get(slug):
+            results["transfers"][backup.get("name", slug)] = transfers[slug]
+        if slug in errors:
+            results["errors"].append(errors[slug])
+        elif uploaded[slug].get("deduplicated"):
+            results["skipped"].append(backup.get("name", slug))
+        else:
+            results["uploaded"].append(backup.get("name", slug))
 
     # Retention: delete oldest if over limit
     if max_backups > 0:
-        await _enforce_retention(dbx, backup_path, max_backups)
+        await _enforce_retention(dbx, backup_path, max_backups, inventory)
 
+    if discovery is not None:
+        discovery.settle(load_uploaded())
     return results
 
 
 async def _enforce_retention(
-    dbx: dropbox.Dropbox, backup_path: str, max_backups: int
+    dbx: AsyncDropbox,
+    backup_path: str,
+    max_backups: int,
+    inventory: RemoteInventory | None = None,
 ) -> None:
-    """Delete oldest backups from Dropbox if count exceeds max_backups."""
+    """Delete oldest backups from Dropbox if count exceeds max_backups.
+
+    Backup files and chunk store manifests both count as backups. The
+    surplus is deleted with one batch job, and the backups are marked
+    as pruned rather than forgotten, so they are not uploaded again.
+    When a manifest is deleted, chunks no remaining manifest refers to
+    are garbage-collected.
+    """
     try:
-        result = dbx.files_list_folder(backup_path)
         entries = sorted(
-            result.entries,
+            await _remote_files(dbx, backup_path, inventory),
             key=lambda e: e.server_modified
-            if hasattr(e, "server_modified")
+            if getattr(e, "server_modified", None)
             else datetime.min,
         )
-        uploaded = load_uploaded()
-        while len(entries) > max_backups:
-            oldest = entries.pop(0)
-            _logger.info("Retention: deleting %s", oldest.path_display)
-            dbx.files_delete_v2(oldest.path_display)
-            # Remove from tracking state
-            slugs_to_remove = [
-                slug for slug, info in uploaded.items()
-                if info.get("dropbox_path") == oldest.path_display
-            ]
-            for slug in slugs_to_remove:
-                del uploaded[slug]
-        save_uploaded(uploaded)
-    except dropbox.exceptions.ApiError as exc:
+        surplus = entries[:max(len(entries) - max_backups, 0)]
+        if not surplus:
+            return
+        for entry in surplus:
+            _logger.info("Retention: deleting %s", entry.path_display)
+        outcomes = await delete_files(dbx, [e.path_display for e in surplus])
+
+        pruned = []
+        remaining = entries[len(surplus):]
+        deleted_manifest = False
+        for entry, outcome in zip(surplus, outcomes):
+            if isinstance(outcome, Exception):
+                _logger.error(
+                    "Retention: failed to delete %s: %s", entry.path_display, outcome
+                )
+                remaining.append(entry)
+                continue
+            deleted_manifest = deleted_manifest or is_manifest(entry.path_lower)
+            pruned.extend(find_uploaded_by_path(entry.path_lower))
+        mark_pruned(pruned)
+        if deleted_manifest:
+            manifests = [e for e in remaining if is_manifest(e.path_lower)]
+            await _collect_garbage(dbx, backup_path, manifests, inventory)
+    except (dropbox.exceptions.ApiError, DeleteError) as exc:
         _logger.error("Retention check failed: %s", exc)
+
+
+async def _collect_garbage(
+    dbx: AsyncDropbox,
+    backup_path: str,
+    manifests: list[dropbox.files.FileMetadata],
+    inventory: RemoteInventory | None = None,
+) -> None:
+    """Delete stored chunks that none of ``manifests`` refers to."""
+    referenced: set[str] = set()
+    for manifest in manifests:
+        _, response = await dbx.files_download(manifest.path_display)
+        referenced.update(chunk_id for chunk_id, _ in json.loads(response.content)["chunks"])
+    stored = await _remote_files(
+        dbx, f"{backup_path}/{CHUNKS_FOLDER}", inventory, recursive=True
+    )
+    garbage = [e for e in stored if e.name not in referenced]
+    if not garbage:
+        return
+    _logger.info("Chunk store: deleting %d unreferenced chunks", len(garbage))
+    index = load_chunk_index()
+    if index.get("backup_path") == backup_path:
+        # Forget the chunks first: a stale index entry would let a new
+        # manifest refer to a chunk that is gone
+        for entry in garbage:
+            index["chunks"].pop(entry.name, None)
+        save_chunk_index(index)
+    outcomes = await delete_files(dbx, [e.path_display for e in garbage])
+    failed = sum(isinstance(outcome, Exception) for outcome in outcomes)
+    if failed:
+        _logger.warning("Chunk store: %d chunks could not be deleted", failed)
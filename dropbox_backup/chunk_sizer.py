@@ -0,0 +1,112 @@
+"""Adaptive upload chunk sizing based on measured request timings."""
+
+CHUNK_ALIGN = 4 * 1024 * 1024
+MIN_CHUNK_SIZE = CHUNK_ALIGN
+# Dropbox accepts at most 150 MB per request; stay on a 4 MB boundary
+MAX_CHUNK_SIZE = 37 * CHUNK_ALIGN
+# Fixed per-request cost (RTT, TLS, server processing) should stay below
+# this share of a request's duration...
+MAX_OVERHEAD_RATIO = 0.1
+# ...but a single request should not take longer than this, so a failed
+# request on a slow link only costs a bounded retransmission.
+MAX_REQUEST_SECONDS = 30.0
+# Weight kept by older samples each time a new one is recorded
+DECAY = 0.7
+
+
+class AdaptiveChunkSizer:
+    """Choose the next upload chunk size from per-chunk measurements.
+
+    A request's duration is modelled as ``overhead + size / bandwidth``.
+    Both terms are estimated with an exponentially weighted least-squares
+    fit over recent chunks, which needs chunks of different sizes: until
+    then the size doubles while requests are quick. Once estimated, the
+    chunk is sized so the overhead is at most ``MAX_OVERHEAD_RATIO`` of a
+    request, capped at ``MAX_REQUEST_SECONDS`` worth of data. Sizes are
+    multiples of 4 MB and change at most twofold per chunk; a failed
+    request halves the size.
+    """
+
+    def __init__(
+        self,
+        min_size: int = MIN_CHUNK_SIZE,
+        max_size: int = MAX_CHUNK_SIZE,
+    ):
+        self.min_size = min_size
+        self.max_size = max(max_size // CHUNK_ALIGN * CHUNK_ALIGN, min_size)
+        self.size = min_size
+        self.overhead: float | None = None
+        self.bandwidth: float | None = None
+        self.failures = 0
+        self._sizes: list[int] = []
+        self._total_bytes = 0
+        self._total_seconds = 0.0
+        self._w = self._sx = self._sy = self._sxx = self._sxy = 0.0
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        """Record a successful request and pick the next chunk size."""
+        self._sizes.append(nbytes)
+        self._total_bytes += nbytes
+        self._total_seconds += seconds
+        if nbytes < self.min_size:
+            # The short final chunk says little about the link
+            return
+        self._w = self._w * DECAY + 1
+        self._sx = self._sx * DECAY + nbytes
+        self._sy = self._sy * DECAY + seconds
+        self._sxx = self._sxx * DECAY + nbytes * nbytes
+        self._sxy = self._sxy * DECAY + nbytes * seconds
+        self._estimate(nbytes, seconds)
+        self.size = self._next_size(seconds)
+
+    def record_failure(self) -> None:
+        """Record a failed request; the next chunk is half as large."""
+        self.failures += 1
+        self.size = self._clamp(self.size // 2)
+
+    def summary(self) -> dict:
+        """Return the chunk sizes used and the link estimates."""
+        if not self._sizes:
+            return {"chunks": 0}
+        summary = {
+            "chunks": len(self._sizes),
+            "min_chunk": min(self._sizes),
+            "max_chunk": max(self._sizes),
+            "last_chunk": self._sizes[-1],
+            "failures": self.failures,
+        }
+        if self._total_seconds > 0:
+            summary["bytes_per_second"] = int(
+                self._total_bytes / self._total_seconds
+            )
+        if self.overhead is not None:
+            summary["overhead_ms"] = round(self.overhead * 1000)
+        return summary
+
+    def _estimate(self, nbytes: int, seconds: float) -> None:
+        mean_x = self._sx / self._w
+        mean_y = self._sy / self._w
+        var = self._sxx / self._w - mean_x * mean_x
+        cov = self._sxy / self._w - mean_x * mean_y
+        # Only fit once the sizes differ by a meaningful amount
+        if var > (CHUNK_ALIGN / 4) ** 2 and cov > 0:
+            slope = cov / var
+            self.bandwidth = 1 / slope
+            self.overhead = max(mean_y - slope * mean_x, 0.0)
+        elif seconds > 0:
+            self.bandwidth = nbytes / seconds
+
+    def _next_size(self, seconds: float) -> int:
+        if self.overhead is None or self.bandwidth is None:
+            if seconds < MAX_REQUEST_SECONDS / 4:
+                return self._clamp(self.size * 2)
+            if seconds > MAX_REQUEST_SECONDS:
+                return self._clamp(self.size // 2)
+            return self.size
+        target_seconds = min(self.overhead / MAX_OVERHEAD_RATIO, MAX_REQUEST_SECONDS)
+        target = int(self.bandwidth * target_seconds)
+        return self._clamp(min(max(target, self.size // 2), self.size * 2))
+
+    def _clamp(self, size: int) -> int:
+        size = size // CHUNK_ALIGN * CHUNK_ALIGN
+        return min(max(size, self.min_size), self.max_size)
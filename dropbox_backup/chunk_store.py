@@ -0,0 +1,139 @@
+"""Content-defined chunking for the deduplicating chunk store.
+
+Backups are cut at positions chosen by a gear rolling hash over their
+content, so data inserted or removed early in a tar only changes the
+chunks around it and the rest still match chunks stored by earlier
+backups. Each chunk is stored once under ``.chunks/``, named by its
+Dropbox content hash; a backup is a small JSON manifest listing its
+chunks in order, and restoring it means concatenating them, which
+``restore.py`` does.
+"""
+
+import asyncio
+import hashlib
+from collections import deque
+from collections.abc import AsyncIterator, Iterator
+
+import numpy as np
+
+from process_pool import get_executor
+
+CHUNKS_FOLDER = ".chunks"
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+MIN_CHUNK_SIZE = 512 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+# A cut is allowed where the top 21 bits of the hash are zero, which
+# gives chunks of about MIN_CHUNK_SIZE + 2 MB on average
+_CUT_BELOW = 1 << (64 - 21)
+# The hash shifts one bit per byte, so only the last 64 bytes affect it
+_WINDOW = 64
+_GEAR = np.array(
+    [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big") for i in range(256)],
+    dtype=np.uint64,
+)
+# Bytes hashed per vector pass; the working arrays then fit in L2 cache
+_SCAN_SIZE = 64 * 1024
+
+
+def chunk_path(backup_path: str, chunk_id: str) -> str:
+    """Return the Dropbox path a chunk is stored at."""
+    return f"{backup_path}/{CHUNKS_FOLDER}/{chunk_id[:2]}/{chunk_id}"
+
+
+def is_manifest(path: str) -> bool:
+    """Tell whether a Dropbox path is a chunk store manifest."""
+    return path.lower().endswith(MANIFEST_SUFFIX)
+
+
+def _cut_candidates(block: bytes, prefix: bytes) -> list[int]:
+    """Return the offsets in ``block`` after which a cut is allowed.
+
+    ``prefix`` holds the bytes preceding the block, so blocks can be
+    scanned independently and still give the same result as one pass.
+
+    The hash after byte ``i`` is ``sum(gear[b[i - k]] << k)`` over the
+    last ``_WINDOW`` bytes, modulo 2**64. It is computed for all bytes at
+    once by doubling the window: hashes over ``w`` bytes are combined
+    with the ones ``w`` bytes earlier into hashes over ``2w`` bytes.
+    """
+    cuts = []
+    hashes = np.empty(_SCAN_SIZE + _WINDOW, dtype=np.uint64)
+    shifted = np.empty_like(hashes)
+    for start in range(0, len(block), _SCAN_SIZE):
+        context = prefix[-_WINDOW:] if start == 0 else block[start - _WINDOW:start]
+        data = np.frombuffer(context + block[start:start + _SCAN_SIZE], dtype=np.uint8)
+        n = len(data)
+        h = hashes[:n]
+        np.take(_GEAR, data, out=h)
+        width = 1
+        while width < min(n, _WINDOW):
+            np.left_shift(h[:-width], np.uint64(width), out=shifted[:n - width])
+            np.add(h[width:], shifted[:n - width], out=h[width:])
+            width *= 2
+        hits = np.flatnonzero(h[len(context):] < np.uint64(_CUT_BELOW))
+        cuts.extend((hits + start + 1).tolist())
+    return cuts
+
+
+async def split_chunks(blocks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Regroup a stream into content-defined chunks.
+
+    Blocks are scanned for cut candidates on the process pool, up to two
+    blocks per core ahead of the chunks being emitted. Chunks are between
+    ``MIN_CHUNK_SIZE`` and ``MAX_CHUNK_SIZE`` bytes, except the last.
+    """
+    executor = get_executor()
+    loop = asyncio.get_running_loop()
+    max_inflight = 2 * executor._max_workers
+    inflight: deque[tuple[bytes, asyncio.Future]] = deque()
+    cuts: deque[int] = deque()  # stream offsets
+    buffer = bytearray()
+    start = 0  # stream offset of buffer[0]
+    prefix = b""
+
+    async def absorb() -> None:
+        block, future = inflight.popleft()
+        end = start + len(buffer)
+        cuts.extend(end + offset for offset in await future)
+        buffer.extend(block)
+
+    def emit(final: bool = False) -> Iterator[bytes]:
+        nonlocal start
+        while buffer:
+            while cuts and cuts[0] < start + MIN_CHUNK_SIZE:
+                cuts.popleft()
+            limit = start + MAX_CHUNK_SIZE
+            if cuts and cuts[0] <= limit:
+                end = cuts.popleft()
+            elif start + len(buffer) >= limit:
+                end = limit
+            elif final:
+                end = start + len(buffer)
+            else:
+                return
+            chunk = bytes(buffer[:end - start])
+            del buffer[:end - start]
+            start = end
+            yield chunk
+
+    try:
+        async for block in blocks:
+            future = loop.run_in_executor(
+                executor, _cut_candidates, block, prefix
+            )
+            inflight.append((block, future))
+            prefix = (prefix + block[-_WINDOW:])[-_WINDOW:]
+            if len(inflight) >= max_inflight:
+                await absorb()
+                for chunk in emit():
+                    yield chunk
+        while inflight:
+            await absorb()
+            for chunk in emit():
+                yield chunk
+        for chunk in emit(final=True):
+            yield chunk
+    finally:
+        for _, future in inflight:
+            future.cancel()
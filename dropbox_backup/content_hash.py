@@ -0,0 +1,48 @@
+"""Dropbox content hash, computed incrementally as data streams through.
+
+Dropbox hashes files in 4 MB blocks: each block is SHA-256 hashed and the
+content hash is the SHA-256 of the concatenated block digests. See
+https://www.dropbox.com/developers/reference/content-hash
+"""
+
+import hashlib
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class DropboxContentHasher:
+    """hashlib-style hasher producing Dropbox's ``content_hash``."""
+
+    def __init__(self):
+        self._overall = hashlib.sha256()
+        self._block = hashlib.sha256()
+        self._block_pos = 0
+        self.bytes_hashed = 0
+
+    def update(self, data: bytes) -> None:
+        """Feed more data, in pieces of any size."""
+        view = memoryview(data)
+        self.bytes_hashed += len(view)
+        while view:
+            take = min(BLOCK_SIZE - self._block_pos, len(view))
+            self._block.update(view[:take])
+            self._block_pos += take
+            view = view[take:]
+            if self._block_pos == BLOCK_SIZE:
+                self._overall.update(self._block.digest())
+                self._block = hashlib.sha256()
+                self._block_pos = 0
+
+    def hexdigest(self) -> str:
+        """Return the content hash of everything fed so far."""
+        overall = self._overall.copy()
+        if self._block_pos:
+            overall.update(self._block.digest())
+        return overall.hexdigest()
+
+
+def content_hash(data: bytes) -> str:
+    """Return the Dropbox content hash of ``data``."""
+    hasher = DropboxContentHasher()
+    hasher.update(data)
+    return hasher.hexdigest()
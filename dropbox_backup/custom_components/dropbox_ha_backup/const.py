@@ -8,4 +8,7 @@ DEFAULT_PORT = 8099
 EVENT_BACKUP_SUCCESS = "dropbox_ha_backup.success"
 EVENT_BACKUP_FAILED = "dropbox_ha_backup.failed"
 
-DEFAULT_SCAN_INTERVAL = 60  # seconds
+# Fallback polling; changes are normally pushed over the /status long-poll
+DEFAULT_SCAN_INTERVAL = 900  # seconds
+LONG_POLL_TIMEOUT = 240  # seconds the addon holds a /status request
+LONG_POLL_RETRY = 30  # seconds to wait after a failed long-poll
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
 from datetime import timedelta
 
@@ -12,13 +13,17 @@ from homeassistant.core import HomeAssistant
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import DEFAULT_SCAN_INTERVAL, DOMAIN
+from .const import DEFAULT_SCAN_INTERVAL, DOMAIN, LONG_POLL_RETRY, LONG_POLL_TIMEOUT
 
 _logger = logging.getLogger(__name__)
 
 
 class DropboxBackupCoordinator(DataUpdateCoordinator[dict]):
-    """Polls the addon /status endpoint."""
+    """Follows the addon /status endpoint.
+
+    Changes are pushed over a long-poll on /status; regular polling is
+    only a slow fallback.
+    """
 
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry, base_url: str) -> None:
         """Initialize the coordinator."""
@@ -30,14 +35,61 @@ class DropboxBackupCoordinator(DataUpdateCoordinator[dict]):
             update_interval=timedelta(seconds=DEFAULT_SCAN_INTERVAL),
         )
         self._base_url = base_url
+        self._etag: str | None = None
+
+    def _conditional_headers(self) -> dict[str, str]:
+        if self._etag is None or self.data is None:
+            return {}
+        return {"If-None-Match": self._etag}
+
+    async def _read_status(self, resp: aiohttp.ClientResponse) -> dict:
+        """Return the status of a response, reusing the current data on 304."""
+        if resp.status == 304:
+            return self.data
+        resp.raise_for_status()
+        data = await resp.json()
+        self._etag = resp.headers.get("ETag")
+        return data
 
     async def _async_update_data(self) -> dict:
         """Fetch status from the addon."""
         session = async_get_clientsession(self.hass)
         url = f"{self._base_url}/status"
         try:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                resp.raise_for_status()
-                return await resp.json()
+            async with session.get(
+                url,
+                headers=self._conditional_headers(),
+                timeout=aiohttp.ClientTimeout(total=10),
+            ) as resp:
+                return await self._read_status(resp)
         except (aiohttp.ClientError, TimeoutError) as err:
             raise UpdateFailed(f"Error communicating with addon: {err}") from err
+
+    async def async_listen(self) -> None:
+        """Long-poll /status and push every change to the entities.
+
+        Runs until cancelled. Addon versions without the long-poll do
+        not report a status version; polling alone is used for them.
+        """
+        session = async_get_clientsession(self.hass)
+        url = f"{self._base_url}/status"
+        timeout = aiohttp.ClientTimeout(total=LONG_POLL_TIMEOUT + 30)
+        while True:
+            version = (self.data or {}).get("version")
+            if version is None:
+                _logger.debug("Addon does not support status push, polling only")
+                return
+            try:
+                async with session.get(
+                    url,
+                    params={"wait": version, "timeout": LONG_POLL_TIMEOUT},
+                    headers=self._conditional_headers(),
+                    timeout=timeout,
+                ) as resp:
+                    data = await self._read_status(resp)
+            except (aiohttp.ClientError, TimeoutError) as err:
+                _logger.debug("Status long-poll failed: %s", err)
+                await asyncio.sleep(LONG_POLL_RETRY)
+                continue
+            if data is not self.data:
+                self.async_set_updated_data(data)
@@ -0,0 +1,101 @@
+"""Incremental discovery of the Supervisor's backups.
+
+The Supervisor only offers the full backup list, so every refresh
+fetches it, but details are requested only for backups not seen
+before, and the set of backups still to upload is maintained as
+backups appear and disappear rather than recomputed on every check.
+"""
+
+import asyncio
+import logging
+
+from state import load_discovered, save_discovered
+from supervisor import get_session
+
+_logger = logging.getLogger(__name__)
+
+INFO_CONCURRENCY = 4  # parallel /backups/<slug>/info requests
+# Details kept from /backups/<slug>/info to plan uploads
+INFO_KEYS = ("size", "size_bytes", "protected", "compressed", "type")
+
+
+async def list_ha_backups() -> list[dict]:
+    """List all backups from the Supervisor API."""
+    async with get_session().get("/backups") as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+        return data["data"]["backups"]
+
+
+async def backup_info(slug: str) -> dict:
+    """Fetch the details of one backup from the Supervisor API."""
+    async with get_session().get(f"/backups/{slug}/info") as resp:
+        resp.raise_for_status()
+        data = await resp.json()
+        return data["data"]
+
+
+class BackupDiscovery:
+    """Remembers the Supervisor's backups and which still need uploading.
+
+    ``backups`` maps slugs to backup details in Supervisor order and is
+    persisted in /data, so a restart does not fetch details again.
+    """
+
+    def __init__(self):
+        self.backups: dict[str, dict] = load_discovered()
+        self._pending: dict[str, None] | None = None  # ordered set of slugs
+
+    async def refresh(self, uploaded: dict) -> list[dict]:
+        """Sync with the Supervisor. Returns the backups not seen before.
+
+        New backups are pending. ``uploaded`` is only consulted to work
+        out the pending set the first time.
+        """
+        listing = await list_ha_backups()
+        current = {backup["slug"]: backup for backup in listing}
+        new = [b for slug, b in current.items() if slug not in self.backups]
+        await self._add_details(new)
+        removed = self.backups.keys() - current.keys()
+        self.backups = {
+            slug: self.backups.get(slug, backup) for slug, backup in current.items()
+        }
+        if new or removed:
+            _logger.info(
+                "Discovered %d new backups, %d removed", len(new), len(removed)
+            )
+            save_discovered(self.backups)
+        if self._pending is None:
+            self.settle(uploaded)
+        else:
+            for slug in removed:
+                self._pending.pop(slug, None)
+            for backup in new:
+                self._pending[backup["slug"]] = None
+        return new
+
+    def settle(self, uploaded: dict) -> None:
+        """Recompute the pending set from the tracked uploads."""
+        self._pending = {
+            slug: None for slug in self.backups if slug not in uploaded
+        }
+
+    def pending(self) -> list[dict]:
+        """Return the backups still to upload, in Supervisor order."""
+        return [self.backups[slug] for slug in self._pending or ()]
+
+    async def _add_details(self, backups: list[dict]) -> None:
+        semaphore = asyncio.Semaphore(INFO_CONCURRENCY)
+
+        async def fetch(backup: dict) -> None:
+            async with semaphore:
+                try:
+                    info = await backup_info(backup["slug"])
+                except Exception as exc:
+                    _logger.warning(
+                        "Could not fetch details of %s: %s", backup["slug"], exc
+                    )
+                    return
+            backup.update({key: info[key] for key in INFO_KEYS if key in info})
+
+        await asyncio.gather(*(fetch(backup) for backup in backups))
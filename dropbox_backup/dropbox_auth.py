@@ -1,13 +1,33 @@
 """Dropbox OAuth2 authentication helpers."""
 
+import asyncio
 import logging
+from datetime import datetime, timedelta, timezone
 
 import dropbox
 
+from dropbox_client import AsyncDropbox, PacedSession, run_blocking
 from state import load_tokens, save_tokens, clear_tokens
 
 _logger = logging.getLogger(__name__)
 
+# Refresh the access token this long before it expires
+REFRESH_MARGIN = timedelta(minutes=10)
+# Longest sleep between expiry checks, and wait after a failed refresh
+CHECK_SECONDS = 300
+
+
+def _utcnow() -> datetime:
+    # The SDK keeps token expiry as a naive UTC datetime
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _parse_expiry(value: str | None) -> datetime | None:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
 
 class DropboxAuth:
     """Manages Dropbox OAuth2 flow and token lifecycle."""
@@ -16,6 +36,7 @@ class DropboxAuth:
         self.app_key = app_key
         self.app_secret = app_secret
         self._flow: dropbox.DropboxOAuth2FlowNoRedirect | None = None
+        self._client: AsyncDropbox | None = None
 
     def start_auth(self) -> str:
         """Start OAuth2 flow (no redirect). Returns the authorization URL."""
@@ -39,26 +60,90 @@ class DropboxAuth:
             "expires_at": result.expires_at.isoformat() if result.expires_at else None,
         }
         save_tokens(tokens)
+        self._client = None
         _logger.info("Dropbox authorization completed successfully")
         return tokens
 
     def get_client(self) -> dropbox.Dropbox | None:
-        """Get an authenticated Dropbox client, or None if not authorized."""
+        """Get an authenticated Dropbox client, or None if not authorized.
+
+        The client and its HTTP session are created once and reused; the
+        stored access token is used as long as it is valid, so only the
+        first call after startup may need a refresh round-trip.
+        """
         tokens = load_tokens()
         if not tokens or not tokens.get("refresh_token"):
+            self._client = None
             return None
+        if self._client is not None:
+            return self._client.client
         try:
             dbx = dropbox.Dropbox(
+                oauth2_access_token=tokens.get("access_token"),
+                oauth2_access_token_expiration=_parse_expiry(tokens.get("expires_at")),
                 oauth2_refresh_token=tokens["refresh_token"],
                 app_key=self.app_key,
                 app_secret=self.app_secret,
+                session=PacedSession(),
             )
-            dbx.check_and_refresh_access_token()
-            return dbx
+            self._refresh(dbx, force=False)
         except dropbox.exceptions.AuthError as exc:
             _logger.error("Dropbox auth failed: %s", exc)
             clear_tokens()
             return None
+        self._client = AsyncDropbox(dbx)
+        return dbx
+
+    async def async_get_client(self) -> AsyncDropbox | None:
+        """Like ``get_client``, without blocking the event loop."""
+        if self._client is None or not self.is_authorized():
+            await run_blocking(self.get_client)
+        return self._client
+
+    async def keep_token_fresh(self) -> None:
+        """Refresh the access token shortly before it expires, until cancelled.
+
+        Runs in the background so backups never wait for a refresh.
+        """
+        while True:
+            try:
+                dbx = await self.async_get_client()
+                expires = dbx.client._oauth2_access_token_expiration if dbx else None
+                if expires is not None and expires - REFRESH_MARGIN <= _utcnow():
+                    await run_blocking(self._refresh, dbx.client, True)
+                    expires = dbx.client._oauth2_access_token_expiration
+                delay = CHECK_SECONDS
+                if expires is not None:
+                    due = (expires - REFRESH_MARGIN - _utcnow()).total_seconds()
+                    delay = min(max(due, 1), delay)
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                raise
+            except dropbox.exceptions.AuthError as exc:
+                _logger.error("Dropbox auth failed: %s", exc)
+                clear_tokens()
+                self._client = None
+            except Exception as exc:
+                _logger.warning("Access token refresh failed: %s", exc)
+                await asyncio.sleep(CHECK_SECONDS)
+
+    def _refresh(self, dbx: dropbox.Dropbox, force: bool) -> None:
+        """Refresh the access token (if due, unless ``force``) and persist it."""
+        previous = dbx._oauth2_access_token
+        if force:
+            dbx.refresh_access_token()
+        else:
+            dbx.check_and_refresh_access_token()
+        if dbx._oauth2_access_token == previous:
+            return
+        expires = dbx._oauth2_access_token_expiration
+        tokens = load_tokens() or {}
+        tokens.update(
+            access_token=dbx._oauth2_access_token,
+            expires_at=expires.isoformat() if expires else None,
+        )
+        save_tokens(tokens)
+        _logger.info("Refreshed Dropbox access token, valid until %s UTC", expires)
 
     @staticmethod
     def is_authorized() -> bool:
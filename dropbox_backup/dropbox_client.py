@@ -0,0 +1,93 @@
+"""Async facade over the synchronous Dropbox SDK."""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+import dropbox
+import requests
+
+from ratelimit import ThrottledBody, TokenBucket
+
+# The SDK's requests session keeps at most 8 pooled connections; more
+# threads than that would only queue inside the session.
+MAX_WORKERS = 8
+
+_executor = ThreadPoolExecutor(
+    max_workers=MAX_WORKERS, thread_name_prefix="dropbox"
+)
+
+# Bucket metering the upload bodies of the call running on this thread
+_pacing = threading.local()
+
+
+async def run_blocking(fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking Dropbox call on the dedicated thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor, functools.partial(fn, *args, **kwargs)
+    )
+
+
+def _paced(bucket: TokenBucket, fn: Callable, *args, **kwargs) -> Any:
+    _pacing.bucket = bucket
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        _pacing.bucket = None
+
+
+class PacedSession(requests.Session):
+    """The SDK's HTTP session, metering upload bodies of paced calls.
+
+    While a call made through ``AsyncDropbox.paced`` runs, the bytes it
+    posts are sent as a ``ThrottledBody``, so the bucket is charged as the
+    body goes out, once for every attempt the SDK makes.
+    """
+
+    def __init__(self):
+        super().__init__()
+        pinned = dropbox.create_session(max_connections=MAX_WORKERS)
+        self.verify = pinned.verify
+        self.mount("https://", pinned.get_adapter("https://"))
+
+    def request(self, method: str, url: str, data: Any = None, **kwargs) -> requests.Response:
+        bucket = getattr(_pacing, "bucket", None)
+        if bucket is not None and isinstance(data, bytes):
+            data = ThrottledBody(data, bucket)
+        return super().request(method, url, data=data, **kwargs)
+
+
+class AsyncDropbox:
+    """Awaitable wrapper around an authenticated ``dropbox.Dropbox``.
+
+    Every SDK method is exposed as a coroutine with the same signature,
+    e.g. ``await dbx.files_list_folder(path)``, so HTTP round-trips never
+    block the event loop.
+    """
+
+    def __init__(self, client: dropbox.Dropbox, bucket: TokenBucket | None = None):
+        self.client = client
+        self.bucket = bucket
+
+    def paced(self, bucket: TokenBucket) -> "AsyncDropbox":
+        """Return a view whose request bodies are metered by ``bucket``.
+
+        Pacing needs the client to be built with a ``PacedSession``.
+        """
+        return AsyncDropbox(self.client, bucket)
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            if self.bucket is None:
+                return await run_blocking(attr, *args, **kwargs)
+            return await run_blocking(_paced, self.bucket, attr, *args, **kwargs)
+
+        call.__name__ = name
+        return call
@@ -0,0 +1,189 @@
+"""Local inventory of the files in the Dropbox backup folder.
+
+The listing is kept in /data together with Dropbox's list_folder cursor,
+so it is brought up to date with ``files_list_folder_continue``, which
+only returns what changed, instead of listing the whole folder again.
+A background watcher long-polls Dropbox to learn about changes as they
+happen.
+"""
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import datetime
+
+import aiohttp
+import dropbox
+
+from dropbox_client import AsyncDropbox
+from state import load_inventory, save_inventory
+
+_logger = logging.getLogger(__name__)
+
+LONGPOLL_URL = "https://notify.dropboxapi.com/2/files/list_folder/longpoll"
+LONGPOLL_TIMEOUT = 480  # seconds, the maximum Dropbox allows
+RETRY_SECONDS = 60  # wait after a failed poll or while not authorized
+
+
+class RemoteInventory:
+    """Cached, incrementally updated listing of the backup folder.
+
+    Entries are keyed by lower-cased path and hold the path, size,
+    content hash and server modification time of every file below the
+    backup folder, including the chunk store.
+    """
+
+    def __init__(self, backup_path: str):
+        self.backup_path = backup_path
+        data = load_inventory()
+        if data.get("backup_path") == backup_path:
+            self.cursor: str | None = data.get("cursor")
+            self.entries: dict[str, dict] = data.get("entries", {})
+        else:
+            self.cursor, self.entries = None, {}
+        self._lock = asyncio.Lock()
+        self._changed = False  # entries differ from the saved inventory
+
+    async def refresh(self, dbx: AsyncDropbox) -> None:
+        """Bring the inventory up to date with Dropbox.
+
+        The inventory is only saved when entries changed: a newer cursor
+        alone is not worth rewriting the file for, as following the
+        saved one again just replays the same changes.
+        """
+        async with self._lock:
+            if self.cursor is not None:
+                try:
+                    await self._follow(dbx, self.cursor)
+                except dropbox.exceptions.ApiError as exc:
+                    if not exc.error.is_reset():
+                        raise
+                    _logger.info("Inventory cursor was reset, listing again")
+                    self.cursor = None
+            if self.cursor is None:
+                await self._relist(dbx)
+            if not self._changed:
+                return
+            # Entries are only modified under the lock, so the write can
+            # run off the event loop
+            await asyncio.to_thread(save_inventory, {
+                "backup_path": self.backup_path,
+                "cursor": self.cursor,
+                "entries": self.entries,
+            })
+            self._changed = False
+
+    def files(
+        self, folder: str | None = None, recursive: bool = False
+    ) -> list[dropbox.files.FileMetadata]:
+        """Return the files in ``folder`` (default: the backup folder)."""
+        prefix = (folder or self.backup_path).lower() + "/"
+        return [
+            _metadata(path, info) for path, info in self.entries.items()
+            if path.startswith(prefix) and (recursive or "/" not in path[len(prefix):])
+        ]
+
+    def has(self, path: str) -> bool:
+        """Tell whether a file exists at ``path``."""
+        return path.lower() in self.entries
+
+    async def watch(
+        self, get_client: Callable[[], Awaitable[AsyncDropbox | None]]
+    ) -> None:
+        """Keep the inventory fresh until cancelled.
+
+        The long-poll endpoint needs no authentication and returns as
+        soon as anything below the backup folder changes; only then is
+        a client needed to fetch the changes.
+        """
+        timeout = aiohttp.ClientTimeout(total=LONGPOLL_TIMEOUT + 90)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while True:
+                try:
+                    if self.cursor is None:
+                        dbx = await get_client()
+                        if dbx is None:
+                            await asyncio.sleep(RETRY_SECONDS)
+                            continue
+                        await self.refresh(dbx)
+                        if self.cursor is None:
+                            # The backup folder does not exist yet
+                            await asyncio.sleep(RETRY_SECONDS)
+                            continue
+                    async with session.post(LONGPOLL_URL, json={
+                        "cursor": self.cursor, "timeout": LONGPOLL_TIMEOUT,
+                    }) as resp:
+                        if resp.status == 409:
+                            # The cursor was reset or expired: list again
+                            _logger.info("Inventory cursor expired, listing again")
+                            self.cursor = None
+                            continue
+                        resp.raise_for_status()
+                        result = await resp.json(content_type=None)
+                    if result.get("changes"):
+                        dbx = await get_client()
+                        if dbx is not None:
+                            await self.refresh(dbx)
+                    if result.get("backoff"):
+                        await asyncio.sleep(result["backoff"])
+                except asyncio.CancelledError:
+                    raise
+                except Exception as exc:
+                    _logger.warning("Inventory watch failed: %s", exc)
+                    await asyncio.sleep(RETRY_SECONDS)
+
+    async def _relist(self, dbx: AsyncDropbox) -> None:
+        self.entries = {}
+        self._changed = True
+        try:
+            result = await dbx.files_list_folder(self.backup_path, recursive=True)
+        except dropbox.exceptions.ApiError as exc:
+            if exc.error.is_path() and exc.error.get_path().is_not_found():
+                return
+            raise
+        self._apply(result.entries)
+        if result.has_more:
+            await self._follow(dbx, result.cursor)
+        else:
+            self.cursor = result.cursor
+
+    async def _follow(self, dbx: AsyncDropbox, cursor: str) -> None:
+        while True:
+            result = await dbx.files_list_folder_continue(cursor)
+            self._apply(result.entries)
+            cursor = result.cursor
+            if not result.has_more:
+                break
+        self.cursor = cursor
+
+    def _apply(self, entries: list[dropbox.files.Metadata]) -> None:
+        if entries:
+            self._changed = True
+        for entry in entries:
+            if isinstance(entry, dropbox.files.FileMetadata):
+                modified = getattr(entry, "server_modified", None)
+                self.entries[entry.path_lower] = {
+                    "path": entry.path_display,
+                    "size": entry.size,
+                    "content_hash": entry.content_hash,
+                    "server_modified": modified.isoformat() if modified else None,
+                }
+            elif isinstance(entry, dropbox.files.DeletedMetadata):
+                self.entries.pop(entry.path_lower, None)
+                # A deleted folder takes its contents with it
+                prefix = entry.path_lower + "/"
+                for path in [p for p in self.entries if p.startswith(prefix)]:
+                    del self.entries[path]
+
+
+def _metadata(path_lower: str, info: dict) -> dropbox.files.FileMetadata:
+    metadata = dropbox.files.FileMetadata(
+        name=info["path"].rsplit("/", 1)[-1],
+        path_lower=path_lower,
+        path_display=info["path"],
+        size=info["size"],
+        content_hash=info["content_hash"],
+    )
+    if info.get("server_modified"):
+        metadata.server_modified = datetime.fromisoformat(info["server_modified"])
+    return metadata
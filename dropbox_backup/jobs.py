@@ -0,0 +1,136 @@
+"""Background backup jobs with single-flight deduplication.
+
+Every backup run — manual, scheduled or for new backups — is a job.
+Only one job runs at a time: a trigger that arrives while a job is
+running is merged into it instead of starting an overlapping run.
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timezone
+
+_logger = logging.getLogger(__name__)
+
+HISTORY_SIZE = 50  # finished jobs kept for /jobs
+
+
+def _outcome(result: dict) -> str:
+    """Job state for a run's result: ``failed`` when nothing was uploaded
+    because of errors, ``partial`` when only some backups failed."""
+    if result.get("error"):
+        return "failed"
+    if result.get("errors"):
+        return "partial" if result.get("uploaded") else "failed"
+    return "succeeded"
+
+
+class Job:
+    """One backup run and the triggers merged into it."""
+
+    def __init__(self, trigger: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.state = "running"
+        self.merged = 0
+        self.started_at = datetime.now(timezone.utc)
+        self.finished_at: datetime | None = None
+        self.result: dict | None = None
+        self._task: asyncio.Task | None = None
+
+    def to_dict(self) -> dict:
+        """Return the job as a JSON-serialisable dict."""
+        return {
+            "id": self.id,
+            "trigger": self.trigger,
+            "state": self.state,
+            "merged_triggers": self.merged,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "result": self.result,
+        }
+
+
+class JobManager:
+    """Runs backup jobs one at a time and remembers recent ones.
+
+    ``run_fn`` performs the backup and returns its result; ``on_finish``
+    is called with the result of every job, failed ones included.
+    """
+
+    def __init__(
+        self,
+        run_fn: Callable[[], Awaitable[dict]],
+        on_finish: Callable[[dict], None] | None = None,
+    ):
+        self.run_fn = run_fn
+        self.on_finish = on_finish
+        self.current: Job | None = None
+        self.jobs: OrderedDict[str, Job] = OrderedDict()
+
+    @property
+    def busy(self) -> bool:
+        """Whether a job is running."""
+        return self.current is not None
+
+    def submit(self, trigger: str) -> Job:
+        """Start a job, or return the running one the trigger was merged into."""
+        if self.current is not None:
+            self.current.merged += 1
+            _logger.info(
+                "Backup already running (job %s), merging %s trigger",
+                self.current.id, trigger,
+            )
+            return self.current
+        job = Job(trigger)
+        self.current = job
+        self.jobs[job.id] = job
+        while len(self.jobs) > HISTORY_SIZE:
+            self.jobs.popitem(last=False)
+        job._task = asyncio.create_task(self._run(job))
+        _logger.info("Started backup job %s (%s)", job.id, trigger)
+        return job
+
+    async def run(self, trigger: str) -> dict:
+        """Submit a job and wait for it. Returns its result."""
+        job = self.submit(trigger)
+        await asyncio.shield(job._task)
+        return job.result
+
+    async def close(self) -> None:
+        """Cancel the running job, if any, and wait until it has stopped."""
+        job = self.current
+        if job is None or job._task is None:
+            return
+        job._task.cancel()
+        try:
+            await job._task
+        except asyncio.CancelledError:
+            pass
+
+    def get(self, job_id: str) -> Job | None:
+        """Look up a job by id."""
+        return self.jobs.get(job_id)
+
+    def history(self) -> list[Job]:
+        """Return the known jobs, newest first."""
+        return list(reversed(self.jobs.values()))
+
+    async def _run(self, job: Job) -> None:
+        try:
+            job.result = await self.run_fn()
+            job.state = _outcome(job.result)
+        except asyncio.CancelledError:
+            job.state = "cancelled"
+            raise
+        except Exception as exc:
+            _logger.error("Backup job %s failed: %s", job.id, exc)
+            job.result = {"error": str(exc)}
+            job.state = "failed"
+        finally:
+            job.finished_at = datetime.now(timezone.utc)
+            self.current = None
+        if self.on_finish is not None:
+            self.on_finish(job.result)
@@ -0,0 +1,32 @@
+"""Process pool shared by CPU-bound stages of the backup pipeline."""
+
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+_logger = logging.getLogger(__name__)
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Return the pool, starting one process per CPU on first use."""
+    global _executor
+    if _executor is None:
+        workers = os.cpu_count() or 1
+        # forkserver: forking the threaded addon process directly is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        _logger.info("Started process pool with %d processes", workers)
+    return _executor
+
+
+def shutdown() -> None:
+    """Stop the pool, if it was started."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
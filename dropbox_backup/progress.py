@@ -0,0 +1,116 @@
+"""Live transfer progress, published to subscribers such as the web UI.
+
+Transfers report progress once per chunk; updates of a transfer are
+published at most every ``PUBLISH_SECONDS``, and a subscriber that
+falls behind loses its oldest updates rather than slowing transfers.
+"""
+
+import asyncio
+import time
+
+PUBLISH_SECONDS = 1.0  # min interval between updates of one transfer
+QUEUE_SIZE = 32  # updates buffered per subscriber
+
+
+class TransferProgress:
+    """Progress of one backup transfer.
+
+    ``bytes_read`` counts the backup read from the Supervisor, which is
+    what ``total`` (the backup size) and the ETA refer to; ``bytes_sent``
+    counts what was uploaded, which compression and deduplication shrink.
+    """
+
+    def __init__(self, bus: "ProgressBus", slug: str, name: str, total: int | None):
+        self.bus = bus
+        self.slug = slug
+        self.name = name
+        self.total = total or None
+        self.state = "running"
+        self.bytes_read = 0
+        self.bytes_sent = 0
+        self._started = time.monotonic()
+        self._published = 0.0
+
+    def read(self, nbytes: int) -> None:
+        """Record a chunk read from the Supervisor."""
+        self.bytes_read += nbytes
+        self._maybe_publish()
+
+    def sent(self, nbytes: int) -> None:
+        """Record a chunk uploaded to Dropbox."""
+        self.bytes_sent += nbytes
+        self._maybe_publish()
+
+    def finish(self, state: str) -> None:
+        """Mark the transfer done or failed and publish it."""
+        self.state = state
+        self.bus.publish(self.snapshot())
+        self.bus.transfers.pop(self.slug, None)
+
+    def snapshot(self) -> dict:
+        """Return the progress as a JSON-serialisable dict."""
+        elapsed = time.monotonic() - self._started
+        rate = self.bytes_read / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.total and rate > 0 and self.state == "running":
+            eta = round(max(self.total - self.bytes_read, 0) / rate)
+        return {
+            "slug": self.slug,
+            "name": self.name,
+            "state": self.state,
+            "bytes_read": self.bytes_read,
+            "bytes_sent": self.bytes_sent,
+            "total_bytes": self.total,
+            "percent": (
+                round(min(self.bytes_read / self.total, 1.0) * 100, 1)
+                if self.total else None
+            ),
+            "bytes_per_second": int(rate),
+            "elapsed_seconds": round(elapsed),
+            "eta_seconds": eta,
+        }
+
+    def _maybe_publish(self) -> None:
+        now = time.monotonic()
+        if now - self._published >= PUBLISH_SECONDS:
+            self._published = now
+            self.bus.publish(self.snapshot())
+
+
+class ProgressBus:
+    """Fans progress updates out to subscriber queues."""
+
+    def __init__(self):
+        self.transfers: dict[str, TransferProgress] = {}
+        self._subscribers: set[asyncio.Queue] = set()
+
+    def start(self, slug: str, name: str, total: int | None) -> TransferProgress:
+        """Begin tracking a transfer."""
+        progress = TransferProgress(self, slug, name, total)
+        self.transfers[slug] = progress
+        self.publish(progress.snapshot())
+        return progress
+
+    def snapshot(self) -> list[dict]:
+        """Return the progress of every running transfer."""
+        return [progress.snapshot() for progress in self.transfers.values()]
+
+    def subscribe(self) -> asyncio.Queue:
+        """Return a queue receiving every update from now on."""
+        queue: asyncio.Queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        """Stop delivering updates to ``queue``."""
+        self._subscribers.discard(queue)
+
+    def publish(self, event: dict) -> None:
+        """Deliver an update to every subscriber without waiting."""
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+bus = ProgressBus()
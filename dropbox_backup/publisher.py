@@ -0,0 +1,103 @@
+"""Background publishing of sensor states and events to Home Assistant.
+
+Callers hand updates over without waiting for the Supervisor. Updates
+arriving within ``COALESCE_SECONDS`` are published together: only the
+latest sensor state is posted, and only if it differs from the last one
+posted; queued events are fired side by side in one batch.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from events import fire_event
+from sensors import post_sensor
+
+_logger = logging.getLogger(__name__)
+
+COALESCE_SECONDS = 0.5
+MAX_QUEUED_EVENTS = 100  # oldest events are dropped beyond this
+# An unchanged state is re-posted this often, so the sensor comes back
+# after Home Assistant restarts
+REPOST_SECONDS = 900
+CLOSE_TIMEOUT = 5  # seconds allowed to flush pending updates on shutdown
+
+
+class Publisher:
+    """Coalescing, non-blocking publisher for sensor updates and events."""
+
+    def __init__(self):
+        self._state: dict | None = None
+        self._posted: dict | None = None
+        self._posted_at = 0.0
+        self._events: deque[tuple[str, dict]] = deque(maxlen=MAX_QUEUED_EVENTS)
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def update_state(self, payload: dict) -> None:
+        """Queue a sensor state; it replaces any state not yet posted."""
+        self._state = payload
+        self._wake.set()
+
+    def fire(self, event_type: str, data: dict) -> None:
+        """Queue an event for the Home Assistant event bus."""
+        self._events.append((event_type, data))
+        self._wake.set()
+
+    def start(self) -> None:
+        """Start publishing in the background."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self) -> None:
+        """Stop the background task and publish what is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), CLOSE_TIMEOUT)
+        except TimeoutError:
+            _logger.warning("Gave up publishing pending updates on shutdown")
+
+    async def flush(self) -> None:
+        """Publish the queued events and the latest state now."""
+        events = list(self._events)
+        self._events.clear()
+        if events:
+            fired = [asyncio.ensure_future(fire_event(t, data)) for t, data in events]
+            try:
+                await asyncio.gather(*fired)
+            except asyncio.CancelledError:
+                # Queue the events not fired yet again for the final flush
+                self._events.extendleft(reversed([
+                    event for event, task in zip(events, fired) if task.cancelled()
+                ]))
+                raise
+        payload = self._state
+        if payload is None:
+            return
+        fresh = time.monotonic() - self._posted_at < REPOST_SECONDS
+        if payload == self._posted and fresh:
+            return
+        if await post_sensor(payload):
+            self._posted = payload
+            self._posted_at = time.monotonic()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), REPOST_SECONDS)
+            except TimeoutError:
+                pass  # nothing changed: flush re-posts the state
+            else:
+                await asyncio.sleep(COALESCE_SECONDS)
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as exc:
+                _logger.warning("Publishing to Home Assistant failed: %s", exc)
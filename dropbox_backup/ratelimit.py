@@ -0,0 +1,146 @@
+"""Token-bucket bandwidth limiting with day and night profiles."""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from datetime import time as dt_time
+
+_logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket metering bytes at a variable rate.
+
+    ``consume`` takes the tokens up front and sleeps off any deficit, so
+    concurrent callers queue up fairly and the long-run rate never
+    exceeds ``rate`` bytes per second. A rate of 0 means unlimited.
+    The bucket is shared between the event loop and the Dropbox worker
+    threads, which meter request bodies with ``take``.
+    """
+
+    def __init__(self, rate: float = 0, burst_seconds: float = 1.0):
+        self.rate = rate
+        self.burst_seconds = burst_seconds
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, nbytes: int) -> float:
+        """Take ``nbytes`` of tokens; return the seconds to wait before sending."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate <= 0:
+                self._tokens = 0.0
+                self._updated = now
+                return 0.0
+            burst = self.rate * self.burst_seconds
+            self._tokens = min(
+                self._tokens + (now - self._updated) * self.rate, burst
+            )
+            self._updated = now
+            self._tokens -= nbytes
+            return max(-self._tokens / self.rate, 0.0)
+
+    async def consume(self, nbytes: int) -> None:
+        """Wait until ``nbytes`` may be transferred."""
+        delay = self.reserve(nbytes)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def take(self, nbytes: int) -> None:
+        """Block the calling thread until ``nbytes`` may be transferred."""
+        delay = self.reserve(nbytes)
+        if delay:
+            time.sleep(delay)
+
+
+class ThrottledBody:
+    """Request body that meters a buffer through a token bucket as it is read.
+
+    The HTTP client reads the body in slices of at most ``SLICE_SIZE`` on
+    the thread sending the request, and each slice waits for its tokens,
+    so the request goes out at the bucket's rate instead of in one burst.
+    """
+
+    SLICE_SIZE = 64 * 1024
+
+    def __init__(self, data: bytes, bucket: TokenBucket):
+        self._data = memoryview(data)
+        self._bucket = bucket
+        self._offset = 0
+
+    def __len__(self) -> int:
+        return len(self._data) - self._offset
+
+    def read(self, size: int = -1) -> bytes:
+        """Return the next slice of the body once the bucket allows it."""
+        if size is None or size < 0 or size > self.SLICE_SIZE:
+            size = self.SLICE_SIZE
+        piece = self._data[self._offset:self._offset + size]
+        self._offset += len(piece)
+        if piece:
+            self._bucket.take(len(piece))
+        return bytes(piece)
+
+
+def _parse_time(value: str, default: dt_time) -> dt_time:
+    try:
+        return dt_time.fromisoformat(value)
+    except (TypeError, ValueError):
+        _logger.warning("Invalid time %r, using %s", value, default)
+        return default
+
+
+class BandwidthLimiter:
+    """Caps download and upload throughput with day and night limits.
+
+    The same limiter is shared by every transfer, so concurrent workers
+    split the configured rate between them. Downloads from the Supervisor
+    and uploads to Dropbox are metered by separate buckets, each capped
+    at the limit currently in effect.
+    """
+
+    def __init__(
+        self,
+        day_mbps: float = 0,
+        night_mbps: float = 0,
+        night_start: str = "22:00",
+        night_end: str = "06:00",
+    ):
+        self.day_rate = day_mbps * 1_000_000 / 8
+        self.night_rate = night_mbps * 1_000_000 / 8
+        self.night_start = _parse_time(night_start, dt_time(22, 0))
+        self.night_end = _parse_time(night_end, dt_time(6, 0))
+        self.download = TokenBucket()
+        self.upload = TokenBucket()
+
+    @classmethod
+    def from_options(cls, options: dict) -> "BandwidthLimiter":
+        """Build a limiter from the addon options."""
+        return cls(
+            day_mbps=options.get("bandwidth_limit_day_mbps", 0),
+            night_mbps=options.get("bandwidth_limit_night_mbps", 0),
+            night_start=options.get("night_start", "22:00"),
+            night_end=options.get("night_end", "06:00"),
+        )
+
+    def current_rate(self, now: datetime | None = None) -> float:
+        """Return the limit in effect, in bytes per second (0 = unlimited)."""
+        clock = (now or datetime.now()).time()
+        if self.night_start <= self.night_end:
+            night = self.night_start <= clock < self.night_end
+        else:
+            night = clock >= self.night_start or clock < self.night_end
+        return self.night_rate if night else self.day_rate
+
+    async def throttle_download(self, nbytes: int) -> None:
+        """Wait until ``nbytes`` may be read from the Supervisor."""
+        self.download.rate = self.current_rate()
+        await self.download.consume(nbytes)
+
+    def upload_bucket(self) -> TokenBucket:
+        """Return the bucket metering uploads to Dropbox at the current limit."""
+        self.upload.rate = self.current_rate()
+        return self.upload
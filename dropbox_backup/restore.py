@@ -0,0 +1,175 @@
+"""Restore a chunk store backup from its manifest.
+
+A backup stored with ``storage_mode: chunks`` is a manifest listing its
+chunks in order. Restoring downloads the chunks, checks each against
+its content hash and the reassembled tar against the backup's, and
+either uploads it to the Supervisor, where it shows up among the Home
+Assistant backups, or writes it to a file. Run it in the add-on
+container::
+
+    python3 /app/restore.py "/HomeAssistant/Backups/<name>.manifest.json"
+    python3 /app/restore.py "<manifest path>" --output /homeassistant/backup.tar
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from collections import deque
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+import aiohttp
+import dropbox
+
+from chunk_store import MANIFEST_VERSION, chunk_path
+from content_hash import DropboxContentHasher, content_hash
+from dropbox_auth import DropboxAuth
+from dropbox_client import AsyncDropbox
+from options import load_options
+from supervisor import DOWNLOAD_TIMEOUT, close_session, get_session
+
+_logger = logging.getLogger(__name__)
+
+PREFETCH_CHUNKS = 4  # chunks downloaded ahead of the one being restored
+
+
+class RestoreError(Exception):
+    """The data in Dropbox does not match the manifest."""
+
+
+async def load_manifest(dbx: AsyncDropbox, manifest_path: str) -> dict:
+    """Download and parse a backup manifest."""
+    _, response = await dbx.files_download(manifest_path)
+    manifest = json.loads(response.content)
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise RestoreError(
+            f"Unsupported manifest version {manifest.get('version')!r}"
+        )
+    return manifest
+
+
+async def restore_chunks(
+    dbx: AsyncDropbox, manifest_path: str, manifest: dict
+) -> AsyncIterator[bytes]:
+    """Yield the backup a manifest describes, one verified chunk at a time.
+
+    Raises ``RestoreError`` as soon as a chunk does not match its id, and
+    after the last chunk if the whole does not match the manifest.
+    """
+    backup_path = manifest_path.rsplit("/", 1)[0]
+
+    async def fetch(chunk_id: str) -> bytes:
+        _, response = await dbx.files_download(chunk_path(backup_path, chunk_id))
+        return response.content
+
+    hasher = DropboxContentHasher()
+    pending = deque(manifest["chunks"])
+    inflight: deque[tuple[str, int, asyncio.Task]] = deque()
+    try:
+        while pending or inflight:
+            while pending and len(inflight) < PREFETCH_CHUNKS:
+                chunk_id, size = pending.popleft()
+                inflight.append(
+                    (chunk_id, size, asyncio.create_task(fetch(chunk_id)))
+                )
+            chunk_id, size, task = inflight.popleft()
+            data = await task
+            if len(data) != size or await asyncio.to_thread(content_hash, data) != chunk_id:
+                raise RestoreError(f"Chunk {chunk_id} is damaged")
+            await asyncio.to_thread(hasher.update, data)
+            yield data
+    finally:
+        for _, _, task in inflight:
+            task.cancel()
+    restored = (hasher.bytes_hashed, hasher.hexdigest())
+    if restored != (manifest["size"], manifest["content_hash"]):
+        raise RestoreError("Restored backup does not match its manifest")
+
+
+async def restore_to_file(
+    dbx: AsyncDropbox, manifest_path: str, output: Path
+) -> dict:
+    """Restore a backup into ``output``. Returns its manifest.
+
+    The tar is written next to ``output`` and only renamed into place
+    once it was verified.
+    """
+    manifest = await load_manifest(dbx, manifest_path)
+    partial = output.with_name(output.name + ".part")
+    try:
+        with partial.open("wb") as file:
+            async for data in restore_chunks(dbx, manifest_path, manifest):
+                await asyncio.to_thread(file.write, data)
+        partial.replace(output)
+    finally:
+        partial.unlink(missing_ok=True)
+    return manifest
+
+
+async def restore_to_supervisor(dbx: AsyncDropbox, manifest_path: str) -> str:
+    """Restore a backup into Home Assistant. Returns its Supervisor slug.
+
+    The tar is streamed into the Supervisor's backup upload; the
+    Supervisor discards it if the restore fails part way.
+    """
+    manifest = await load_manifest(dbx, manifest_path)
+    with aiohttp.MultipartWriter("form-data") as form:
+        part = form.append(restore_chunks(dbx, manifest_path, manifest))
+        part.set_content_disposition(
+            "form-data", name="file", filename=f"{manifest['slug']}.tar"
+        )
+        async with get_session().post(
+            "/backups/new/upload", data=form, timeout=DOWNLOAD_TIMEOUT
+        ) as resp:
+            resp.raise_for_status()
+            result = await resp.json()
+    return result["data"]["slug"]
+
+
+async def _main(manifest_path: str, output: Path | None) -> int:
+    options = load_options()
+    auth = DropboxAuth(
+        options.get("dropbox_app_key", ""), options.get("dropbox_app_secret", "")
+    )
+    dbx = await auth.async_get_client()
+    if dbx is None:
+        _logger.error("Not authorized with Dropbox")
+        return 1
+    try:
+        if output is not None:
+            manifest = await restore_to_file(dbx, manifest_path, output)
+            _logger.info("Restored %s to %s", manifest["name"], output)
+        else:
+            slug = await restore_to_supervisor(dbx, manifest_path)
+            _logger.info("Restored %s as Home Assistant backup %s", manifest_path, slug)
+    except (RestoreError, aiohttp.ClientError, dropbox.exceptions.DropboxException) as exc:
+        _logger.error("Restore failed: %s", exc)
+        return 1
+    finally:
+        await close_session()
+    return 0
+
+
+def main() -> None:
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(
+        description="Restore a chunk store backup from its manifest."
+    )
+    parser.add_argument("manifest", help="Dropbox path of the .manifest.json")
+    parser.add_argument(
+        "--output", type=Path,
+        help="write the backup tar here instead of uploading it to Home Assistant",
+    )
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        stream=sys.stdout,
+    )
+    sys.exit(asyncio.run(_main(args.manifest, args.output)))
+
+
+if __name__ == "__main__":
+    main()
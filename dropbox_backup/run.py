@@ -1,5 +1,6 @@
 """Main entry point for the Dropbox Backup addon."""
 
+import asyncio
 import logging
 import sys
 
@@ -10,10 +11,18 @@ from aiohttp import web
 from options import load_options
 from dropbox_auth import DropboxAuth
 from backup_engine import run_backup
+from discovery import BackupDiscovery
+from inventory import RemoteInventory
+import process_pool
+import state
+import supervisor
+from ratelimit import BandwidthLimiter
+from jobs import JobManager
 from scheduler import BackupScheduler
+from watcher import BackupWatcher
 from web.server import create_app
-from events import fire_event
-from sensors import update_sensors
+from publisher import Publisher
+from sensors import sensor_payload, truncate_errors
 
 logging.basicConfig(
     level=logging.INFO,
@@ -30,59 +39,105 @@ def main() -> None:
     app_secret = options.get("dropbox_app_secret", "")
     automatic_backup = options.get("automatic_backup", True)
     interval_hours = options.get("backup_interval_hours", 24) if automatic_backup else 0
+    backup_times = options.get("backup_times", []) if automatic_backup else []
+    jitter_minutes = options.get("backup_jitter_minutes", 0)
+    upload_new_backups = options.get("upload_new_backups", True)
     max_backups = options.get("max_backups_in_dropbox", 10)
     backup_path = options.get("dropbox_backup_path", "/HomeAssistant/Backups")
+    max_workers = options.get("max_concurrent_transfers", 2)
+    limiter = BandwidthLimiter.from_options(options)
+    compression = options.get("compression", "off")
+    storage = options.get("storage_mode", "files")
 
     if not app_key or not app_secret:
         _logger.error("Dropbox app_key and app_secret must be configured in addon options")
 
     auth = DropboxAuth(app_key, app_secret)
+    inventory = RemoteInventory(backup_path)
+    discovery = BackupDiscovery()
+
+    publisher = Publisher()
+
+    def publish_state(backup_state: str) -> None:
+        app["backup_state"] = backup_state
+        app["status_channel"].notify()
+        publisher.update_state(sensor_payload(backup_state, scheduler))
 
     async def do_backup() -> dict:
-        app["backup_state"] = "running"
-        await update_sensors("running", scheduler, auth)
-        dbx = auth.get_client()
+        publish_state("running")
+        dbx = await auth.async_get_client()
         if dbx is None:
             _logger.warning("Skipping backup: not authorized with Dropbox")
             result = {"error": "Not authorized"}
-            await fire_event("dropbox_ha_backup.failed", {
+            publisher.fire("dropbox_ha_backup.failed", {
                 **result,
                 "timestamp": datetime.now().isoformat(),
             })
-            app["backup_state"] = "not_authorized"
-            await update_sensors("not_authorized", scheduler, auth)
+            publish_state("not_authorized")
             return result
         try:
-            result = await run_backup(dbx, backup_path, max_backups)
+            result = await run_backup(
+                dbx, backup_path, max_backups, max_workers, limiter,
+                compression=compression, storage=storage, inventory=inventory,
+                discovery=discovery,
+            )
         except Exception as exc:
-            result = {"error": str(exc)}
-            await fire_event("dropbox_ha_backup.failed", {
-                **result,
+            publisher.fire("dropbox_ha_backup.failed", {
+                "error": str(exc),
                 "timestamp": datetime.now().isoformat(),
             })
-            app["backup_state"] = "failed"
-            await update_sensors("failed", scheduler, auth)
+            publish_state("failed")
             raise
-        await fire_event("dropbox_ha_backup.success", {
+        publisher.fire("dropbox_ha_backup.success", {
             "uploaded": result.get("uploaded", []),
             "skipped": result.get("skipped", []),
-            "errors": result.get("errors", []),
+            "errors": truncate_errors(result.get("errors", [])),
             "timestamp": datetime.now().isoformat(),
         })
-        app["backup_state"] = "success"
-        await update_sensors("success", scheduler, auth)
+        publish_state("success")
         return result
 
-    scheduler = BackupScheduler(interval_hours, do_backup)
-    app = create_app(auth, scheduler, do_backup)
+    scheduler = BackupScheduler(
+        interval_hours, lambda: jobs.run("scheduled"),
+        times=backup_times, jitter_minutes=jitter_minutes,
+    )
+
+    def finish_job(result: dict) -> None:
+        scheduler.record_run(result)
+        # Coalesced with the state published at the end of the run
+        publish_state(app["backup_state"])
+
+    jobs = JobManager(do_backup, finish_job)
+    app = create_app(auth, scheduler, jobs, inventory)
     app["backup_state"] = "idle"
 
+    watcher = BackupWatcher(
+        discovery, lambda: jobs.run("new_backup"), lambda: jobs.busy
+    )
+
     async def on_startup(_app: web.Application) -> None:
+        supervisor.get_session()
         scheduler.start()
-        await update_sensors("idle", scheduler, auth)
+        if upload_new_backups:
+            watcher.start()
+        app["inventory_watch"] = asyncio.create_task(
+            inventory.watch(auth.async_get_client)
+        )
+        app["token_refresh"] = asyncio.create_task(auth.keep_token_fresh())
+        publisher.start()
+        publish_state("idle")
 
     async def on_cleanup(_app: web.Application) -> None:
+        # Stop a running backup before tearing down what it uses
+        await jobs.close()
         scheduler.stop()
+        watcher.stop()
+        app["inventory_watch"].cancel()
+        app["token_refresh"].cancel()
+        process_pool.shutdown()
+        await publisher.close()
+        await supervisor.close_session()
+        state.close()
 
     app.on_startup.append(on_startup)
     app.on_cleanup.append(on_cleanup)
@@ -1,33 +1,88 @@
-"""Simple async scheduler for periodic backup runs."""
+"""Wall-clock scheduler for periodic backup runs.
+
+The next run is derived from the last run, or from fixed times of day,
+and persisted in /data, so restarting the add-on neither postpones nor
+skips a backup: a run that was due while it was down starts right away.
+"""
 
 import asyncio
 import logging
+import random
 from datetime import datetime, timedelta, timezone
+from datetime import time as dt_time
 
-from state import load_last_run, save_last_run
+from state import load_last_run, load_schedule, save_last_run, save_schedule
 
 _logger = logging.getLogger(__name__)
 
+# Re-read the wall clock at least this often, so clock changes and host
+# suspend do not stretch a sleep past the planned run
+CHECK_SECONDS = 300
+
+
+def parse_times(values) -> list[dt_time]:
+    """Parse ``HH:MM`` times of day, skipping invalid entries."""
+    times = set()
+    for value in values or ():
+        try:
+            times.add(dt_time.fromisoformat(value).replace(second=0, microsecond=0))
+        except (TypeError, ValueError):
+            _logger.warning("Invalid backup time %r, ignoring it", value)
+    return sorted(times)
+
+
+def next_time_of_day(after: datetime, times: list[dt_time]) -> datetime:
+    """Return the first of ``times`` (local time) strictly after ``after``."""
+    local = after.astimezone()
+    for days in range(2):
+        day = local.date() + timedelta(days=days)
+        for clock in times:
+            candidate = datetime.combine(day, clock).astimezone()
+            if candidate > local:
+                return candidate.astimezone(timezone.utc)
+    raise ValueError("no backup times configured")
+
 
 class BackupScheduler:
-    """Runs backup engine on a configurable interval."""
+    """Runs the backup engine on an interval or at fixed times of day.
+
+    With ``times`` the backup runs at the next of those local times after
+    the last run; otherwise ``interval_hours`` after the last run. Up to
+    ``jitter_minutes`` of random delay is added to each run.
+    """
 
-    def __init__(self, interval_hours: float, backup_callback):
+    def __init__(
+        self,
+        interval_hours: float,
+        backup_callback,
+        times=(),
+        jitter_minutes: float = 0,
+    ):
         self.interval_hours = interval_hours
         self.backup_callback = backup_callback
+        self.times = parse_times(times)
+        self.jitter_minutes = max(jitter_minutes, 0)
         self._task: asyncio.Task | None = None
+        self._wake = asyncio.Event()
         self.next_run: datetime | None = None
         self._restore_last_run()
+        self._restore_next_run()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether automatic backups are scheduled."""
+        return bool(self.times) or self.interval_hours > 0
 
     def start(self) -> None:
         """Start the scheduler loop."""
-        if self.interval_hours <= 0:
+        if not self.enabled:
             _logger.info("Scheduler disabled (interval_hours=%s)", self.interval_hours)
             return
         if self._task is not None:
             return
         self._task = asyncio.create_task(self._loop())
-        _logger.info("Scheduler started with interval %s hours", self.interval_hours)
+        _logger.info("Scheduler started (%s), next backup at %s",
+                     self._describe(), self.next_run)
 
     def stop(self) -> None:
         """Stop the scheduler loop."""
@@ -52,25 +107,77 @@ class BackupScheduler:
             self.last_run = None
         self.last_result = state.get("last_result")
 
+    def _restore_next_run(self) -> None:
+        """Restore next_run, unless the schedule options changed since."""
+        schedule = load_schedule()
+        if schedule.get("schedule") == self._describe() and schedule.get("next_run"):
+            try:
+                self.next_run = datetime.fromisoformat(schedule["next_run"])
+                return
+            except (ValueError, TypeError):
+                pass
+        self._reschedule()
+
     def record_run(self, result: dict | None) -> None:
         """Record a backup run (scheduled or manual) and persist."""
         self.last_run = datetime.now(timezone.utc)
         self.last_result = result
         save_last_run(self.last_run.isoformat(), self.last_result)
+        self._reschedule()
+
+    def _describe(self) -> str:
+        if self.times:
+            plan = "times " + ",".join(t.strftime("%H:%M") for t in self.times)
+        elif self.interval_hours > 0:
+            plan = f"every {self.interval_hours} hours"
+        else:
+            return "disabled"
+        return f"{plan}, jitter {self.jitter_minutes} minutes"
+
+    def _reschedule(self) -> None:
+        """Plan the next run from the last one and persist it."""
+        now = datetime.now(timezone.utc)
+        if self.times:
+            base = next_time_of_day(self.last_run or now, self.times)
+        elif self.interval_hours > 0:
+            base = (self.last_run or now) + timedelta(hours=self.interval_hours)
+        else:
+            base = None
+        if base is None:
+            self.next_run = None
+        else:
+            jitter = random.uniform(0, self.jitter_minutes * 60)
+            self.next_run = (base + timedelta(seconds=jitter)).replace(microsecond=0)
+        save_schedule({
+            "schedule": self._describe(),
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+        })
+        self._wake.set()
 
     async def _loop(self) -> None:
         """Main scheduler loop."""
-        interval_seconds = self.interval_hours * 3600
+        if self.next_run is not None and self.next_run <= datetime.now(timezone.utc):
+            _logger.info("Backup was due at %s, catching up now", self.next_run)
         while True:
-            now = datetime.now(timezone.utc).replace(microsecond=0)
-            self.next_run = now + timedelta(seconds=interval_seconds)
-            _logger.info("Next backup scheduled at %s", self.next_run)
-            await asyncio.sleep(interval_seconds)
+            delay = (self.next_run - datetime.now(timezone.utc)).total_seconds()
+            if delay > 0:
+                # Woken early when a manual run moves the schedule
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), min(delay, CHECK_SECONDS)
+                    )
+                except TimeoutError:
+                    pass
+                continue
             try:
                 _logger.info("Scheduled backup starting")
                 result = await self.backup_callback()
-                self.record_run(result)
                 _logger.info("Scheduled backup completed: %s", result)
             except Exception as exc:
                 _logger.error("Scheduled backup failed: %s", exc)
-                self.record_run({"error": str(exc)})
+                result = {"error": str(exc)}
+            if self.next_run <= datetime.now(timezone.utc):
+                # Unless the callback already recorded the run
+                self.record_run(result)
+            _logger.info("Next backup scheduled at %s", self.next_run)
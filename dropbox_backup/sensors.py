@@ -1,19 +1,30 @@
 """Publish sensor entities to Home Assistant via the Supervisor API."""
 
 import logging
-import os
 
-import aiohttp
+from supervisor import get_session
 
 _logger = logging.getLogger(__name__)
 
-SUPERVISOR_URL = "http://supervisor"
-SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN", "")
 ENTITY_ID = "sensor.dropbox_ha_backup_status"
+MAX_ERRORS = 5  # error messages kept in attributes and events
+MAX_ERROR_LENGTH = 200
 
 
-async def update_sensors(state: str, scheduler, auth) -> None:
-    """POST entity state to the HA Core REST API via Supervisor proxy."""
+def truncate_errors(errors: list[str]) -> list[str]:
+    """Keep the first few error messages, each shortened, so a failing
+    run does not push an attribute of unbounded size into Home Assistant."""
+    kept = [
+        error if len(error) <= MAX_ERROR_LENGTH else error[:MAX_ERROR_LENGTH - 1] + "…"
+        for error in errors[:MAX_ERRORS]
+    ]
+    if len(errors) > MAX_ERRORS:
+        kept.append(f"… and {len(errors) - MAX_ERRORS} more")
+    return kept
+
+
+def sensor_payload(state: str, scheduler) -> dict:
+    """Build the entity state and attributes for the status sensor."""
     attributes = {
         "friendly_name": "Dropbox HA Backup Status",
         "icon": "mdi:dropbox",
@@ -31,23 +42,22 @@ async def update_sensors(state: str, scheduler, auth) -> None:
     attributes["skipped_count"] = len(result.get("skipped", []))
     errors = result.get("errors", [])
     attributes["error_count"] = len(errors)
-    attributes["errors"] = errors
+    attributes["errors"] = truncate_errors(errors)
+    return {"state": state, "attributes": attributes}
 
-    url = f"{SUPERVISOR_URL}/core/api/states/{ENTITY_ID}"
-    headers = {
-        "Authorization": f"Bearer {SUPERVISOR_TOKEN}",
-        "Content-Type": "application/json",
-    }
-    payload = {"state": state, "attributes": attributes}
 
+async def post_sensor(payload: dict) -> bool:
+    """POST entity state to the HA Core REST API via Supervisor proxy."""
+    url = f"/core/api/states/{ENTITY_ID}"
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, json=payload, headers=headers) as resp:
-                if resp.status not in (200, 201):
-                    _logger.warning(
-                        "Failed to update %s: HTTP %s", ENTITY_ID, resp.status
-                    )
-                else:
-                    _logger.info("Updated %s to '%s'", ENTITY_ID, state)
+        async with get_session().post(url, json=payload) as resp:
+            if resp.status not in (200, 201):
+                _logger.warning(
+                    "Failed to update %s: HTTP %s", ENTITY_ID, resp.status
+                )
+                return False
+            _logger.info("Updated %s to '%s'", ENTITY_ID, payload["state"])
+            return True
     except Exception as exc:
         _logger.warning("Could not update %s: %s", ENTITY_ID, exc)
+        return False
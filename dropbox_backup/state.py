@@ -1,19 +1,188 @@
-"""Persistent state management for tokens and upload tracking."""
+"""Persistent state management for tokens and upload tracking.
 
+Upload tracking lives in a SQLite database in WAL mode, so recording a
+backup is a small transaction and a crash never loses what was already
+flushed. The other state is small JSON files, replaced atomically.
+Tokens, upload tracking and the last run are also kept in memory and
+read from there.
+"""
+
+import asyncio
 import json
 import logging
+import os
+import sqlite3
+import threading
 from pathlib import Path
 
 DATA_DIR = Path("/data")
 TOKENS_FILE = DATA_DIR / "tokens.json"
 UPLOADED_FILE = DATA_DIR / "uploaded.json"
 LAST_RUN_FILE = DATA_DIR / "last_run.json"
+SESSIONS_FILE = DATA_DIR / "upload_sessions.json"
+CHUNK_INDEX_FILE = DATA_DIR / "chunk_index.json"
+INVENTORY_FILE = DATA_DIR / "remote_inventory.json"
+DISCOVERED_FILE = DATA_DIR / "discovered.json"
+SCHEDULE_FILE = DATA_DIR / "schedule.json"
+DB_FILE = DATA_DIR / "state.db"
 
 _logger = logging.getLogger(__name__)
 
+SCHEMA_VERSION = 2
+# Applied whenever user_version is behind, so every statement must be
+# safe to run again. Entries from versions before upload times were
+# recorded get an empty uploaded_at, which sorts oldest.
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploaded (
+    slug TEXT PRIMARY KEY,
+    dropbox_path TEXT,
+    path_lower TEXT,
+    uploaded_at TEXT NOT NULL DEFAULT '',
+    entry TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploaded_path ON uploaded (path_lower);
+DROP INDEX IF EXISTS uploaded_at;
+UPDATE uploaded SET uploaded_at = '' WHERE uploaded_at IS NULL;
+CREATE INDEX IF NOT EXISTS uploaded_history ON uploaded (uploaded_at, slug);
+"""
+HISTORY_PAGE_SIZE = 20
+MAX_HISTORY_PAGE_SIZE = 100
+
+_db: sqlite3.Connection | None = None
+_db_path: Path | None = None
+_db_lock = threading.RLock()
+
+# Authoritative in-memory copies of tokens, upload tracking and the last
+# run. Reads are served from here; upload tracking and last-run writes
+# are applied to disk by a deferred flush so bursts of them coalesce.
+FLUSH_DELAY_SECONDS = 2.0
+_cache: dict = {}
+_by_path: dict[str, set[str]] = {}  # lower-cased dropbox_path -> slugs
+_pending_uploads: dict[str, dict | None] = {}  # None = delete
+_last_run_dirty = False
+_flush_handle: asyncio.TimerHandle | None = None
+
+_UPSERT = (
+    "INSERT OR REPLACE INTO uploaded"
+    " (slug, dropbox_path, path_lower, uploaded_at, entry) VALUES (?, ?, ?, ?, ?)"
+)
+
+
+def _row(slug: str, entry: dict) -> tuple:
+    path = entry.get("dropbox_path")
+    return (
+        slug, path, path.lower() if path else None,
+        entry.get("uploaded_at") or "", json.dumps(entry),
+    )
+
+
+def _write_json(path: Path, data, indent: int | None = 2) -> None:
+    """Replace ``path`` atomically: a crash leaves the old or new file."""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(data, indent=indent))
+    os.replace(tmp, path)
+
+
+def _connect() -> sqlite3.Connection:
+    """Return the state database, creating and migrating it on first use."""
+    global _db, _db_path
+    if _db is not None and _db_path == DB_FILE:
+        return _db
+    if _db is not None:
+        _db.close()
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(DB_FILE, check_same_thread=False, isolation_level=None)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    if db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        with db:
+            db.execute("BEGIN")
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    db.execute(statement)
+            migrated = _migrate_uploaded_json(db)
+            db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+        if migrated:
+            UPLOADED_FILE.rename(UPLOADED_FILE.with_name(UPLOADED_FILE.name + ".migrated"))
+    _db, _db_path = db, DB_FILE
+    return db
+
+
+def _migrate_uploaded_json(db: sqlite3.Connection) -> bool:
+    """Import tracking from ``uploaded.json``, written by older versions."""
+    if not UPLOADED_FILE.exists():
+        return False
+    try:
+        uploaded = json.loads(UPLOADED_FILE.read_text())
+    except (json.JSONDecodeError, OSError) as exc:
+        _logger.error("Failed to load uploaded state: %s", exc)
+        return False
+    db.executemany(_UPSERT, [_row(slug, entry) for slug, entry in uploaded.items()])
+    _logger.info("Migrated %d tracked backups to %s", len(uploaded), DB_FILE.name)
+    return True
+
+
+def close() -> None:
+    """Flush pending writes, then close the state database."""
+    global _db, _db_path
+    with _db_lock:
+        flush()
+        _cache.clear()
+        _by_path.clear()
+        if _db is not None:
+            _db.close()
+            _db, _db_path = None, None
+
+
+def flush() -> None:
+    """Write changes still held in memory to disk now."""
+    global _flush_handle, _last_run_dirty
+    with _db_lock:
+        if _flush_handle is not None:
+            _flush_handle.cancel()
+            _flush_handle = None
+        if _pending_uploads:
+            db = _connect()
+            with db:
+                db.execute("BEGIN")
+                for slug, entry in _pending_uploads.items():
+                    if entry is None:
+                        db.execute("DELETE FROM uploaded WHERE slug = ?", (slug,))
+                    else:
+                        db.execute(_UPSERT, _row(slug, entry))
+            _pending_uploads.clear()
+        if _last_run_dirty:
+            _write_json(LAST_RUN_FILE, _cache["last_run"])
+            _last_run_dirty = False
+
+
+def _schedule_flush() -> None:
+    """Flush soon, coalescing the writes made until then.
+
+    Outside the event loop thread there is nothing to run a deferred
+    flush, so the write happens immediately.
+    """
+    global _flush_handle
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        flush()
+        return
+    if _flush_handle is None:
+        _flush_handle = loop.call_later(FLUSH_DELAY_SECONDS, flush)
+
 
 def load_tokens() -> dict | None:
-    """Load OAuth tokens from disk. Returns None if not found."""
+    """Load OAuth tokens. Returns None if not found."""
+    with _db_lock:
+        if "tokens" not in _cache:
+            _cache["tokens"] = _read_tokens()
+        tokens = _cache["tokens"]
+    return dict(tokens) if tokens is not None else None
+
+
+def _read_tokens() -> dict | None:
     if not TOKENS_FILE.exists():
         return None
     try:
@@ -24,36 +193,164 @@ def load_tokens() -> dict | None:
 
 
 def save_tokens(tokens: dict) -> None:
-    """Save OAuth tokens to disk."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    TOKENS_FILE.write_text(json.dumps(tokens, indent=2))
+    """Save OAuth tokens to disk.
+
+    Tokens are written through rather than behind: losing a rotated
+    refresh token would lock the addon out of Dropbox.
+    """
+    with _db_lock:
+        _write_json(TOKENS_FILE, tokens)
+        _cache["tokens"] = dict(tokens)
 
 
 def clear_tokens() -> None:
     """Remove stored tokens."""
-    if TOKENS_FILE.exists():
-        TOKENS_FILE.unlink()
+    with _db_lock:
+        if TOKENS_FILE.exists():
+            TOKENS_FILE.unlink()
+        _cache["tokens"] = None
+
+
+def _uploaded() -> dict:
+    """Return the cached upload tracking, loading it on first use."""
+    if "uploaded" not in _cache:
+        rows = _connect().execute(
+            "SELECT slug, entry FROM uploaded ORDER BY rowid"
+        ).fetchall()
+        _cache["uploaded"] = {}
+        _by_path.clear()
+        for slug, entry in rows:
+            _track(slug, json.loads(entry))
+    return _cache["uploaded"]
+
+
+def _track(slug: str, entry: dict | None) -> None:
+    """Update the cache and its path index for one backup."""
+    uploaded = _cache["uploaded"]
+    old = uploaded.pop(slug, None)
+    if old is not None and old.get("dropbox_path"):
+        _by_path.get(old["dropbox_path"].lower(), set()).discard(slug)
+    if entry is not None:
+        uploaded[slug] = entry
+        if entry.get("dropbox_path"):
+            _by_path.setdefault(entry["dropbox_path"].lower(), set()).add(slug)
 
 
 def load_uploaded() -> dict:
     """Load uploaded backup tracking. Returns {slug: {name, date, path}}."""
-    if not UPLOADED_FILE.exists():
-        return {}
-    try:
-        return json.loads(UPLOADED_FILE.read_text())
-    except (json.JSONDecodeError, OSError) as exc:
-        _logger.error("Failed to load uploaded state: %s", exc)
-        return {}
+    with _db_lock:
+        return dict(_uploaded())
 
 
 def save_uploaded(uploaded: dict) -> None:
-    """Save uploaded backup tracking to disk."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    UPLOADED_FILE.write_text(json.dumps(uploaded, indent=2))
+    """Replace all upload tracking with ``uploaded``."""
+    with _db_lock:
+        for slug in _uploaded().keys() - uploaded.keys():
+            _track(slug, None)
+            _pending_uploads[slug] = None
+        for slug, entry in uploaded.items():
+            _track(slug, entry)
+            _pending_uploads[slug] = entry
+        _schedule_flush()
+
+
+def record_uploads(entries: dict) -> None:
+    """Add or update the tracking of some backups."""
+    if not entries:
+        return
+    with _db_lock:
+        _uploaded()
+        for slug, entry in entries.items():
+            _track(slug, entry)
+            _pending_uploads[slug] = entry
+        _schedule_flush()
+
+
+def forget_uploads(slugs) -> None:
+    """Stop tracking some backups."""
+    with _db_lock:
+        _uploaded()
+        for slug in slugs:
+            _track(slug, None)
+            _pending_uploads[slug] = None
+        _schedule_flush()
+
+
+def mark_pruned(slugs) -> None:
+    """Flag tracked backups whose Dropbox copy retention deleted.
+
+    They stay tracked, so a backup Home Assistant still holds is not
+    uploaded again only to be deleted by the next retention pass.
+    """
+    with _db_lock:
+        uploaded = _uploaded()
+        for slug in slugs:
+            if slug in uploaded:
+                entry = {**uploaded[slug], "pruned": True}
+                _track(slug, entry)
+                _pending_uploads[slug] = entry
+        _schedule_flush()
+
+
+def get_uploaded(slug: str) -> dict | None:
+    """Return the tracking entry of one backup, or None."""
+    with _db_lock:
+        return _uploaded().get(slug)
+
+
+def find_uploaded_by_path(dropbox_path: str) -> dict:
+    """Return the tracked backups stored at a Dropbox path (any case)."""
+    with _db_lock:
+        uploaded = _uploaded()
+        return {
+            slug: uploaded[slug]
+            for slug in _by_path.get(dropbox_path.lower(), ())
+        }
+
+
+def uploaded_history(
+    limit: int = HISTORY_PAGE_SIZE, before: str | None = None
+) -> tuple[list[dict], str | None]:
+    """Return one page of tracked backups, most recently uploaded first.
+
+    Pages are read through the (uploaded_at, slug) index. ``before`` is
+    the cursor returned with the previous page; the returned cursor is
+    None on the last page.
+    """
+    limit = min(max(limit, 1), MAX_HISTORY_PAGE_SIZE)
+    query = "SELECT slug, uploaded_at, entry FROM uploaded"
+    params: tuple = ()
+    if before:
+        uploaded_at, _, slug = before.rpartition("|")
+        query += " WHERE (uploaded_at, slug) < (?, ?)"
+        params = (uploaded_at, slug)
+    query += " ORDER BY uploaded_at DESC, slug DESC LIMIT ?"
+    with _db_lock:
+        flush()
+        rows = _connect().execute(query, params + (limit + 1,)).fetchall()
+    page = [{"slug": slug, **json.loads(entry)} for slug, _, entry in rows[:limit]]
+    cursor = None
+    if len(rows) > limit:
+        slug, uploaded_at, _ = rows[limit - 1]
+        cursor = f"{uploaded_at}|{slug}"
+    return page, cursor
+
+
+def count_uploaded() -> int:
+    """Return the number of tracked backups."""
+    with _db_lock:
+        return len(_uploaded())
 
 
 def load_last_run() -> dict:
     """Load last run state. Returns {last_run, last_result}."""
+    with _db_lock:
+        if "last_run" not in _cache:
+            _cache["last_run"] = _read_last_run()
+        return dict(_cache["last_run"])
+
+
+def _read_last_run() -> dict:
     if not LAST_RUN_FILE.exists():
         return {}
     try:
@@ -64,7 +361,108 @@ def load_last_run() -> dict:
 
 
 def save_last_run(last_run: str, last_result: dict | None) -> None:
-    """Save last run state to disk."""
-    DATA_DIR.mkdir(parents=True, exist_ok=True)
-    data = {"last_run": last_run, "last_result": last_result}
-    LAST_RUN_FILE.write_text(json.dumps(data, indent=2))
+    """Save last run state."""
+    global _last_run_dirty
+    with _db_lock:
+        _cache["last_run"] = {"last_run": last_run, "last_result": last_result}
+        _last_run_dirty = True
+        _schedule_flush()
+
+
+def load_upload_sessions() -> dict:
+    """Load in-progress upload sessions.
+
+    Returns {slug: {session_id, offset, dropbox_path, started_at}}.
+    """
+    if not SESSIONS_FILE.exists():
+        return {}
+    try:
+        return json.loads(SESSIONS_FILE.read_text())
+    except (json.JSONDecodeError, OSError) as exc:
+        _logger.error("Failed to load upload sessions: %s", exc)
+        return {}
+
+
+def save_upload_session(slug: str, session: dict) -> None:
+    """Checkpoint the upload session for a backup slug."""
+    sessions = load_upload_sessions()
+    sessions[slug] = session
+    _write_json(SESSIONS_FILE, sessions)
+
+
+def clear_upload_session(slug: str) -> None:
+    """Forget the upload session checkpoint for a backup slug."""
+    sessions = load_upload_sessions()
+    if sessions.pop(slug, None) is not None:
+        _write_json(SESSIONS_FILE, sessions)
+
+
+def load_chunk_index() -> dict:
+    """Load the index of chunks stored in Dropbox.
+
+    Returns {backup_path, chunks: {chunk_id: size}}.
+    """
+    if not CHUNK_INDEX_FILE.exists():
+        return {}
+    try:
+        return json.loads(CHUNK_INDEX_FILE.read_text())
+    except (json.JSONDecodeError, OSError) as exc:
+        _logger.error("Failed to load chunk index: %s", exc)
+        return {}
+
+
+def save_chunk_index(index: dict) -> None:
+    """Save the chunk index to disk."""
+    _write_json(CHUNK_INDEX_FILE, index, indent=None)
+
+
+def load_inventory() -> dict:
+    """Load the cached Dropbox folder listing.
+
+    Returns {backup_path, cursor, entries: {path_lower: {path, size,
+    content_hash, server_modified}}}.
+    """
+    if not INVENTORY_FILE.exists():
+        return {}
+    try:
+        return json.loads(INVENTORY_FILE.read_text())
+    except (json.JSONDecodeError, OSError) as exc:
+        _logger.error("Failed to load remote inventory: %s", exc)
+        return {}
+
+
+def save_inventory(inventory: dict) -> None:
+    """Save the cached Dropbox folder listing to disk."""
+    _write_json(INVENTORY_FILE, inventory, indent=None)
+
+
+def load_discovered() -> dict:
+    """Load the last seen Supervisor backups. Returns {slug: backup}."""
+    if not DISCOVERED_FILE.exists():
+        return {}
+    try:
+        return json.loads(DISCOVERED_FILE.read_text())
+    except (json.JSONDecodeError, OSError) as exc:
+        _logger.error("Failed to load discovered backups: %s", exc)
+        return {}
+
+
+def save_discovered(backups: dict) -> None:
+    """Save the last seen Supervisor backups to disk."""
+    _write_json(DISCOVERED_FILE, backups)
+
+
+def load_schedule() -> dict:
+    """Load the persisted schedule. Returns {schedule, next_run}."""
+    if not SCHEDULE_FILE.exists():
+        return {}
+    try:
+        return json.loads(SCHEDULE_FILE.read_text())
+    except (json.JSONDecodeError, OSError) as exc:
+        _logger.error("Failed to load schedule: %s", exc)
+        return {}
+
+
+def save_schedule(schedule: dict) -> None:
+    """Save the schedule to disk."""
+    _write_json(SCHEDULE_FILE, schedule)
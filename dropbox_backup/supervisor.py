@@ -0,0 +1,49 @@
+"""Shared HTTP client for the Supervisor API.
+
+All Supervisor traffic (backup listing and downloads, events, sensor
+updates) goes through one pooled session, so connections to
+``http://supervisor`` are kept alive and reused instead of being opened
+for every request.
+"""
+
+import logging
+import os
+
+import aiohttp
+
+_logger = logging.getLogger(__name__)
+
+SUPERVISOR_URL = "http://supervisor"
+SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN", "")
+# Concurrent transfers, events and sensor updates rarely need more
+CONNECTION_LIMIT = 10
+KEEPALIVE_SECONDS = 60
+# API calls are small and local; a stuck one should fail fast
+TIMEOUT = aiohttp.ClientTimeout(total=60, sock_connect=10)
+# Multi-GB downloads must not hit a total timeout, only stall timeouts
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+
+_session: aiohttp.ClientSession | None = None
+
+
+def get_session() -> aiohttp.ClientSession:
+    """Return the shared session, opening it on first use."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            base_url=SUPERVISOR_URL,
+            headers={"Authorization": f"Bearer {SUPERVISOR_TOKEN}"},
+            connector=aiohttp.TCPConnector(
+                limit=CONNECTION_LIMIT, keepalive_timeout=KEEPALIVE_SECONDS
+            ),
+            timeout=TIMEOUT,
+        )
+    return _session
+
+
+async def close_session() -> None:
+    """Close the shared session and its pooled connections."""
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
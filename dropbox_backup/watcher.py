@@ -0,0 +1,81 @@
+"""Start an upload as soon as the Supervisor creates a backup.
+
+The Supervisor's backup list is polled through ``BackupDiscovery``,
+which is cheap as details are only fetched for new backups. When new
+backups appear, the upload starts once no further backup has shown up
+for ``DEBOUNCE_SECONDS``, so a burst of backups is uploaded in one run.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from discovery import BackupDiscovery
+from state import get_uploaded, load_uploaded
+
+_logger = logging.getLogger(__name__)
+
+POLL_SECONDS = 30
+DEBOUNCE_SECONDS = 15
+
+
+class BackupWatcher:
+    """Trigger uploads for new Supervisor backups.
+
+    ``trigger`` runs the upload; while ``is_busy`` returns True the
+    trigger is held back and retried, so new backups a running upload
+    did not pick up are handled right after it.
+    """
+
+    def __init__(
+        self,
+        discovery: BackupDiscovery,
+        trigger: Callable[[], Awaitable],
+        is_busy: Callable[[], bool] = lambda: False,
+    ):
+        self.discovery = discovery
+        self.trigger = trigger
+        self.is_busy = is_busy
+        self._task: asyncio.Task | None = None
+        self._due = False
+        self._last_change = 0.0
+
+    def start(self) -> None:
+        """Start watching."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            _logger.info("Watching for new backups every %s seconds", POLL_SECONDS)
+
+    def stop(self) -> None:
+        """Stop watching."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def check(self) -> None:
+        """Poll once and trigger an upload if one is due."""
+        new = await self.discovery.refresh(load_uploaded())
+        if any(get_uploaded(backup["slug"]) is None for backup in new):
+            _logger.info(
+                "New backups: %s", ", ".join(backup["slug"] for backup in new)
+            )
+            self._due = True
+            self._last_change = time.monotonic()
+        if not self._due or self.is_busy():
+            return
+        if time.monotonic() - self._last_change < DEBOUNCE_SECONDS:
+            return
+        self._due = False
+        _logger.info("Uploading new backups")
+        await self.trigger()
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.check()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                _logger.warning("Checking for new backups failed: %s", exc)
+            await asyncio.sleep(DEBOUNCE_SECONDS if self._due else POLL_SECONDS)
@@ -1,40 +1,139 @@
 """Web server for the Dropbox Backup addon (HA ingress)."""
 
+import asyncio
+import json
 import logging
+import uuid
+from collections.abc import Callable
 from datetime import datetime
 from pathlib import Path
 
 from aiohttp import web
 import jinja2
 
-from state import load_uploaded
+import state
+from dropbox_client import run_blocking
+from progress import bus as progress_bus
 
 _logger = logging.getLogger(__name__)
 
 TEMPLATES_DIR = Path(__file__).parent / "templates"
+# Comment line sent on an idle progress stream so proxies keep it open
+KEEPALIVE_SECONDS = 15
+MAX_WAIT_SECONDS = 300  # longest /status long-poll
 
 
-def create_app(dropbox_auth, scheduler, run_backup_fn) -> web.Application:
+class StatusChannel:
+    """Versions the /status data so clients can wait for it to change.
+
+    The version embeds a per-process id, so a client holding a version
+    from before an add-on restart gets the new status right away. It
+    doubles as the ETag, and the serialized body is cached per version.
+    """
+
+    def __init__(self):
+        self._boot = uuid.uuid4().hex[:8]
+        self._counter = 0
+        self._changed = asyncio.Event()
+        self._observed: dict | None = None
+        self._body: tuple[str, bytes] | None = None
+        self._closed = False
+
+    @property
+    def version(self) -> str:
+        """Current version of the status."""
+        return f"{self._boot}-{self._counter}"
+
+    def notify(self) -> None:
+        """Mark the status as changed and wake all waiting clients."""
+        self._counter += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    @property
+    def etag(self) -> str:
+        """ETag of the current status."""
+        return f'"{self.version}"'
+
+    def observe(self, **values) -> None:
+        """Notify if ``values`` changed since last observed, for status
+        that can change without a ``notify`` call."""
+        if self._observed is not None and values != self._observed:
+            self.notify()
+        self._observed = values
+
+    def body(self, build: Callable[[], dict]) -> bytes:
+        """Return the serialized status, calling ``build`` only when the
+        version changed since the last call."""
+        version = self.version
+        if self._body is None or self._body[0] != version:
+            self._body = (version, json.dumps(build()).encode())
+        return self._body[1]
+
+    def close(self) -> None:
+        """Release all waiting clients and stop holding new ones."""
+        self._closed = True
+        self._changed.set()
+
+    async def wait(self, version: str, timeout: float) -> None:
+        """Wait up to ``timeout`` seconds while ``version`` is current."""
+        if self._closed or version != self.version:
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except TimeoutError:
+            pass
+
+
+def create_app(
+    dropbox_auth, scheduler, jobs, inventory=None
+) -> web.Application:
     """Create and configure the aiohttp web application."""
     app = web.Application()
+    # Templates ship with the image: compile them once, keep the
+    # bytecode across restarts and never stat them again
+    bytecode_dir = state.DATA_DIR / "jinja_cache"
+    bytecode_dir.mkdir(parents=True, exist_ok=True)
     env = jinja2.Environment(
         loader=jinja2.FileSystemLoader(str(TEMPLATES_DIR)),
         autoescape=True,
+        auto_reload=False,
+        bytecode_cache=jinja2.FileSystemBytecodeCache(str(bytecode_dir)),
     )
     app["jinja_env"] = env
     app["dropbox_auth"] = dropbox_auth
     app["scheduler"] = scheduler
-    app["run_backup_fn"] = run_backup_fn
+    app["jobs"] = jobs
+    app["inventory"] = inventory
+    app["status_channel"] = StatusChannel()
+    app["progress_streams"] = set()
 
     app.router.add_get("/", handle_index)
     app.router.add_get("/auth", handle_auth)
     app.router.add_post("/auth", handle_auth_submit)
     app.router.add_post("/trigger", handle_trigger)
     app.router.add_get("/status", handle_status)
+    app.router.add_get("/jobs", handle_jobs)
+    app.router.add_get("/jobs/{job_id}", handle_job)
+    app.router.add_get("/progress", handle_progress)
+    app.router.add_get("/progress/stream", handle_progress_stream)
+    app.router.add_get("/history", handle_history)
 
+    app.on_shutdown.append(_on_shutdown)
     return app
 
 
+async def _on_shutdown(app: web.Application) -> None:
+    # Return open long-polls now: graceful shutdown would otherwise wait
+    # for them past the Supervisor's stop timeout, and cleanup never runs
+    app["status_channel"].close()
+    # Progress streams never end on their own
+    for queue in app["progress_streams"]:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
 async def handle_index(request: web.Request) -> web.Response:
     """Render the status page."""
     env = request.app["jinja_env"]
@@ -47,11 +146,36 @@ async def handle_index(request: web.Request) -> web.Response:
         last_run=scheduler.last_run,
         next_run=scheduler.next_run,
         last_result=scheduler.last_result,
-        uploaded=load_uploaded(),
+        uploaded_count=state.count_uploaded(),
     )
     return web.Response(text=html, content_type="text/html")
 
 
+async def handle_history(request: web.Request) -> web.Response:
+    """Return one page of uploaded backups, most recent first.
+
+    ``limit`` sets the page size and ``before`` takes the ``next``
+    cursor of the previous page.
+    """
+    try:
+        limit = int(request.query.get("limit", state.HISTORY_PAGE_SIZE))
+    except ValueError:
+        raise web.HTTPBadRequest(text="Invalid limit")
+    backups, cursor = state.uploaded_history(limit, request.query.get("before"))
+
+    inventory = request.app.get("inventory")
+    # Only trust the inventory once it has listed the backup folder
+    if inventory is not None and inventory.cursor is not None:
+        for backup in backups:
+            if not backup.get("pruned"):
+                backup["in_dropbox"] = inventory.has(backup.get("dropbox_path", ""))
+    return web.json_response({
+        "backups": backups,
+        "next": cursor,
+        "total": state.count_uploaded(),
+    })
+
+
 async def handle_auth(request: web.Request) -> web.Response:
     """Show the Dropbox authorization URL and code input form."""
     env = request.app["jinja_env"]
@@ -73,7 +197,8 @@ async def handle_auth_submit(request: web.Request) -> web.Response:
     if not auth_code:
         raise web.HTTPFound("./auth")
     try:
-        auth.finish_auth(auth_code)
+        await run_blocking(auth.finish_auth, auth_code)
+        request.app["status_channel"].notify()
         raise web.HTTPFound("./")
     except web.HTTPFound:
         raise
@@ -95,41 +220,121 @@ def _wants_json(request: web.Request) -> bool:
 
 
 async def handle_trigger(request: web.Request) -> web.Response:
-    """Manually trigger a backup."""
-    scheduler = request.app["scheduler"]
-    run_backup_fn = request.app["run_backup_fn"]
+    """Start a backup job, or join the one already running."""
+    jobs = request.app["jobs"]
+    running = jobs.busy
+    job = jobs.submit("manual")
+    if _wants_json(request):
+        return web.json_response(
+            {"status": "running" if running else "started", "job": job.to_dict()},
+            status=202,
+        )
+    raise web.HTTPFound("./")
+
+
+async def handle_jobs(request: web.Request) -> web.Response:
+    """Return the running job and recent job history."""
+    jobs = request.app["jobs"]
+    return web.json_response({
+        "current": jobs.current.to_dict() if jobs.current else None,
+        "jobs": [job.to_dict() for job in jobs.history()],
+    })
+
+
+async def handle_job(request: web.Request) -> web.Response:
+    """Return the status of one job."""
+    job = request.app["jobs"].get(request.match_info["job_id"])
+    if job is None:
+        raise web.HTTPNotFound(text="Unknown job")
+    return web.json_response(job.to_dict())
+
+
+async def handle_progress(request: web.Request) -> web.Response:
+    """Return the progress of the running transfers."""
+    return web.json_response({"transfers": progress_bus.snapshot()})
+
+
+async def handle_progress_stream(request: web.Request) -> web.StreamResponse:
+    """Stream transfer progress as Server-Sent Events.
+
+    Each event is the JSON progress of one transfer; the running
+    transfers are sent first so a new client starts from the full state.
+    """
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    await response.prepare(request)
+    streams = request.app["progress_streams"]
+    queue = progress_bus.subscribe()
+    streams.add(queue)
     try:
-        result = await run_backup_fn()
-        scheduler.record_run(result)
-        if _wants_json(request):
-            return web.json_response({"status": "success", "result": result})
-        raise web.HTTPFound("./")
-    except web.HTTPFound:
-        raise
-    except Exception as exc:
-        _logger.error("Manual backup failed: %s", exc)
-        if _wants_json(request):
-            return web.json_response(
-                {"status": "error", "error": str(exc)}, status=500
-            )
-        return web.Response(text=f"Backup failed: {exc}", status=500)
+        for event in progress_bus.snapshot():
+            await response.write(_sse(event))
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except TimeoutError:
+                await response.write(b": keepalive\n\n")
+                continue
+            if event is None:  # the server is shutting down
+                break
+            await response.write(_sse(event))
+    except ConnectionResetError:
+        pass
+    finally:
+        streams.discard(queue)
+        progress_bus.unsubscribe(queue)
+    return response
+
+
+def _sse(event: dict) -> bytes:
+    return f"data: {json.dumps(event)}\n\n".encode()
 
 
 async def handle_status(request: web.Request) -> web.Response:
-    """Return current addon state as JSON."""
+    """Return current addon state as JSON.
+
+    The body is rebuilt only when the status changed and carries the
+    status version as ETag; a matching ``If-None-Match`` gets ``304``.
+    With ``?wait=<version>`` the response is held until the status
+    differs from that version, or ``timeout`` seconds (default and at
+    most 300) pass, so clients learn about changes as they happen.
+    """
+    channel = request.app["status_channel"]
     scheduler = request.app["scheduler"]
     auth = request.app["dropbox_auth"]
+    # Tokens can be revoked by Dropbox without a state change
+    channel.observe(authorized=auth.is_authorized())
+
+    version = request.query.get("wait")
+    if version is not None:
+        try:
+            timeout = float(request.query.get("timeout", MAX_WAIT_SECONDS))
+        except ValueError:
+            raise web.HTTPBadRequest(text="Invalid timeout")
+        await channel.wait(version, min(max(timeout, 0), MAX_WAIT_SECONDS))
+
+    headers = {"ETag": channel.etag, "Cache-Control": "no-cache"}
+    if channel.etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
 
     def _fmt_dt(dt: datetime | None) -> str | None:
         return dt.isoformat() if dt else None
 
-    data = {
-        "state": request.app.get("backup_state", "idle"),
-        "authorized": auth.is_authorized(),
-        "last_run": _fmt_dt(scheduler.last_run),
-        "next_run": _fmt_dt(scheduler.next_run),
-        "last_result": scheduler.last_result,
-        "interval_hours": scheduler.interval_hours,
-        "automatic_backup": scheduler.interval_hours > 0,
-    }
-    return web.json_response(data)
+    def build() -> dict:
+        return {
+            "version": channel.version,
+            "state": request.app.get("backup_state", "idle"),
+            "authorized": auth.is_authorized(),
+            "last_run": _fmt_dt(scheduler.last_run),
+            "next_run": _fmt_dt(scheduler.next_run),
+            "last_result": scheduler.last_result,
+            "interval_hours": scheduler.interval_hours,
+            "automatic_backup": scheduler.enabled,
+        }
+
+    return web.Response(
+        body=channel.body(build), content_type="application/json", headers=headers
+    )
@@ -16,6 +16,14 @@ def patch_state_paths(tmp_path, monkeypatch):
     monkeypatch.setattr(state, "TOKENS_FILE", data_dir / "tokens.json")
     monkeypatch.setattr(state, "UPLOADED_FILE", data_dir / "uploaded.json")
     monkeypatch.setattr(state, "LAST_RUN_FILE", data_dir / "last_run.json")
+    monkeypatch.setattr(state, "SESSIONS_FILE", data_dir / "upload_sessions.json")
+    monkeypatch.setattr(state, "CHUNK_INDEX_FILE", data_dir / "chunk_index.json")
+    monkeypatch.setattr(state, "INVENTORY_FILE", data_dir / "remote_inventory.json")
+    monkeypatch.setattr(state, "DISCOVERED_FILE", data_dir / "discovered.json")
+    monkeypatch.setattr(state, "SCHEDULE_FILE", data_dir / "schedule.json")
+    monkeypatch.setattr(state, "DB_FILE", data_dir / "state.db")
+    yield
+    state.close()
 
 
 @pytest.fixture(autouse=True)
@@ -0,0 +1,701 @@
+"""Tests for the backup engine upload pipeline."""
+
+import asyncio
+import gzip
+import json
+import logging
+
+import dropbox
+import pytest
+import requests
+
+import backup_engine
+import discovery
+import dropbox_client
+import process_pool
+import progress
+import state
+from chunk_sizer import AdaptiveChunkSizer
+from chunk_store import chunk_path
+from content_hash import DropboxContentHasher, content_hash
+from discovery import BackupDiscovery
+from dropbox_client import AsyncDropbox
+from inventory import RemoteInventory
+from ratelimit import BandwidthLimiter
+
+
+class FakeDropbox:
+    """Minimal stand-in for dropbox.Dropbox recording upload calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.files = {}
+        self._sessions = {}
+        self._closed = set()
+        self.fail_next = 0
+        self.fail_after_write = False
+
+    def _metadata(self, path):
+        hasher = DropboxContentHasher()
+        hasher.update(self.files[path])
+        return dropbox.files.FileMetadata(
+            name=path.rsplit("/", 1)[-1],
+            path_display=path,
+            path_lower=path.lower(),
+            size=len(self.files[path]),
+            content_hash=hasher.hexdigest(),
+        )
+
+    def files_list_folder(self, path, recursive=False):
+        entries = [
+            self._metadata(p) for p in self.files
+            if p.startswith(path + "/") and (recursive or "/" not in p[len(path) + 1:])
+        ]
+        return dropbox.files.ListFolderResult(entries=entries, cursor="c", has_more=False)
+
+    def files_list_folder_continue(self, cursor):
+        return dropbox.files.ListFolderResult(entries=[], cursor=cursor, has_more=False)
+
+    def files_upload(self, data, path, mode=None):
+        self.calls.append(("upload", path))
+        self.files[path] = data
+        return self._metadata(path)
+
+    def files_download(self, path):
+        return self._metadata(path), type("Response", (), {"content": self.files[path]})()
+
+    def files_delete_batch(self, entries):
+        self.calls.append(("delete_batch", len(entries)))
+        results = []
+        for entry in entries:
+            if self.files.pop(entry.path, None) is None:
+                results.append(dropbox.files.DeleteBatchResultEntry.failure(
+                    dropbox.files.DeleteError.other
+                ))
+            else:
+                results.append(dropbox.files.DeleteBatchResultEntry.success(
+                    dropbox.files.DeleteBatchResultData(
+                        dropbox.files.FileMetadata(name=entry.path, path_display=entry.path)
+                    )
+                ))
+        self._delete_job = dropbox.files.DeleteBatchResult(entries=results)
+        return dropbox.files.DeleteBatchLaunch.async_job_id("job")
+
+    def files_delete_batch_check(self, async_job_id):
+        self.calls.append(("delete_batch_check", async_job_id))
+        return dropbox.files.DeleteBatchJobStatus.complete(self._delete_job)
+
+    def files_copy_v2(self, from_path, to_path):
+        self.calls.append(("copy", to_path))
+        self.files[to_path] = self.files[from_path]
+
+    def files_upload_session_start(self, data, close=False):
+        session_id = f"session{len(self._sessions)}"
+        self._sessions[session_id] = bytearray(data)
+        if close:
+            self._closed.add(session_id)
+        self.calls.append(("start", len(data)))
+        return type("StartResult", (), {"session_id": session_id})()
+
+    def files_upload_session_append_v2(self, data, cursor, close=False):
+        if self.fail_next:
+            self.fail_next -= 1
+            if self.fail_after_write:
+                self._sessions[cursor.session_id] += data
+            raise requests.exceptions.ConnectionError("link dropped")
+        if cursor.session_id not in self._sessions:
+            raise _api_error(dropbox.files.UploadSessionAppendError.not_found)
+        session = self._sessions[cursor.session_id]
+        if cursor.offset != len(session):
+            raise _api_error(dropbox.files.UploadSessionAppendError.incorrect_offset(
+                dropbox.files.UploadSessionOffsetError(correct_offset=len(session))
+            ))
+        session += data
+        if close:
+            self._closed.add(cursor.session_id)
+        self.calls.append(("append", len(data)))
+
+    def files_upload_session_finish_batch_v2(self, entries):
+        self.calls.append(("finish_batch", len(entries)))
+        results = []
+        for entry in entries:
+            session_id = entry.cursor.session_id
+            if session_id not in self._closed:
+                results.append(dropbox.files.UploadSessionFinishBatchResultEntry.failure(
+                    dropbox.files.UploadSessionFinishError.lookup_failed(
+                        dropbox.files.UploadSessionLookupError.not_closed
+                    )
+                ))
+                continue
+            self.files[entry.commit.path] = bytes(self._sessions.pop(session_id))
+            results.append(dropbox.files.UploadSessionFinishBatchResultEntry.success(
+                self._metadata(entry.commit.path)
+            ))
+        return dropbox.files.UploadSessionFinishBatchResult(entries=results)
+
+
+@pytest.fixture(autouse=True)
+def _no_poll_delay(monkeypatch):
+    monkeypatch.setattr(backup_engine, "DELETE_POLL_SECONDS", 0)
+
+
+def _api_error(error):
+    return dropbox.exceptions.ApiError("req", error, None, None)
+
+
+async def _chunks(*blocks):
+    for block in blocks:
+        yield block
+
+
+def _tiny_sizer():
+    """A sizer pinned to 2-byte requests so small tests exercise sessions."""
+    return AdaptiveChunkSizer(min_size=2, max_size=2)
+
+
+async def _upload(dbx, chunks, path, slug=None):
+    finish = await backup_engine.upload_to_dropbox(
+        dbx, chunks, path, slug, _tiny_sizer()
+    )
+    [outcome] = await backup_engine.commit_uploads(dbx, [finish])
+    return outcome
+
+
+async def test_upload_single_chunk_is_one_request():
+    """A single chunk starts and closes its session in one call."""
+    dbx = AsyncDropbox(FakeDropbox())
+    finish = await backup_engine.upload_to_dropbox(dbx, _chunks(b"abc"), "/b/x.tar")
+    [outcome] = await backup_engine.commit_uploads(dbx, [finish])
+    assert outcome.size == 3
+    assert dbx.calls == [("start", 3), ("finish_batch", 1)]
+    assert dbx.files["/b/x.tar"] == b"abc"
+
+
+async def test_upload_empty_stream():
+    """An empty stream still creates an empty file."""
+    dbx = AsyncDropbox(FakeDropbox())
+    await _upload(dbx, _chunks(), "/b/x.tar")
+    assert dbx.files["/b/x.tar"] == b""
+
+
+async def test_upload_streams_chunks_through_session():
+    """Multiple chunks go through start and append, then one batch commit."""
+    dbx = AsyncDropbox(FakeDropbox())
+    outcome = await _upload(dbx, _chunks(b"aa", b"bb", b"cc", b"d"), "/b/x.tar")
+    assert outcome.size == 7
+    assert dbx.calls == [
+        ("start", 2), ("append", 2), ("append", 2), ("append", 1),
+        ("finish_batch", 1),
+    ]
+    assert dbx.files["/b/x.tar"] == b"aabbccd"
+
+
+@pytest.mark.parametrize("after_write", [False, True])
+async def test_upload_retries_dropped_requests(after_write):
+    """Network errors are retried, including ones after Dropbox got the data."""
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx.client.fail_next = 1
+    dbx.client.fail_after_write = after_write
+    sizer = _tiny_sizer()
+    finish = await backup_engine.upload_to_dropbox(
+        dbx, _chunks(b"aa", b"bb", b"c"), "/b/x.tar", sizer=sizer
+    )
+    await backup_engine.commit_uploads(dbx, [finish])
+    assert dbx.files["/b/x.tar"] == b"aabbc"
+    assert sizer.failures == 1
+
+
+async def test_upload_paces_every_attempt(monkeypatch):
+    """Each request, retries included, runs with the upload bucket."""
+    buckets = []
+    fake = FakeDropbox()
+    append = fake.files_upload_session_append_v2
+
+    def paced_append(data, cursor, close=False):
+        buckets.append(dropbox_client._pacing.bucket)
+        return append(data, cursor, close)
+
+    fake.files_upload_session_append_v2 = paced_append
+    fake.fail_next = 1
+    limiter = BandwidthLimiter(day_mbps=8, night_mbps=8)
+    dbx = AsyncDropbox(fake)
+    finish = await backup_engine.upload_to_dropbox(
+        dbx, _chunks(b"aa", b"bb", b"c"), "/b/x.tar", sizer=_tiny_sizer(),
+        limiter=limiter,
+    )
+    await backup_engine.commit_uploads(dbx, [finish])
+    assert fake.files["/b/x.tar"] == b"aabbc"
+    assert buckets == [limiter.upload] * 3
+    assert limiter.upload.rate == 1_000_000
+
+
+async def test_commit_uploads_batches_sessions(monkeypatch):
+    """Sessions are committed together, split at the batch limit."""
+    monkeypatch.setattr(backup_engine, "FINISH_BATCH_LIMIT", 2)
+    dbx = AsyncDropbox(FakeDropbox())
+    finishes = [
+        await backup_engine.upload_to_dropbox(dbx, _chunks(b"x" * n), f"/b/{n}.tar")
+        for n in (1, 2, 3)
+    ]
+    outcomes = await backup_engine.commit_uploads(dbx, finishes)
+    assert [o.size for o in outcomes] == [1, 2, 3]
+    assert [c for c in dbx.calls if c[0] == "finish_batch"] == [
+        ("finish_batch", 2), ("finish_batch", 1),
+    ]
+
+
+async def test_commit_uploads_reports_entry_failures():
+    """A rejected entry becomes a CommitError without failing the others."""
+    dbx = AsyncDropbox(FakeDropbox())
+    good = await backup_engine.upload_to_dropbox(dbx, _chunks(b"ok"), "/b/ok.tar")
+    bad = dropbox.files.UploadSessionFinishArg(
+        cursor=dropbox.files.UploadSessionCursor(session_id="nope", offset=0),
+        commit=dropbox.files.CommitInfo(path="/b/bad.tar"),
+    )
+    outcomes = await backup_engine.commit_uploads(dbx, [bad, good])
+    assert isinstance(outcomes[0], backup_engine.CommitError)
+    assert outcomes[1].size == 2
+
+
+async def test_run_backup_concurrent_workers_keep_order(monkeypatch):
+    """Workers finishing out of order still yield ordered, complete state."""
+    backups = [
+        {"slug": "s1", "name": "slow", "date": "2026-01-01"},
+        {"slug": "s2", "name": "fast", "date": "2026-01-02"},
+        {"slug": "s3", "name": "broken", "date": "2026-01-03"},
+        {"slug": "s4", "name": "done", "date": "2026-01-04"},
+    ]
+    state.save_uploaded({"s4": {"name": "done", "dropbox_path": "/b/done.tar"}})
+
+    async def fake_list():
+        return backups
+
+    async def fake_download(slug, chunk_size=backup_engine.CHUNK_SIZE, limiter=None):
+        if slug == "s3":
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.05 if slug == "s1" else 0)
+        yield slug.encode()
+
+    monkeypatch.setattr(backup_engine, "list_ha_backups", fake_list)
+    monkeypatch.setattr(backup_engine, "download_backup", fake_download)
+
+    dbx = AsyncDropbox(FakeDropbox())
+    result = await backup_engine.run_backup(dbx, "/b", 0, max_workers=3)
+
+    assert result["uploaded"] == ["slow", "fast"]
+    assert result["skipped"] == ["done"]
+    assert result["errors"] == ["broken: boom"]
+    assert set(state.load_uploaded()) == {"s1", "s2", "s4"}
+    assert [c for c in dbx.calls if c[0] == "finish_batch"] == [("finish_batch", 2)]
+    assert state.load_upload_sessions() == {}
+
+
+async def test_run_backup_splits_memory_budget_between_workers(monkeypatch):
+    """Concurrent transfers share the upload memory budget."""
+    backups = [{"slug": f"s{i}", "name": f"b{i}"} for i in range(3)]
+    sizes = []
+
+    async def fake_list():
+        return backups
+
+    async def fake_download(slug, chunk_size=backup_engine.CHUNK_SIZE, limiter=None):
+        yield slug.encode()
+
+    class RecordingSizer(AdaptiveChunkSizer):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            sizes.append(self.max_size)
+
+    monkeypatch.setattr(backup_engine, "list_ha_backups", fake_list)
+    monkeypatch.setattr(backup_engine, "download_backup", fake_download)
+    monkeypatch.setattr(backup_engine, "AdaptiveChunkSizer", RecordingSizer)
+    monkeypatch.setattr(backup_engine, "UPLOAD_MEMORY_BUDGET", 48 * 1024 * 1024)
+
+    dbx = AsyncDropbox(FakeDropbox())
+    result = await backup_engine.run_backup(dbx, "/b", 0, max_workers=2)
+    assert len(result["uploaded"]) == 3
+    assert sizes == [12 * 1024 * 1024] * 3
+
+
+async def test_upload_checkpoints_session_and_clears_on_finish():
+    """Each acknowledged chunk is checkpointed; finishing removes it."""
+    dbx = AsyncDropbox(FakeDropbox())
+    seen = []
+
+    async def chunks():
+        for block in (b"aa", b"bb", b"c"):
+            yield block
+            seen.append(state.load_upload_sessions().get("slug1", {}).get("offset"))
+
+    await backup_engine.upload_to_dropbox(
+        dbx, chunks(), "/b/x.tar", "slug1", _tiny_sizer()
+    )
+    assert seen == [None, 2, 4]
+    checkpoint = state.load_upload_sessions()["slug1"]
+    assert checkpoint["offset"] == 5
+    assert checkpoint["closed"] is True
+
+
+async def test_upload_resumes_from_acknowledged_offset():
+    """A valid checkpoint resumes at the offset Dropbox reports."""
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx._sessions["old"] = bytearray(b"aabbc")
+    state.save_upload_session("slug1", {
+        "session_id": "old", "offset": 4, "dropbox_path": "/b/x.tar",
+    })
+
+    outcome = await _upload(
+        dbx, _chunks(b"aa", b"bb", b"cc", b"d"), "/b/x.tar", "slug1"
+    )
+    assert outcome.size == 7
+    assert dbx.files["/b/x.tar"] == b"aabbccd"
+    assert ("start", 2) not in dbx.calls
+
+
+async def test_upload_closed_checkpoint_skips_stream():
+    """A closed checkpoint is committed without reading the backup again."""
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx._sessions["old"] = bytearray(b"aabbc")
+    dbx._closed.add("old")
+    state.save_upload_session("slug1", {
+        "session_id": "old", "offset": 5, "dropbox_path": "/b/x.tar", "closed": True,
+    })
+
+    async def chunks():
+        raise AssertionError("stream must not be read")
+        yield b""
+
+    outcome = await _upload(dbx, chunks(), "/b/x.tar", "slug1")
+    assert outcome.size == 5
+    assert dbx.calls == [("finish_batch", 1)]
+
+
+@pytest.mark.parametrize("path", ["/b/x.tar", "/b/other.tar"])
+async def test_upload_restarts_when_checkpoint_unusable(path):
+    """An expired session or a different target path restarts from zero."""
+    dbx = AsyncDropbox(FakeDropbox())
+    state.save_upload_session("slug1", {
+        "session_id": "expired", "offset": 4, "dropbox_path": path,
+    })
+
+    await _upload(dbx, _chunks(b"aa", b"bb", b"c"), "/b/x.tar", "slug1")
+    assert dbx.files["/b/x.tar"] == b"aabbc"
+    assert dbx.calls[-4:] == [
+        ("start", 2), ("append", 2), ("append", 1), ("finish_batch", 1),
+    ]
+
+
+def _single_backup(monkeypatch, content, size_bytes=None):
+    backup = {"slug": "s1", "name": "full", "date": "2026-01-01"}
+    if size_bytes is not None:
+        backup["size_bytes"] = size_bytes
+    reads = []
+
+    async def fake_list():
+        return [backup]
+
+    async def fake_download(slug, chunk_size=backup_engine.CHUNK_SIZE, limiter=None):
+        reads.append(slug)
+        yield content
+
+    monkeypatch.setattr(backup_engine, "list_ha_backups", fake_list)
+    monkeypatch.setattr(backup_engine, "download_backup", fake_download)
+    return reads
+
+
+async def test_run_backup_records_content_hash(monkeypatch):
+    """Uploaded backups are tracked with their verified content hash."""
+    _single_backup(monkeypatch, b"payload")
+    dbx = AsyncDropbox(FakeDropbox())
+    await backup_engine.run_backup(dbx, "/b", 0)
+    entry = state.load_uploaded()["s1"]
+    assert entry["content_hash"] == dbx.client._metadata("/b/full_2026-01-01.tar").content_hash
+    assert entry["size"] == 7
+
+
+async def test_run_backup_publishes_progress(monkeypatch):
+    """Each transfer reports the bytes read and sent to the progress bus."""
+    _single_backup(monkeypatch, b"payload", size_bytes=7)
+    queue = progress.bus.subscribe()
+    try:
+        await backup_engine.run_backup(AsyncDropbox(FakeDropbox()), "/b", 0)
+    finally:
+        progress.bus.unsubscribe(queue)
+    events = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert events[0]["state"] == "running"
+    assert events[-1]["state"] == "transferred"
+    assert events[-1]["bytes_read"] == events[-1]["bytes_sent"] == 7
+    assert events[-1]["percent"] == 100.0
+    assert progress.bus.snapshot() == []
+
+
+async def test_run_backup_skips_identical_remote_file(monkeypatch):
+    """Lost tracking state does not cause identical files to be re-sent."""
+    _single_backup(monkeypatch, b"payload")
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx.files["/b/full_2026-01-01.tar"] = b"payload"
+
+    result = await backup_engine.run_backup(dbx, "/b", 0)
+    assert result["skipped"] == ["full"]
+    assert dbx.calls == []
+    assert state.load_uploaded()["s1"]["deduplicated"] is True
+
+
+async def test_run_backup_copies_identical_content_server_side(monkeypatch):
+    """Identical content under another name is copied, not uploaded."""
+    _single_backup(monkeypatch, b"payload", size_bytes=7)
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx.files["/b/renamed.tar"] = b"payload"
+
+    result = await backup_engine.run_backup(dbx, "/b", 0)
+    assert result["uploaded"] == ["full"]
+    assert dbx.calls == [("copy", "/b/full_2026-01-01.tar")]
+    assert state.load_uploaded()["s1"]["copied_from"] == "/b/renamed.tar"
+
+
+async def test_run_backup_uploads_when_same_size_differs(monkeypatch):
+    """A same-size remote file with different content is not reused."""
+    reads = _single_backup(monkeypatch, b"payload", size_bytes=7)
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx.files["/b/other.tar"] = b"PAYLOAD"
+
+    result = await backup_engine.run_backup(dbx, "/b", 0)
+    assert result["uploaded"] == ["full"]
+    assert dbx.files["/b/full_2026-01-01.tar"] == b"payload"
+    assert reads == ["s1", "s1"]
+
+
+async def test_run_backup_compresses_when_enabled(monkeypatch):
+    """Compressed backups are stored as .tar.gz and report their ratio."""
+    _single_backup(monkeypatch, b"payload" * 1000)
+    dbx = AsyncDropbox(FakeDropbox())
+    try:
+        result = await backup_engine.run_backup(dbx, "/b", 0, compression="always")
+    finally:
+        process_pool.shutdown()
+
+    stored = dbx.files["/b/full_2026-01-01.tar.gz"]
+    assert gzip.decompress(stored) == b"payload" * 1000
+    assert result["transfers"]["full"]["compression"]["raw_bytes"] == 7000
+    entry = state.load_uploaded()["s1"]
+    assert entry["compressed"] is True
+    assert entry["size"] == len(stored)
+
+
+async def _fixed_chunks(blocks):
+    """Split into 4-byte chunks, standing in for content-defined chunking."""
+    data = b"".join([block async for block in blocks])
+    for start in range(0, len(data), 4):
+        yield data[start:start + 4]
+
+
+def _chunk_backups(monkeypatch, *contents):
+    backups = [
+        {"slug": f"s{i}", "name": f"full{i}", "date": "2026-01-01"}
+        for i in range(len(contents))
+    ]
+    listed = []
+
+    async def fake_list():
+        return listed
+
+    async def fake_download(slug, chunk_size=backup_engine.CHUNK_SIZE, limiter=None):
+        yield contents[int(slug[1:])]
+
+    monkeypatch.setattr(backup_engine, "list_ha_backups", fake_list)
+    monkeypatch.setattr(backup_engine, "download_backup", fake_download)
+    monkeypatch.setattr(backup_engine, "split_chunks", _fixed_chunks)
+    return backups, listed
+
+
+async def test_run_backup_chunk_store_uploads_only_new_chunks(monkeypatch, caplog):
+    """A second backup only sends the chunks the store does not hold."""
+    backups, listed = _chunk_backups(monkeypatch, b"aaaabbbbcccc", b"aaaabbbbdddd")
+    dbx = AsyncDropbox(FakeDropbox())
+
+    listed.append(backups[0])
+    caplog.set_level(logging.INFO, logger="backup_engine")
+    await backup_engine.run_backup(dbx, "/b", 0, storage="chunks")
+    # One summary line per backup, not two lines per chunk
+    assert not any("Upload" in r.getMessage() for r in caplog.records)
+    assert any("3 of 3 chunks new" in r.getMessage() for r in caplog.records)
+    listed.append(backups[1])
+    dbx.calls.clear()
+    result = await backup_engine.run_backup(dbx, "/b", 0, storage="chunks")
+
+    assert result["uploaded"] == ["full1"]
+    assert result["transfers"]["full1"]["chunk_store"] == {
+        "chunks": 3, "new_chunks": 1, "new_bytes": 4,
+    }
+    assert dbx.calls == [
+        ("start", 4), ("finish_batch", 1), ("upload", "/b/full1_2026-01-01.manifest.json"),
+    ]
+    manifest = json.loads(dbx.files["/b/full1_2026-01-01.manifest.json"])
+    restored = b"".join(
+        dbx.files[chunk_path("/b", chunk_id)] for chunk_id, _ in manifest["chunks"]
+    )
+    assert restored == b"aaaabbbbdddd"
+    assert len(state.load_chunk_index()["chunks"]) == 4
+
+
+async def test_run_backup_commits_chunks_of_failed_backups(monkeypatch):
+    """A chunk skipped because another backup sent it is still stored when
+    that other backup fails later."""
+    backups = [
+        {"slug": f"s{i}", "name": f"full{i}", "date": "2026-01-01"} for i in range(2)
+    ]
+    claimed, read = asyncio.Event(), asyncio.Event()
+
+    async def fake_list():
+        return backups
+
+    async def fake_download(slug, chunk_size=backup_engine.CHUNK_SIZE, limiter=None):
+        if slug == "s0":
+            yield b"aaaa"
+            claimed.set()
+            await read.wait()
+            raise RuntimeError("supervisor dropped")
+        await claimed.wait()
+        yield b"aaaa"
+        yield b"bbbb"
+        read.set()
+
+    async def streamed_chunks(blocks):
+        async for block in blocks:
+            yield block
+
+    monkeypatch.setattr(backup_engine, "list_ha_backups", fake_list)
+    monkeypatch.setattr(backup_engine, "download_backup", fake_download)
+    monkeypatch.setattr(backup_engine, "split_chunks", streamed_chunks)
+    dbx = AsyncDropbox(FakeDropbox())
+
+    result = await backup_engine.run_backup(dbx, "/b", 0, max_workers=2, storage="chunks")
+
+    assert result["errors"] == ["full0: supervisor dropped"]
+    assert result["uploaded"] == ["full1"]
+    assert result["transfers"]["full1"]["chunk_store"]["new_chunks"] == 1
+    manifest = json.loads(dbx.files["/b/full1_2026-01-01.manifest.json"])
+    restored = b"".join(
+        dbx.files[chunk_path("/b", chunk_id)] for chunk_id, _ in manifest["chunks"]
+    )
+    assert restored == b"aaaabbbb"
+
+
+async def test_run_backup_chunk_index_rebuilt_from_dropbox(monkeypatch):
+    """A lost chunk index is rebuilt from the chunks stored in Dropbox."""
+    backups, listed = _chunk_backups(monkeypatch, b"aaaabbbb")
+    listed.append(backups[0])
+    dbx = AsyncDropbox(FakeDropbox())
+    dbx.files[chunk_path("/b", content_hash(b"aaaa"))] = b"aaaa"
+
+    await backup_engine.run_backup(dbx, "/b", 0, storage="chunks")
+    assert dbx.calls[0] == ("start", 4)
+    assert ("start", 4) not in dbx.calls[1:]
+
+
+async def test_retention_collects_unreferenced_chunks(monkeypatch):
+    """Deleting a manifest deletes the chunks only it referred to."""
+    backups, listed = _chunk_backups(monkeypatch, b"aaaabbbb", b"aaaacccc")
+    dbx = AsyncDropbox(FakeDropbox())
+
+    listed.append(backups[0])
+    await backup_engine.run_backup(dbx, "/b", 1, storage="chunks")
+    listed.append(backups[1])
+    await backup_engine.run_backup(dbx, "/b", 1, storage="chunks")
+
+    stored = {p.rsplit("/", 1)[-1] for p in dbx.files if "/.chunks/" in p}
+    assert stored == {content_hash(b"aaaa"), content_hash(b"cccc")}
+    assert set(state.load_chunk_index()["chunks"]) == stored
+    assert "/b/full0_2026-01-01.manifest.json" not in dbx.files
+    assert state.get_uploaded("s0")["pruned"] is True
+    assert "pruned" not in state.get_uploaded("s1")
+
+
+async def test_retention_deletes_surplus_in_one_batch(monkeypatch):
+    """Old backups are deleted with one batch job and marked pruned."""
+    dbx = AsyncDropbox(FakeDropbox())
+    uploaded = {}
+    for i in range(5):
+        path = f"/b/Backup_{i}.tar"
+        dbx.files[path] = b"x"
+        uploaded[f"s{i}"] = {"name": f"Backup {i}", "dropbox_path": path}
+    dbx.files["/b/other/nested.tar"] = b"x"
+    state.save_uploaded(uploaded)
+
+    await backup_engine._enforce_retention(dbx, "/b", 2)
+
+    assert dbx.calls == [("delete_batch", 3), ("delete_batch_check", "job")]
+    assert sorted(dbx.files) == ["/b/Backup_3.tar", "/b/Backup_4.tar", "/b/other/nested.tar"]
+    pruned = [slug for slug, info in state.load_uploaded().items() if info.get("pruned")]
+    assert sorted(pruned) == ["s0", "s1", "s2"]
+
+
+async def test_pruned_backups_are_not_uploaded_again(monkeypatch):
+    """Backups retention deleted stay done while Home Assistant keeps them."""
+    backups = [{"slug": f"s{i}", "name": f"b{i}", "date": "2026-01-01"} for i in range(3)]
+
+    async def fake_list():
+        return backups
+
+    async def fake_download(slug, chunk_size=backup_engine.CHUNK_SIZE, limiter=None):
+        yield slug.encode()
+
+    monkeypatch.setattr(backup_engine, "list_ha_backups", fake_list)
+    monkeypatch.setattr(backup_engine, "download_backup", fake_download)
+    monkeypatch.setattr(discovery, "list_ha_backups", fake_list)
+    monkeypatch.setattr(discovery, "backup_info", _no_info)
+    dbx = AsyncDropbox(FakeDropbox())
+    found = BackupDiscovery()
+
+    result = await backup_engine.run_backup(dbx, "/b", 1, discovery=found)
+    assert len(result["uploaded"]) == 3
+    assert len(dbx.files) == 1
+    assert found.pending() == []
+
+    # The inventory sees the pruned files missing from Dropbox
+    dbx.calls.clear()
+    result = await backup_engine.run_backup(
+        dbx, "/b", 1, inventory=RemoteInventory("/b"), discovery=found
+    )
+    assert result["uploaded"] == []
+    assert not [c for c in dbx.calls if c[0] in ("start", "delete_batch")]
+
+    # Once Home Assistant deletes a pruned backup, it is no longer tracked
+    pruned = next(slug for slug, info in state.load_uploaded().items() if info.get("pruned"))
+    backups[:] = [b for b in backups if b["slug"] != pruned]
+    await backup_engine.run_backup(dbx, "/b", 1, discovery=found)
+    assert state.get_uploaded(pruned) is None
+    assert len(state.load_uploaded()) == 2
+
+
+async def test_run_backup_reuploads_backups_missing_from_inventory(monkeypatch):
+    """Tracked backups whose file was deleted in Dropbox are sent again."""
+    _single_backup(monkeypatch, b"payload")
+    state.save_uploaded({"s1": {"name": "full", "dropbox_path": "/b/full_2026-01-01.tar"}})
+    dbx = AsyncDropbox(FakeDropbox())
+
+    result = await backup_engine.run_backup(
+        dbx, "/b", 0, inventory=RemoteInventory("/b")
+    )
+    assert result["uploaded"] == ["full"]
+    assert dbx.files["/b/full_2026-01-01.tar"] == b"payload"
+
+
+async def test_run_backup_uploads_discovered_pending_backups(monkeypatch):
+    """With discovery, only backups it reports as pending are sent."""
+    _single_backup(monkeypatch, b"payload")
+    monkeypatch.setattr(discovery, "list_ha_backups", backup_engine.list_ha_backups)
+    monkeypatch.setattr(discovery, "backup_info", _no_info)
+    found = BackupDiscovery()
+    dbx = AsyncDropbox(FakeDropbox())
+
+    result = await backup_engine.run_backup(dbx, "/b", 0, discovery=found)
+    assert result["uploaded"] == ["full"]
+    assert found.pending() == []
+
+    result = await backup_engine.run_backup(dbx, "/b", 0, discovery=found)
+    assert result["skipped"] == ["full"]
+
+
+async def _no_info(slug):
+    return {}
@@ -0,0 +1,59 @@
+"""Tests for adaptive upload chunk sizing."""
+
+from chunk_sizer import (
+    CHUNK_ALIGN,
+    MAX_CHUNK_SIZE,
+    MIN_CHUNK_SIZE,
+    AdaptiveChunkSizer,
+)
+
+
+def _simulate(sizer, bandwidth, overhead, chunks=30):
+    for _ in range(chunks):
+        sizer.record(sizer.size, overhead + sizer.size / bandwidth)
+    return sizer.size
+
+
+def test_starts_at_minimum():
+    """The first chunk uses the minimum size."""
+    assert AdaptiveChunkSizer().size == MIN_CHUNK_SIZE
+
+
+def test_fast_link_with_high_overhead_grows_to_maximum():
+    """A fast link with costly round-trips ends up at the largest chunk."""
+    assert _simulate(AdaptiveChunkSizer(), 60e6, 0.5) == MAX_CHUNK_SIZE
+
+
+def test_slow_link_stays_small():
+    """A slow link keeps requests short so retries stay cheap."""
+    assert _simulate(AdaptiveChunkSizer(), 250e3, 1.0) == MIN_CHUNK_SIZE
+
+
+def test_sizes_are_aligned_and_bounded():
+    """Every chosen size is a 4 MB multiple within Dropbox's limit."""
+    sizer = AdaptiveChunkSizer()
+    for bandwidth in (1e6, 80e6, 5e6, 30e6):
+        for _ in range(10):
+            sizer.record(sizer.size, 0.3 + sizer.size / bandwidth)
+            assert sizer.size % CHUNK_ALIGN == 0
+            assert MIN_CHUNK_SIZE <= sizer.size <= MAX_CHUNK_SIZE
+
+
+def test_failure_halves_size():
+    """A failed request halves the next chunk."""
+    sizer = AdaptiveChunkSizer()
+    sizer.size = 16 * CHUNK_ALIGN
+    sizer.record_failure()
+    assert sizer.size == 8 * CHUNK_ALIGN
+    assert sizer.summary() == {"chunks": 0}
+
+
+def test_summary_reports_sizes_and_estimates():
+    """The summary lists chunk sizes, throughput and estimated overhead."""
+    sizer = AdaptiveChunkSizer()
+    _simulate(sizer, 60e6, 0.5, chunks=6)
+    summary = sizer.summary()
+    assert summary["chunks"] == 6
+    assert summary["min_chunk"] == MIN_CHUNK_SIZE
+    assert summary["max_chunk"] > MIN_CHUNK_SIZE
+    assert 400 <= summary["overhead_ms"] <= 600
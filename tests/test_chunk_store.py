@@ -0,0 +1,75 @@
+"""Tests for content-defined chunking."""
+
+import random
+
+import pytest
+
+import chunk_store
+import process_pool
+from chunk_store import chunk_path, is_manifest, split_chunks
+
+
+@pytest.fixture(autouse=True)
+def _shutdown_pool():
+    yield
+    process_pool.shutdown()
+
+
+async def _blocks(data, size=1024 * 1024):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _split(data):
+    return [chunk async for chunk in split_chunks(_blocks(data))]
+
+
+async def test_split_chunks_covers_stream_within_bounds():
+    """Chunks reassemble to the input and respect the size limits."""
+    data = random.Random(1).randbytes(6 * 1024 * 1024) + bytes(9 * 1024 * 1024)
+    chunks = await _split(data)
+
+    assert b"".join(chunks) == data
+    assert all(len(c) >= chunk_store.MIN_CHUNK_SIZE for c in chunks[:-1])
+    assert all(len(c) <= chunk_store.MAX_CHUNK_SIZE for c in chunks)
+    # Zeros never produce a cut, so they are split at the maximum size
+    assert chunk_store.MAX_CHUNK_SIZE in map(len, chunks)
+
+
+async def test_split_chunks_resynchronises_after_insertion():
+    """Data inserted early only changes the chunks around it."""
+    data = random.Random(2).randbytes(7 * 1024 * 1024)
+    edited = data[:1000] + b"inserted" + data[1000:]
+
+    original = await _split(data)
+    changed = await _split(edited)
+
+    assert len(original) > 2
+    assert original[1:] == changed[1:]
+
+
+def _reference_cuts(block, prefix):
+    """The gear hash computed byte by byte."""
+    h, cuts = 0, []
+    for offset, byte in enumerate(prefix + block, 1 - len(prefix)):
+        h = ((h << 1) + int(chunk_store._GEAR[byte])) & ((1 << 64) - 1)
+        if offset > 0 and h < chunk_store._CUT_BELOW:
+            cuts.append(offset)
+    return cuts
+
+
+@pytest.mark.parametrize("size,prefix_size", [(0, 64), (1, 0), (3, 5), (70_000, 0), (150_000, 64)])
+def test_cut_candidates_match_rolling_hash(monkeypatch, size, prefix_size):
+    """The vectorised scan finds the cuts of the byte-by-byte hash."""
+    monkeypatch.setattr(chunk_store, "_CUT_BELOW", 1 << 58)  # frequent cuts
+    rng = random.Random(size)
+    block, prefix = rng.randbytes(size), rng.randbytes(prefix_size)
+    cuts = chunk_store._cut_candidates(block, prefix)
+    assert cuts == _reference_cuts(block, prefix)
+    assert len(cuts) >= size // 100
+
+
+def test_store_paths():
+    assert chunk_path("/b", "abcdef") == "/b/.chunks/ab/abcdef"
+    assert is_manifest("/b/Full_2026.manifest.json")
+    assert not is_manifest("/b/Full_2026.tar")
@@ -0,0 +1,53 @@
+"""Tests for parallel backup compression."""
+
+import gzip
+
+import pytest
+
+import process_pool
+from compression import CompressionStats, compress_stream, should_compress
+
+
+@pytest.fixture(autouse=True)
+def _shutdown_pool():
+    yield
+    process_pool.shutdown()
+
+
+async def _chunks(*blocks):
+    for block in blocks:
+        yield block
+
+
+async def test_compress_stream_round_trips_in_order():
+    """Concatenated gzip members decompress to the original stream."""
+    blocks = [bytes([i]) * 100_000 for i in range(20)]
+    stats = CompressionStats()
+    output = b"".join([m async for m in compress_stream(_chunks(*blocks), stats)])
+
+    assert gzip.decompress(output) == b"".join(blocks)
+    assert stats.raw_bytes == 2_000_000
+    assert stats.compressed_bytes == len(output)
+    assert stats.summary()["ratio"] < 0.01
+
+
+async def test_compress_stream_is_deterministic():
+    """Resumed uploads rely on identical output for identical input."""
+    first = [m async for m in compress_stream(_chunks(b"a" * 1000, b"b"))]
+    second = [m async for m in compress_stream(_chunks(b"a" * 1000, b"b"))]
+    assert first == second
+
+
+@pytest.mark.parametrize(
+    "mode, backup, expected",
+    [
+        ("off", {"compressed": False}, False),
+        ("always", {"compressed": True}, True),
+        ("auto", {"compressed": False}, True),
+        ("auto", {"compressed": True}, False),
+        ("auto", {"compressed": False, "protected": True}, False),
+        ("auto", {}, False),
+    ],
+)
+def test_should_compress(mode, backup, expected):
+    assert should_compress(mode, backup) is expected
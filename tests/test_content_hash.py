@@ -0,0 +1,43 @@
+"""Tests for the Dropbox content hash."""
+
+import hashlib
+
+from content_hash import BLOCK_SIZE, DropboxContentHasher
+
+
+def _reference(data: bytes) -> str:
+    blocks = [data[i:i + BLOCK_SIZE] for i in range(0, len(data), BLOCK_SIZE)]
+    digests = b"".join(hashlib.sha256(block).digest() for block in blocks)
+    return hashlib.sha256(digests).hexdigest()
+
+
+def test_empty_input_matches_reference():
+    """An empty stream hashes to SHA-256 of no block digests."""
+    assert DropboxContentHasher().hexdigest() == _reference(b"")
+
+
+def test_multi_block_input_matches_reference():
+    """Data spanning several blocks is hashed block by block."""
+    data = bytes(range(256)) * (BLOCK_SIZE // 128 + 3)
+    hasher = DropboxContentHasher()
+    hasher.update(data)
+    assert hasher.hexdigest() == _reference(data)
+    assert hasher.bytes_hashed == len(data)
+
+
+def test_update_boundaries_do_not_change_hash():
+    """Feeding the same bytes in odd-sized pieces gives the same hash."""
+    data = b"x" * (BLOCK_SIZE + 12345)
+    hasher = DropboxContentHasher()
+    for start in range(0, len(data), 1_000_003):
+        hasher.update(data[start:start + 1_000_003])
+    assert hasher.hexdigest() == _reference(data)
+
+
+def test_hexdigest_does_not_finalize():
+    """hexdigest can be called mid-stream without affecting the result."""
+    hasher = DropboxContentHasher()
+    hasher.update(b"abc")
+    hasher.hexdigest()
+    hasher.update(b"def")
+    assert hasher.hexdigest() == _reference(b"abcdef")
@@ -0,0 +1,61 @@
+"""Tests for incremental backup discovery."""
+
+import discovery
+import state
+from discovery import BackupDiscovery
+
+
+def _supervisor(monkeypatch, listing):
+    info_calls = []
+
+    async def fake_list():
+        return [dict(backup) for backup in listing]
+
+    async def fake_info(slug):
+        info_calls.append(slug)
+        return {"slug": slug, "size_bytes": 100, "protected": True, "addons": []}
+
+    monkeypatch.setattr(discovery, "list_ha_backups", fake_list)
+    monkeypatch.setattr(discovery, "backup_info", fake_info)
+    return info_calls
+
+
+async def test_refresh_fetches_details_only_for_new_backups(monkeypatch):
+    listing = [{"slug": "a", "name": "A"}, {"slug": "b", "name": "B"}]
+    info_calls = _supervisor(monkeypatch, listing)
+    found = BackupDiscovery()
+
+    new = await found.refresh({"a": {}})
+    assert [b["slug"] for b in new] == ["a", "b"]
+    assert [b["slug"] for b in found.pending()] == ["b"]
+    assert found.backups["b"]["protected"] is True
+    assert "addons" not in found.backups["b"]
+
+    listing.append({"slug": "c", "name": "C"})
+    del listing[0]
+    new = await found.refresh({})
+    assert [b["slug"] for b in new] == ["c"]
+    assert info_calls == ["a", "b", "c"]
+    assert [b["slug"] for b in found.pending()] == ["b", "c"]
+    assert list(found.backups) == ["b", "c"]
+
+
+async def test_discovered_backups_survive_restart(monkeypatch):
+    info_calls = _supervisor(monkeypatch, [{"slug": "a", "name": "A"}])
+    await BackupDiscovery().refresh({})
+
+    restarted = BackupDiscovery()
+    assert await restarted.refresh({"a": {}}) == []
+    assert info_calls == ["a"]
+    assert restarted.pending() == []
+    assert state.load_discovered()["a"]["size_bytes"] == 100
+
+
+async def test_settle_recomputes_pending(monkeypatch):
+    _supervisor(monkeypatch, [{"slug": "a"}, {"slug": "b"}])
+    found = BackupDiscovery()
+    await found.refresh({})
+    found.settle({"a": {}, "b": {}})
+    assert found.pending() == []
+    found.settle({"a": {}})
+    assert [b["slug"] for b in found.pending()] == ["b"]
@@ -0,0 +1,89 @@
+"""Tests for dropbox_auth module."""
+
+from datetime import timedelta
+
+import dropbox
+
+import dropbox_auth
+from dropbox_auth import DropboxAuth, _utcnow
+from state import load_tokens, save_tokens
+
+
+def _save(expires_at):
+    save_tokens({
+        "access_token": "old-token",
+        "refresh_token": "refresh",
+        "expires_at": expires_at.isoformat(),
+    })
+
+
+def _fake_refresh(monkeypatch):
+    calls = []
+
+    def refresh(self, *args, **kwargs):
+        calls.append(self)
+        self._oauth2_access_token = "new-token"
+        self._oauth2_access_token_expiration = _utcnow() + timedelta(hours=4)
+
+    monkeypatch.setattr(dropbox.Dropbox, "refresh_access_token", refresh)
+    return calls
+
+
+def test_get_client_not_authorized():
+    assert DropboxAuth("key", "secret").get_client() is None
+
+
+def test_get_client_reuses_client_with_valid_token(monkeypatch):
+    calls = _fake_refresh(monkeypatch)
+    _save(_utcnow() + timedelta(hours=2))
+    auth = DropboxAuth("key", "secret")
+
+    first = auth.get_client()
+    assert auth.get_client() is first
+    assert first._oauth2_access_token == "old-token"
+    assert calls == []
+
+
+def test_get_client_refreshes_expired_token_and_persists(monkeypatch):
+    calls = _fake_refresh(monkeypatch)
+    _save(_utcnow() - timedelta(minutes=1))
+
+    dbx = DropboxAuth("key", "secret").get_client()
+
+    assert len(calls) == 1
+    tokens = load_tokens()
+    assert tokens["access_token"] == "new-token"
+    assert tokens["refresh_token"] == "refresh"
+    assert tokens["expires_at"] == dbx._oauth2_access_token_expiration.isoformat()
+
+
+def test_get_client_forgets_client_after_logout(monkeypatch):
+    _fake_refresh(monkeypatch)
+    _save(_utcnow() + timedelta(hours=2))
+    auth = DropboxAuth("key", "secret")
+    assert auth.get_client() is not None
+
+    save_tokens({})
+    assert auth.get_client() is None
+
+
+async def test_keep_token_fresh_refreshes_before_expiry(monkeypatch):
+    calls = _fake_refresh(monkeypatch)
+    # Valid, but inside the refresh margin
+    _save(_utcnow() + dropbox_auth.REFRESH_MARGIN / 2)
+    auth = DropboxAuth("key", "secret")
+    sleeps = []
+
+    async def stop(delay):
+        sleeps.append(delay)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(dropbox_auth.asyncio, "sleep", stop)
+    try:
+        await auth.keep_token_fresh()
+    except KeyboardInterrupt:
+        pass
+
+    assert len(calls) == 1
+    assert load_tokens()["access_token"] == "new-token"
+    assert sleeps == [dropbox_auth.CHECK_SECONDS]
@@ -0,0 +1,36 @@
+"""Tests for the async Dropbox facade."""
+
+import requests
+
+from dropbox_client import AsyncDropbox, PacedSession
+from ratelimit import ThrottledBody, TokenBucket
+
+
+class FakeClient:
+    """SDK stand-in posting its upload through a session."""
+
+    def __init__(self, session):
+        self.session = session
+
+    def files_upload(self, data, path):
+        return self.session.post("https://content.dropboxapi.com/2/files/upload", data=data)
+
+
+async def test_paced_calls_meter_request_bodies(monkeypatch):
+    """Only bodies posted by paced calls are sent through the bucket."""
+    sent = []
+
+    def fake_request(self, method, url, data=None, **kwargs):
+        sent.append(data if isinstance(data, bytes) else data.read())
+        return data
+
+    monkeypatch.setattr(requests.Session, "request", fake_request)
+    bucket = TokenBucket()
+    dbx = AsyncDropbox(FakeClient(PacedSession()))
+
+    assert await dbx.files_upload(b"plain", "/a") == b"plain"
+    body = await dbx.paced(bucket).files_upload(b"paced", "/b")
+    assert isinstance(body, ThrottledBody)
+    assert sent == [b"plain", b"paced"]
+    # The thread is free of the bucket once the paced call returns
+    assert await dbx.files_upload(b"again", "/c") == b"again"
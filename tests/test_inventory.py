@@ -0,0 +1,143 @@
+"""Tests for the cached remote inventory."""
+
+import asyncio
+
+import dropbox
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import inventory as inventory_module
+import state
+from content_hash import content_hash
+from dropbox_client import AsyncDropbox
+from inventory import RemoteInventory
+
+
+def _file(path, size=1):
+    return dropbox.files.FileMetadata(
+        name=path.rsplit("/", 1)[-1], path_lower=path.lower(), path_display=path,
+        size=size, content_hash=content_hash(path.encode()),
+    )
+
+
+class FakeListing:
+    """Dropbox folder listing that replays queued changes on continue."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.changes = []
+        self.calls = []
+        self.reset = False
+
+    def files_list_folder(self, path, recursive=False):
+        self.calls.append(("list", path, recursive))
+        return dropbox.files.ListFolderResult(
+            entries=self.entries, cursor="c0", has_more=False
+        )
+
+    def files_list_folder_continue(self, cursor):
+        self.calls.append(("continue", cursor))
+        if self.reset:
+            self.reset = False
+            raise dropbox.exceptions.ApiError(
+                "req", dropbox.files.ListFolderContinueError.reset, None, None
+            )
+        changes, self.changes = self.changes, []
+        return dropbox.files.ListFolderResult(
+            entries=changes, cursor=cursor + "+", has_more=False
+        )
+
+
+async def test_refresh_lists_once_then_follows_changes():
+    """Only the first refresh lists the folder; later ones fetch changes."""
+    listing = FakeListing([_file("/b/A.tar"), _file("/b/.chunks/ab/abc")])
+    inventory = RemoteInventory("/b")
+    await inventory.refresh(AsyncDropbox(listing))
+
+    listing.changes = [
+        _file("/b/B.tar", size=2),
+        dropbox.files.DeletedMetadata(name="A.tar", path_lower="/b/a.tar"),
+        dropbox.files.DeletedMetadata(name=".chunks", path_lower="/b/.chunks"),
+    ]
+    await inventory.refresh(AsyncDropbox(listing))
+
+    assert listing.calls == [("list", "/b", True), ("continue", "c0")]
+    assert [f.path_display for f in inventory.files()] == ["/b/B.tar"]
+    assert inventory.files()[0].size == 2
+    assert inventory.files("/b/.chunks", recursive=True) == []
+
+
+async def test_inventory_persists_cursor():
+    """A restarted addon continues from the saved cursor."""
+    listing = FakeListing([_file("/b/A.tar")])
+    await RemoteInventory("/b").refresh(AsyncDropbox(listing))
+
+    restored = RemoteInventory("/b")
+    assert restored.cursor == "c0"
+    assert restored.has("/b/a.TAR")
+    assert RemoteInventory("/elsewhere").cursor is None
+    assert state.load_inventory()["backup_path"] == "/b"
+
+
+async def test_unchanged_inventory_is_not_saved_again(monkeypatch):
+    saved = []
+    monkeypatch.setattr(inventory_module, "save_inventory", saved.append)
+    listing = FakeListing([_file("/b/A.tar")])
+    inventory = RemoteInventory("/b")
+
+    await inventory.refresh(AsyncDropbox(listing))
+    await inventory.refresh(AsyncDropbox(listing))
+    assert len(saved) == 1
+
+    listing.changes = [_file("/b/B.tar")]
+    await inventory.refresh(AsyncDropbox(listing))
+    assert len(saved) == 2
+    assert saved[-1]["cursor"] == "c0++"
+    assert "/b/b.tar" in saved[-1]["entries"]
+
+
+async def test_reset_cursor_relists():
+    listing = FakeListing([_file("/b/A.tar")])
+    inventory = RemoteInventory("/b")
+    await inventory.refresh(AsyncDropbox(listing))
+    listing.reset = True
+    listing.entries = [_file("/b/C.tar")]
+
+    await inventory.refresh(AsyncDropbox(listing))
+    assert [f.path_display for f in inventory.files()] == ["/b/C.tar"]
+
+
+async def test_watch_relists_after_longpoll_reset(monkeypatch):
+    """A 409 from the long-poll drops the cursor instead of retrying it."""
+    polls = []
+    relisted = asyncio.Event()
+
+    async def longpoll(request):
+        polls.append((await request.json())["cursor"])
+        if len(polls) == 1:
+            return web.json_response(
+                {"error_summary": "reset/", "error": {".tag": "reset"}}, status=409
+            )
+        relisted.set()
+        await asyncio.sleep(60)
+
+    app = web.Application()
+    app.router.add_post("/longpoll", longpoll)
+    async with TestServer(app) as server:
+        monkeypatch.setattr(inventory_module, "LONGPOLL_URL", str(server.make_url("/longpoll")))
+        listing = FakeListing([_file("/b/A.tar")])
+        inventory = RemoteInventory("/b")
+        inventory.cursor = "expired"
+
+        async def get_client():
+            return AsyncDropbox(listing)
+
+        watch = asyncio.create_task(inventory.watch(get_client))
+        try:
+            await asyncio.wait_for(relisted.wait(), 5)
+        finally:
+            watch.cancel()
+
+    assert polls == ["expired", "c0"]
+    assert listing.calls == [("list", "/b", True)]
+    assert inventory.has("/b/A.tar")
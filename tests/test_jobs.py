@@ -0,0 +1,102 @@
+"""Tests for the backup job manager."""
+
+import asyncio
+
+from jobs import JobManager
+
+
+async def test_concurrent_triggers_share_one_run():
+    release = asyncio.Event()
+    runs = []
+    finished = []
+
+    async def backup():
+        runs.append(1)
+        await release.wait()
+        return {"uploaded": ["a"]}
+
+    jobs = JobManager(backup, finished.append)
+    first = jobs.submit("manual")
+    second = jobs.submit("scheduled")
+    waiting = asyncio.create_task(jobs.run("new_backup"))
+    await asyncio.sleep(0)
+
+    assert second is first
+    assert jobs.busy
+    assert first.state == "running"
+
+    release.set()
+    assert await waiting == {"uploaded": ["a"]}
+    assert runs == [1]
+    assert finished == [{"uploaded": ["a"]}]
+    assert first.state == "succeeded"
+    assert first.to_dict()["merged_triggers"] == 2
+    assert not jobs.busy
+
+
+async def test_failed_job_is_recorded():
+    finished = []
+
+    async def backup():
+        raise RuntimeError("boom")
+
+    jobs = JobManager(backup, finished.append)
+    result = await jobs.run("manual")
+
+    assert result == {"error": "boom"}
+    assert finished == [{"error": "boom"}]
+    job = jobs.history()[0]
+    assert job.state == "failed"
+    assert jobs.get(job.id) is job
+    assert job.finished_at is not None
+
+
+async def test_backup_errors_fail_or_degrade_the_job():
+    results = iter([
+        {"uploaded": [], "errors": ["a: boom", "b: boom"]},
+        {"uploaded": ["a"], "errors": ["b: boom"]},
+    ])
+
+    async def backup():
+        return next(results)
+
+    jobs = JobManager(backup)
+    await jobs.run("manual")
+    assert jobs.history()[0].state == "failed"
+    await jobs.run("manual")
+    assert jobs.history()[0].state == "partial"
+
+
+async def test_close_cancels_running_job():
+    started, finished = asyncio.Event(), []
+
+    async def backup():
+        started.set()
+        await asyncio.sleep(60)
+        return {}
+
+    jobs = JobManager(backup, finished.append)
+    waiting = asyncio.create_task(jobs.run("scheduled"))
+    await started.wait()
+
+    await jobs.close()
+    assert not jobs.busy
+    assert jobs.history()[0].state == "cancelled"
+    assert finished == []
+    waiting.cancel()
+    await jobs.close()  # nothing left to cancel
+
+
+async def test_history_is_newest_first_and_bounded(monkeypatch):
+    import jobs as jobs_module
+
+    monkeypatch.setattr(jobs_module, "HISTORY_SIZE", 2)
+
+    async def backup():
+        return {}
+
+    jobs = JobManager(backup)
+    ids = [(await jobs.run("manual"), jobs.history()[0].id)[1] for _ in range(3)]
+
+    assert [job.id for job in jobs.history()] == ids[:0:-1]
+    assert jobs.get(ids[0]) is None
@@ -0,0 +1,48 @@
+"""Tests for the transfer progress bus."""
+
+import progress
+from progress import ProgressBus
+
+
+def test_updates_are_throttled_per_transfer(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(progress.time, "monotonic", lambda: now[0])
+    bus = ProgressBus()
+    queue = bus.subscribe()
+
+    transfer = bus.start("s1", "full", 1000)
+    transfer.read(100)
+    transfer.read(100)
+    now[0] += progress.PUBLISH_SECONDS
+    transfer.read(300)
+    transfer.sent(200)
+
+    events = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert [e["bytes_read"] for e in events] == [0, 100, 500]
+    last = events[-1]
+    assert last["percent"] == 50.0
+    assert last["bytes_per_second"] == 500
+    assert last["eta_seconds"] == 1
+
+
+def test_finish_publishes_and_forgets_transfer():
+    bus = ProgressBus()
+    transfer = bus.start("s1", "full", None)
+    queue = bus.subscribe()
+
+    assert [t["slug"] for t in bus.snapshot()] == ["s1"]
+    transfer.finish("failed")
+    assert queue.get_nowait()["state"] == "failed"
+    assert bus.snapshot() == []
+
+
+def test_slow_subscriber_drops_oldest(monkeypatch):
+    monkeypatch.setattr(progress, "QUEUE_SIZE", 2)
+    bus = ProgressBus()
+    queue = bus.subscribe()
+    for n in range(3):
+        bus.publish({"n": n})
+    assert [queue.get_nowait()["n"] for _ in range(2)] == [1, 2]
+    bus.unsubscribe(queue)
+    bus.publish({"n": 3})
+    assert queue.empty()
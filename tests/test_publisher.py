@@ -0,0 +1,111 @@
+"""Tests for the coalescing Home Assistant publisher."""
+
+import asyncio
+
+import publisher
+from publisher import Publisher
+from sensors import MAX_ERROR_LENGTH, MAX_ERRORS, truncate_errors
+
+
+def _record(monkeypatch):
+    posted, fired = [], []
+
+    async def fake_post(payload):
+        posted.append(payload)
+        return True
+
+    async def fake_fire(event_type, data):
+        fired.append(event_type)
+        return True
+
+    monkeypatch.setattr(publisher, "post_sensor", fake_post)
+    monkeypatch.setattr(publisher, "fire_event", fake_fire)
+    monkeypatch.setattr(publisher, "COALESCE_SECONDS", 0)
+    return posted, fired
+
+
+async def test_rapid_updates_are_coalesced(monkeypatch):
+    posted, fired = _record(monkeypatch)
+    pub = Publisher()
+    pub.start()
+    pub.update_state({"state": "running"})
+    pub.fire("dropbox_ha_backup.success", {})
+    pub.update_state({"state": "success"})
+    pub.fire("dropbox_ha_backup.failed", {})
+    await asyncio.sleep(0.01)
+    await pub.close()
+
+    assert posted == [{"state": "success"}]
+    assert fired == ["dropbox_ha_backup.success", "dropbox_ha_backup.failed"]
+
+
+async def test_unchanged_state_is_not_posted_again(monkeypatch):
+    posted, _ = _record(monkeypatch)
+    pub = Publisher()
+    pub.update_state({"state": "idle"})
+    await pub.flush()
+    pub.update_state({"state": "idle"})
+    await pub.flush()
+    assert len(posted) == 1
+
+    monkeypatch.setattr(publisher, "REPOST_SECONDS", 0)
+    await pub.flush()
+    assert len(posted) == 2
+
+
+async def test_idle_state_is_reposted_periodically(monkeypatch):
+    posted, _ = _record(monkeypatch)
+    monkeypatch.setattr(publisher, "REPOST_SECONDS", 0.05)
+    pub = Publisher()
+    pub.start()
+    pub.update_state({"state": "idle"})
+    await asyncio.sleep(0.2)
+    await pub.close()
+    assert len(posted) >= 3
+    assert all(payload == {"state": "idle"} for payload in posted)
+
+
+async def test_close_fires_events_interrupted_in_flight(monkeypatch):
+    posted, _ = _record(monkeypatch)
+    fired, sending = [], asyncio.Event()
+
+    async def slow_fire(event_type, data):
+        if not fired:
+            fired.append(None)
+            sending.set()
+            await asyncio.sleep(60)
+        fired.append(event_type)
+        return True
+
+    monkeypatch.setattr(publisher, "fire_event", slow_fire)
+    pub = Publisher()
+    pub.start()
+    pub.fire("dropbox_ha_backup.success", {})
+    await sending.wait()
+    await pub.close()
+    assert fired == [None, "dropbox_ha_backup.success"]
+
+
+async def test_failed_post_is_retried(monkeypatch):
+    attempts = []
+
+    async def flaky_post(payload):
+        attempts.append(payload)
+        return len(attempts) > 1
+
+    monkeypatch.setattr(publisher, "post_sensor", flaky_post)
+    pub = Publisher()
+    pub.update_state({"state": "idle"})
+    await pub.flush()
+    await pub.flush()
+    await pub.flush()
+    assert len(attempts) == 2
+
+
+def test_truncate_errors():
+    errors = ["x" * 500] + [f"e{i}" for i in range(MAX_ERRORS + 2)]
+    kept = truncate_errors(errors)
+    assert len(kept) == MAX_ERRORS + 1
+    assert len(kept[0]) == MAX_ERROR_LENGTH
+    assert kept[-1] == "… and 3 more"
+    assert truncate_errors(["a"]) == ["a"]
@@ -0,0 +1,97 @@
+"""Tests for the bandwidth limiter."""
+
+from datetime import datetime
+
+import pytest
+
+import ratelimit
+from ratelimit import BandwidthLimiter, ThrottledBody, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Fake monotonic clock advanced by asyncio.sleep."""
+    now = [1000.0]
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(ratelimit.asyncio, "sleep", fake_sleep)
+    return now, sleeps
+
+
+async def test_unlimited_bucket_never_sleeps(clock):
+    """A rate of 0 lets everything through immediately."""
+    _, sleeps = clock
+    bucket = TokenBucket(0)
+    await bucket.consume(10**9)
+    assert sleeps == []
+
+
+async def test_bucket_enforces_average_rate(clock):
+    """Consuming faster than the rate sleeps off the deficit."""
+    now, sleeps = clock
+    bucket = TokenBucket(rate=1000)
+    start = now[0]
+    for _ in range(5):
+        await bucket.consume(1000)
+    assert now[0] - start == pytest.approx(5.0)
+    assert len(sleeps) == 5
+
+
+async def test_bucket_allows_burst_after_idle(clock):
+    """Idle time refills at most one burst worth of tokens."""
+    now, sleeps = clock
+    bucket = TokenBucket(rate=1000, burst_seconds=1.0)
+    now[0] += 60
+    await bucket.consume(1000)
+    assert sleeps == []
+    await bucket.consume(1000)
+    assert sleeps == [pytest.approx(1.0)]
+
+
+@pytest.mark.parametrize("hour,expected", [(23, 1), (3, 1), (6, 2), (12, 2)])
+def test_limiter_switches_between_day_and_night(hour, expected):
+    """The night limit applies across midnight, the day limit otherwise."""
+    limiter = BandwidthLimiter(day_mbps=16, night_mbps=8)
+    rate = limiter.current_rate(datetime(2026, 1, 1, hour, 0))
+    assert rate == expected * 1_000_000
+
+
+def test_limiter_from_options_defaults_to_unlimited():
+    """Without options the limiter never throttles."""
+    limiter = BandwidthLimiter.from_options({})
+    assert limiter.current_rate() == 0
+
+
+def test_take_blocks_the_thread(clock, monkeypatch):
+    """Worker threads sleep off the deficit without an event loop."""
+    now, _ = clock
+    slept = []
+
+    def fake_sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr(ratelimit.time, "sleep", fake_sleep)
+    bucket = TokenBucket(rate=1000)
+    bucket.take(500)
+    bucket.take(500)
+    assert slept == [pytest.approx(0.5), pytest.approx(0.5)]
+
+
+def test_throttled_body_is_metered_in_slices():
+    """The body is read in slices and each slice is charged as it is read."""
+    taken = []
+    bucket = type("Bucket", (), {"take": lambda self, n: taken.append(n)})()
+    data = bytes(range(256)) * 1024
+    body = ThrottledBody(data, bucket)
+    assert len(body) == len(data)
+
+    read = b"".join(iter(lambda: body.read(10**9), b""))
+    assert read == data
+    assert taken == [ThrottledBody.SLICE_SIZE] * 4
+    assert len(body) == 0
@@ -0,0 +1,80 @@
+"""Tests for restoring chunk store backups."""
+
+import json
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import restore
+import supervisor
+from chunk_store import MANIFEST_VERSION, chunk_path
+from content_hash import content_hash
+from dropbox_client import AsyncDropbox
+from restore import RestoreError, restore_to_file, restore_to_supervisor
+
+MANIFEST = "/b/full_2026-01-01.manifest.json"
+
+
+class FakeStore:
+    """Dropbox stand-in serving downloads from a dict."""
+
+    def __init__(self, *chunks):
+        self.files = {}
+        for data in chunks:
+            self.files[chunk_path("/b", content_hash(data))] = data
+        whole = b"".join(chunks)
+        self.files[MANIFEST] = json.dumps({
+            "version": MANIFEST_VERSION,
+            "slug": "s1",
+            "name": "full",
+            "size": len(whole),
+            "content_hash": content_hash(whole),
+            "chunks": [[content_hash(data), len(data)] for data in chunks],
+        }).encode()
+
+    def files_download(self, path):
+        return None, type("Response", (), {"content": self.files[path]})()
+
+
+async def test_restore_to_file_reassembles_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(restore, "PREFETCH_CHUNKS", 2)
+    dbx = AsyncDropbox(FakeStore(b"aaaa", b"bbbb", b"cccc", b"dd"))
+    output = tmp_path / "full.tar"
+
+    manifest = await restore_to_file(dbx, MANIFEST, output)
+    assert manifest["slug"] == "s1"
+    assert output.read_bytes() == b"aaaabbbbccccdd"
+
+
+async def test_restore_rejects_damaged_chunk(tmp_path):
+    store = FakeStore(b"aaaa", b"bbbb")
+    store.files[chunk_path("/b", content_hash(b"bbbb"))] = b"bbbx"
+    target = tmp_path / "restored"
+    target.mkdir()
+
+    with pytest.raises(RestoreError, match="damaged"):
+        await restore_to_file(AsyncDropbox(store), MANIFEST, target / "full.tar")
+    assert list(target.iterdir()) == []
+
+
+async def test_restore_uploads_to_supervisor(monkeypatch):
+    received = {}
+
+    async def upload(request):
+        reader = await request.multipart()
+        part = await reader.next()
+        received[part.filename] = await part.read()
+        return web.json_response({"result": "ok", "data": {"slug": "new1"}})
+
+    app = web.Application()
+    app.router.add_post("/backups/new/upload", upload)
+    async with TestServer(app) as server:
+        monkeypatch.setattr(supervisor, "SUPERVISOR_URL", str(server.make_url("")))
+        try:
+            dbx = AsyncDropbox(FakeStore(b"aaaa", b"bbbb"))
+            assert await restore_to_supervisor(dbx, MANIFEST) == "new1"
+        finally:
+            await supervisor.close_session()
+
+    assert received == {"s1.tar": b"aaaabbbb"}
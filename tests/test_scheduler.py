@@ -0,0 +1,116 @@
+"""Tests for scheduler module."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from datetime import time as dt_time
+
+import scheduler as scheduler_module
+from scheduler import BackupScheduler, next_time_of_day, parse_times
+from state import load_schedule, save_last_run
+
+
+async def _noop():
+    return {}
+
+
+def test_parse_times_sorts_and_skips_invalid():
+    assert parse_times(["14:30", "bad", "02:00", "14:30"]) == [
+        dt_time(2, 0), dt_time(14, 30),
+    ]
+
+
+def test_next_time_of_day_same_and_next_day():
+    times = [dt_time(2, 0), dt_time(14, 0)]
+
+    def local(day, hour):
+        return datetime(2025, 1, day, hour).astimezone()
+
+    assert next_time_of_day(local(1, 3), times) == local(1, 14)
+    assert next_time_of_day(local(1, 14), times) == local(2, 2)
+
+
+def test_next_run_follows_last_run():
+    last_run = datetime.now(timezone.utc) - timedelta(hours=5)
+    save_last_run(last_run.isoformat(), {})
+
+    scheduler = BackupScheduler(24, _noop)
+
+    expected = (last_run + timedelta(hours=24)).replace(microsecond=0)
+    assert scheduler.next_run == expected
+    assert load_schedule()["next_run"] == expected.isoformat()
+
+
+def test_next_run_is_persisted_across_restarts():
+    first = BackupScheduler(24, _noop, jitter_minutes=30)
+
+    # The jitter is not rolled again on restart
+    for _ in range(5):
+        assert BackupScheduler(24, _noop, jitter_minutes=30).next_run == first.next_run
+
+
+def test_changed_options_reschedule():
+    first = BackupScheduler(24, _noop)
+    second = BackupScheduler(1, _noop)
+    assert second.next_run < first.next_run
+
+
+def test_jitter_stays_within_bound():
+    last_run = datetime.now(timezone.utc)
+    save_last_run(last_run.isoformat(), {})
+    base = last_run + timedelta(hours=1)
+
+    scheduler = BackupScheduler(1, _noop, jitter_minutes=10)
+
+    assert base - timedelta(seconds=1) <= scheduler.next_run
+    assert scheduler.next_run <= base + timedelta(minutes=10)
+
+
+def test_record_run_moves_next_run():
+    scheduler = BackupScheduler(24, _noop)
+    scheduler.record_run({"uploaded": []})
+    assert scheduler.next_run > scheduler.last_run + timedelta(hours=23)
+
+
+def test_disabled_without_interval_or_times():
+    scheduler = BackupScheduler(0, _noop)
+    assert not scheduler.enabled
+    assert scheduler.next_run is None
+    assert BackupScheduler(0, _noop, times=["03:00"]).enabled
+
+
+async def test_missed_run_is_caught_up_on_start(monkeypatch):
+    save_last_run((datetime.now(timezone.utc) - timedelta(days=2)).isoformat(), {})
+    ran = asyncio.Event()
+
+    async def backup():
+        ran.set()
+        return {"uploaded": []}
+
+    scheduler = BackupScheduler(24, backup)
+    scheduler.start()
+    try:
+        await asyncio.wait_for(ran.wait(), 1)
+    finally:
+        scheduler.stop()
+    await asyncio.sleep(0)
+    assert scheduler.next_run > datetime.now(timezone.utc) + timedelta(hours=23)
+
+
+async def test_manual_run_wakes_the_loop(monkeypatch):
+    monkeypatch.setattr(scheduler_module, "CHECK_SECONDS", 3600)
+    calls = []
+
+    async def backup():
+        calls.append(1)
+        return {}
+
+    scheduler = BackupScheduler(24, backup)
+    scheduler.start()
+    await asyncio.sleep(0)
+    # A manual run long ago would make the schedule overdue
+    scheduler.last_run = datetime.now(timezone.utc) - timedelta(days=2)
+    scheduler._reschedule()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    scheduler.stop()
+    assert calls == [1]
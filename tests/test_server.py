@@ -0,0 +1,164 @@
+"""Tests for the add-on web server."""
+
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+import state
+from jobs import JobManager
+from scheduler import BackupScheduler
+from web.server import create_app
+
+
+class FakeAuth:
+    def is_authorized(self):
+        return True
+
+
+async def _noop():
+    return {}
+
+
+def _client():
+    app = create_app(FakeAuth(), BackupScheduler(24, _noop), JobManager(_noop))
+    return TestClient(TestServer(app)), app
+
+
+async def test_status_reports_version():
+    client, app = _client()
+    async with client:
+        resp = await client.get("/status")
+        data = await resp.json()
+    assert data["version"] == app["status_channel"].version
+    assert data["state"] == "idle"
+
+
+async def test_status_long_poll_returns_on_change():
+    client, app = _client()
+    async with client:
+        version = app["status_channel"].version
+        request = asyncio.create_task(
+            client.get("/status", params={"wait": version, "timeout": "30"})
+        )
+        await asyncio.sleep(0.05)
+        assert not request.done()
+
+        app["backup_state"] = "running"
+        app["status_channel"].notify()
+        resp = await asyncio.wait_for(request, 5)
+        data = await resp.json()
+    assert data["state"] == "running"
+    assert data["version"] != version
+
+
+async def test_status_long_poll_answers_stale_version_immediately():
+    client, _ = _client()
+    async with client:
+        resp = await asyncio.wait_for(
+            client.get("/status", params={"wait": "old-0", "timeout": "30"}), 5
+        )
+        assert resp.status == 200
+
+
+async def test_status_long_poll_times_out_unchanged():
+    client, app = _client()
+    async with client:
+        version = app["status_channel"].version
+        resp = await client.get("/status", params={"wait": version, "timeout": "0.05"})
+        assert (await resp.json())["version"] == version
+        bad = await client.get("/status", params={"wait": version, "timeout": "x"})
+        assert bad.status == 400
+
+
+async def test_shutdown_releases_status_long_polls():
+    client, app = _client()
+    async with client:
+        version = app["status_channel"].version
+        request = asyncio.create_task(
+            client.get("/status", params={"wait": version, "timeout": "300"})
+        )
+        await asyncio.sleep(0.05)
+        assert not request.done()
+
+        await app.shutdown()
+        resp = await asyncio.wait_for(request, 5)
+        assert resp.status == 200
+        # Later long-polls are not held either
+        resp = await asyncio.wait_for(
+            client.get("/status", params={"wait": version, "timeout": "300"}), 5
+        )
+        assert resp.status == 200
+
+
+async def test_shutdown_ends_progress_streams():
+    client, app = _client()
+    async with client:
+        resp = await client.get("/progress/stream")
+        assert resp.headers["Content-Type"] == "text/event-stream"
+        await asyncio.sleep(0.05)
+        assert len(app["progress_streams"]) == 1
+
+        await app.shutdown()
+        assert await asyncio.wait_for(resp.read(), 5) == b""
+        assert not app["progress_streams"]
+
+
+async def test_status_answers_matching_etag_with_304():
+    client, app = _client()
+    async with client:
+        first = await client.get("/status")
+        etag = first.headers["ETag"]
+        assert etag == app["status_channel"].etag
+
+        cached = await client.get("/status", headers={"If-None-Match": etag})
+        assert cached.status == 304
+        assert cached.headers["ETag"] == etag
+
+        app["status_channel"].notify()
+        changed = await client.get("/status", headers={"If-None-Match": etag})
+        assert changed.status == 200
+        assert changed.headers["ETag"] != etag
+
+
+async def test_status_body_is_cached_until_notified():
+    client, app = _client()
+    async with client:
+        await client.get("/status")
+        app["scheduler"].interval_hours = 6
+        cached = await (await client.get("/status")).json()
+        app["status_channel"].notify()
+        fresh = await (await client.get("/status")).json()
+    assert cached["interval_hours"] == 24
+    assert fresh["interval_hours"] == 6
+
+
+async def test_status_version_changes_when_authorization_does():
+    client, app = _client()
+    auth = app["dropbox_auth"]
+    async with client:
+        before = (await (await client.get("/status")).json())["version"]
+        auth.is_authorized = lambda: False
+        data = await (await client.get("/status")).json()
+    assert data["version"] != before
+    assert data["authorized"] is False
+
+
+async def test_history_is_paginated():
+    state.record_uploads({
+        f"s{i}": {"name": f"B{i}", "uploaded_at": f"2026-01-0{i}T00:00:00"}
+        for i in range(1, 4)
+    })
+    client, _ = _client()
+    async with client:
+        first = await (await client.get("/history", params={"limit": "2"})).json()
+        second = await (await client.get(
+            "/history", params={"limit": "2", "before": first["next"]}
+        )).json()
+        page = await client.get("/")
+        html = await page.text()
+    assert [b["slug"] for b in first["backups"]] == ["s3", "s2"]
+    assert [b["slug"] for b in second["backups"]] == ["s1"]
+    assert second["next"] is None
+    assert first["total"] == 3
+    assert "Uploaded Backups (3)" in html
+    assert "B1" not in html
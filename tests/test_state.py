@@ -1,6 +1,7 @@
 """Tests for the state module."""
 
 import json
+import sqlite3
 
 import state
 
@@ -70,12 +71,37 @@ def test_save_uploaded_creates_data_dir(tmp_path, monkeypatch):
     """save_uploaded creates the DATA_DIR if it does not exist."""
     new_dir = tmp_path / "new_data"
     monkeypatch.setattr(state, "DATA_DIR", new_dir)
-    monkeypatch.setattr(state, "UPLOADED_FILE", new_dir / "uploaded.json")
+    monkeypatch.setattr(state, "DB_FILE", new_dir / "state.db")
     state.save_uploaded({"slug": {"name": "test"}})
-    assert new_dir.exists()
-    assert json.loads((new_dir / "uploaded.json").read_text()) == {
-        "slug": {"name": "test"}
-    }
+    assert (new_dir / "state.db").exists()
+    assert state.load_uploaded() == {"slug": {"name": "test"}}
+
+
+def test_uploaded_json_is_migrated_once():
+    """Tracking written by older versions is imported into the database."""
+    uploaded = {"a": {"name": "A", "dropbox_path": "/b/A.tar"}}
+    state.UPLOADED_FILE.write_text(json.dumps(uploaded))
+    assert state.load_uploaded() == uploaded
+    assert not state.UPLOADED_FILE.exists()
+
+    state.close()
+    state.UPLOADED_FILE.write_text(json.dumps({"stale": {}}))
+    assert state.load_uploaded() == uploaded
+
+
+def test_record_and_forget_uploads():
+    """Single backups are added, found by slug or path, and removed."""
+    state.record_uploads({
+        "a": {"name": "A", "dropbox_path": "/b/A.tar"},
+        "b": {"name": "B", "dropbox_path": "/b/B.tar"},
+    })
+    state.record_uploads({"a": {"name": "A2", "dropbox_path": "/b/A.tar"}})
+    assert state.get_uploaded("a") == {"name": "A2", "dropbox_path": "/b/A.tar"}
+    assert list(state.find_uploaded_by_path("/B/a.tar")) == ["a"]
+
+    state.forget_uploads(["a"])
+    assert state.get_uploaded("a") is None
+    assert list(state.load_uploaded()) == ["b"]
 
 
 def test_load_last_run_returns_empty_when_missing():
@@ -103,3 +129,94 @@ def test_load_last_run_returns_empty_on_corrupt_json():
     """load_last_run returns empty dict on invalid JSON."""
     state.LAST_RUN_FILE.write_text("{bad")
     assert state.load_last_run() == {}
+
+
+def test_upload_session_checkpoint_round_trip():
+    """save_upload_session stores per-slug checkpoints; clear removes one."""
+    state.save_upload_session("a", {"session_id": "s1", "offset": 4})
+    state.save_upload_session("b", {"session_id": "s2", "offset": 8})
+    state.clear_upload_session("a")
+    assert state.load_upload_sessions() == {"b": {"session_id": "s2", "offset": 8}}
+
+
+def test_clear_upload_session_noop_when_missing():
+    """clear_upload_session does not raise if no checkpoint exists."""
+    state.clear_upload_session("missing")
+    assert state.load_upload_sessions() == {}
+
+
+def _rows_on_disk():
+    with sqlite3.connect(state.DB_FILE) as db:
+        return db.execute("SELECT slug FROM uploaded").fetchall()
+
+
+async def test_uploads_are_written_behind():
+    """Tracking changes made in the event loop are coalesced into one flush."""
+    state.record_uploads({"a": {"name": "A", "dropbox_path": "/b/A.tar"}})
+    state.record_uploads({"b": {"name": "B", "dropbox_path": "/b/B.tar"}})
+    state.forget_uploads(["a"])
+    assert list(state.load_uploaded()) == ["b"]
+    assert _rows_on_disk() == []
+
+    state.flush()
+    assert _rows_on_disk() == [("b",)]
+
+
+async def test_last_run_is_flushed_on_close():
+    state.save_last_run("2026-02-26T10:00:00", None)
+    assert state.load_last_run()["last_run"] == "2026-02-26T10:00:00"
+    assert not state.LAST_RUN_FILE.exists()
+
+    state.close()
+    assert json.loads(state.LAST_RUN_FILE.read_text())["last_run"] == "2026-02-26T10:00:00"
+
+
+def test_tokens_are_served_from_memory():
+    """Reading tokens does not go back to disk once they are known."""
+    state.save_tokens({"refresh_token": "r1"})
+    state.TOKENS_FILE.write_text(json.dumps({"refresh_token": "other"}))
+    assert state.load_tokens() == {"refresh_token": "r1"}
+
+
+async def test_uploaded_history_pages_by_upload_time():
+    """History pages come newest first and include unflushed uploads."""
+    state.record_uploads({
+        f"s{i}": {"name": f"B{i}", "uploaded_at": f"2026-01-0{i}T00:00:00"}
+        for i in range(1, 6)
+    })
+    state.record_uploads({"legacy": {"name": "Old"}})
+
+    page, cursor = state.uploaded_history(limit=4)
+    assert [b["slug"] for b in page] == ["s5", "s4", "s3", "s2"]
+    assert page[0]["name"] == "B5"
+
+    page, cursor = state.uploaded_history(limit=4, before=cursor)
+    assert [b["slug"] for b in page] == ["s1", "legacy"]
+    assert cursor is None
+    assert state.count_uploaded() == 6
+
+
+def test_history_index_replaces_version_1_schema():
+    """Databases from the previous schema are upgraded in place."""
+    state.DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with sqlite3.connect(state.DB_FILE) as db:
+        db.executescript("""
+            CREATE TABLE uploaded (
+                slug TEXT PRIMARY KEY, dropbox_path TEXT, path_lower TEXT,
+                uploaded_at TEXT, entry TEXT NOT NULL
+            );
+            CREATE INDEX uploaded_at ON uploaded (uploaded_at);
+            INSERT INTO uploaded VALUES ('old', NULL, NULL, NULL, '{"name": "Old"}');
+            PRAGMA user_version = 1;
+        """)
+
+    assert [b["slug"] for b in state.uploaded_history()[0]] == ["old"]
+    with sqlite3.connect(state.DB_FILE) as db:
+        indexes = {row[1] for row in db.execute("PRAGMA index_list(uploaded)")}
+        plan = " ".join(row[-1] for row in db.execute(
+            "EXPLAIN QUERY PLAN SELECT slug FROM uploaded"
+            " ORDER BY uploaded_at DESC, slug DESC LIMIT 5"
+        ))
+    assert "uploaded_history" in indexes
+    assert "uploaded_at" not in indexes
+    assert "uploaded_history" in plan
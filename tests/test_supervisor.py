@@ -0,0 +1,41 @@
+"""Tests for the shared Supervisor client."""
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import backup_engine
+import supervisor
+from events import fire_event
+
+
+async def test_requests_share_one_authenticated_session(monkeypatch):
+    """Listing backups and firing events reuse the pooled session."""
+    seen = []
+
+    async def backups(request):
+        seen.append((request.path, request.headers["Authorization"]))
+        return web.json_response({"data": {"backups": [{"slug": "s1"}]}})
+
+    async def event(request):
+        seen.append((request.path, request.headers["Authorization"]))
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_get("/backups", backups)
+    app.router.add_post("/core/api/events/{event_type}", event)
+    async with TestServer(app) as server:
+        monkeypatch.setattr(supervisor, "SUPERVISOR_URL", str(server.make_url("")))
+        monkeypatch.setattr(supervisor, "SUPERVISOR_TOKEN", "token")
+        try:
+            session = supervisor.get_session()
+            assert await backup_engine.list_ha_backups() == [{"slug": "s1"}]
+            await fire_event("dropbox_ha_backup.success", {})
+            assert supervisor.get_session() is session
+        finally:
+            await supervisor.close_session()
+
+    assert seen == [
+        ("/backups", "Bearer token"),
+        ("/core/api/events/dropbox_ha_backup.success", "Bearer token"),
+    ]
+    assert supervisor._session is None
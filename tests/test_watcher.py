@@ -0,0 +1,78 @@
+"""Tests for the new-backup watcher."""
+
+import discovery
+import state
+import watcher
+from discovery import BackupDiscovery
+from watcher import BackupWatcher
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _setup(monkeypatch, listing):
+    async def fake_list():
+        return [dict(backup) for backup in listing]
+
+    async def fake_info(slug):
+        return {}
+
+    monkeypatch.setattr(discovery, "list_ha_backups", fake_list)
+    monkeypatch.setattr(discovery, "backup_info", fake_info)
+    clock = Clock()
+    monkeypatch.setattr(watcher.time, "monotonic", clock)
+    return clock
+
+
+async def test_new_backup_triggers_after_debounce(monkeypatch):
+    listing = [{"slug": "a"}]
+    clock = _setup(monkeypatch, listing)
+    state.record_uploads({"a": {"dropbox_path": "/B/a.tar"}})
+    runs = []
+
+    async def trigger():
+        runs.append(1)
+
+    found = BackupWatcher(BackupDiscovery(), trigger)
+    await found.check()
+    assert runs == []
+
+    listing.append({"slug": "b"})
+    await found.check()
+    clock.now += 5
+    listing.append({"slug": "c"})
+    await found.check()
+    # Another backup arrived: the debounce starts over
+    clock.now += watcher.DEBOUNCE_SECONDS - 1
+    await found.check()
+    assert runs == []
+
+    clock.now += 1
+    await found.check()
+    assert runs == [1]
+    await found.check()
+    assert runs == [1]
+
+
+async def test_trigger_waits_while_busy(monkeypatch):
+    clock = _setup(monkeypatch, [{"slug": "a"}])
+    busy = [True]
+    runs = []
+
+    async def trigger():
+        runs.append(1)
+
+    found = BackupWatcher(BackupDiscovery(), trigger, lambda: busy[0])
+    await found.check()
+    clock.now += watcher.DEBOUNCE_SECONDS
+    await found.check()
+    assert runs == []
+
+    busy[0] = False
+    await found.check()
+    assert runs == [1]